@@ -0,0 +1,89 @@
+"""
+Benchmark for the incremental frame decoder.
+
+Serializes a mix of frames, cuts the resulting byte stream at random boundaries and feeds the pieces to
+H2FrameDecoder, checking that every frame comes out intact. Reports the time taken to reassemble the frames
+only, to also decode their headers into frame views and to dissect them into scapy packets.
+
+Run from the repository root as follows: PYTHONPATH=. python benchmarks/decoder_bench.py [num_frames] [max_chunk_size]
+"""
+
+import random
+import sys
+import time
+
+import scapy.contrib.http2 as scapy
+
+import h2tinker as h2
+
+
+def build_stream(num_frames: int, rng: random.Random) -> bytes:
+    frames = []
+    for i in range(num_frames):
+        kind = i % 4
+        if kind == 0:
+            frames.append(h2.create_ping_frame(bytes(rng.getrandbits(8) for _ in range(8))))
+        elif kind == 1:
+            frames.append(h2.create_window_update_frame(i * 2 + 1, rng.randint(1, 2 ** 20)))
+        elif kind == 2:
+            frames.append(h2.create_settings_frame(is_ack=True))
+        else:
+            data = bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 16_384)))
+            frames.append(scapy.H2Frame(stream_id=i * 2 + 1) / scapy.H2DataFrame(data=data))
+    return b''.join(bytes(f) for f in frames)
+
+
+def cut(stream: bytes, max_chunk_size: int, rng: random.Random):
+    chunks = []
+    pos = 0
+    while pos < len(stream):
+        size = rng.randint(1, max_chunk_size)
+        chunks.append(stream[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def main():
+    num_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1500
+    rng = random.Random(0)
+
+    stream = build_stream(num_frames, rng)
+    chunks = cut(stream, max_chunk_size, rng)
+
+    decoder = h2.H2FrameDecoder()
+    start = time.perf_counter()
+    raw_frames = []
+    for chunk in chunks:
+        raw_frames.extend(decoder.feed_raw(chunk))
+    raw_elapsed = time.perf_counter() - start
+
+    assert len(raw_frames) == num_frames, 'Expected {} frames, got {}'.format(num_frames, len(raw_frames))
+    assert b''.join(bytes(f) for f in raw_frames) == stream, 'Reassembled stream does not match the input'
+    assert not decoder.has_pending_data()
+
+    decoder = h2.H2FrameDecoder()
+    start = time.perf_counter()
+    views = []
+    for chunk in chunks:
+        views.extend(decoder.feed_views(chunk))
+    view_elapsed = time.perf_counter() - start
+    assert len(views) == num_frames
+
+    decoder = h2.H2FrameDecoder()
+    start = time.perf_counter()
+    frames = []
+    for chunk in chunks:
+        frames.extend(decoder.feed(chunk))
+    dissect_elapsed = time.perf_counter() - start
+    assert len(frames) == num_frames
+
+    mib = len(stream) / 2 ** 20
+    print('{} frames, {:.2f} MiB in {} chunks (max {} bytes)'.format(num_frames, mib, len(chunks), max_chunk_size))
+    print('reassembly only:   {:8.2f} ms  {:10.1f} MiB/s'.format(raw_elapsed * 1e3, mib / raw_elapsed))
+    print('with frame views:  {:8.2f} ms  {:10.1f} MiB/s'.format(view_elapsed * 1e3, mib / view_elapsed))
+    print('with scapy frames: {:8.2f} ms  {:10.1f} MiB/s'.format(dissect_elapsed * 1e3, mib / dissect_elapsed))
+
+
+if __name__ == '__main__':
+    main()
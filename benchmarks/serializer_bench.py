@@ -0,0 +1,86 @@
+"""
+Micro-benchmark comparing frame serialization through scapy packets with FrameWriter.
+
+Serializes the same frames both ways, checks that the output is byte-identical and reports the time per frame
+for every frame type.
+
+Run from the repository root as follows: PYTHONPATH=. python benchmarks/serializer_bench.py [iterations]
+"""
+
+import sys
+import time
+
+import scapy.contrib.http2 as scapy
+
+import h2tinker as h2
+
+SETTINGS = [(scapy.H2Setting.SETTINGS_ENABLE_PUSH, 0), (scapy.H2Setting.SETTINGS_INITIAL_WINDOW_SIZE, 2 ** 31 - 1)]
+BODY = b'x' * 1024
+
+CASES = [
+    ('PING', lambda: h2.create_ping_frame(b'01234567'),
+     lambda w: w.ping(b'01234567')),
+    ('PRIORITY', lambda: h2.create_priority_frame(3, 1, 15, True),
+     lambda w: w.priority(3, 1, 15, True)),
+    ('SETTINGS', lambda: h2.create_settings_frame([scapy.H2Setting(id=i, value=v) for i, v in SETTINGS]),
+     lambda w: w.settings(SETTINGS)),
+    ('SETTINGS ACK', lambda: h2.create_settings_frame(is_ack=True),
+     lambda w: w.settings(is_ack=True)),
+    ('RST_STREAM', lambda: h2.create_rst_stream_frame(5, scapy.H2ErrorCodes.CANCEL),
+     lambda w: w.rst_stream(5, scapy.H2ErrorCodes.CANCEL)),
+    ('GOAWAY', lambda: h2.create_goaway_frame(last_stream_id=7, additional_data='bye'),
+     lambda w: w.goaway(last_stream_id=7, additional_data='bye')),
+    ('WINDOW_UPDATE', lambda: h2.create_window_update_frame(0, 1 << 20),
+     lambda w: w.window_update(0, 1 << 20)),
+    ('DATA 1 byte', lambda: scapy.H2Frame(flags={'ES'}, stream_id=9) / scapy.H2DataFrame(data=b'x'),
+     lambda w: w.data(9, b'x', end_stream=True)),
+    ('DATA 1 KiB', lambda: scapy.H2Frame(stream_id=9) / scapy.H2DataFrame(data=BODY),
+     lambda w: w.data(9, BODY)),
+]
+
+
+def header_case():
+    # The header block is encoded once, both paths only serialize the frame around it
+    hdrs = h2.HPackEncoder(header_table_size=0).encode_headers(
+        [(':method', 'POST'), (':path', '/race'), (':scheme', 'https'), (':authority', 'example.com:443'),
+         ('user-agent', 'h2tinker'), ('content-type', 'application/x-www-form-urlencoded')])
+    block = b''.join(bytes(hdr) for hdr in hdrs)
+
+    def make_scapy():
+        payload = scapy.H2HeadersFrame()
+        payload.hdrs = hdrs
+        return scapy.H2Frame(stream_id=11, flags={'EH'}) / payload
+
+    return 'HEADERS', make_scapy, lambda w: w.headers(11, block)
+
+
+def time_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    writer = h2.FrameWriter()
+
+    print('{:<14} {:>12} {:>12} {:>9}'.format('frame', 'scapy us', 'writer us', 'speedup'))
+    for name, make_scapy, write in CASES + [header_case()]:
+        writer.clear()
+        write(writer)
+        assert bytes(make_scapy()) == writer.getvalue(), '{} frames differ'.format(name)
+
+        def write_once():
+            writer.clear()
+            write(writer)
+            return writer.getvalue()
+
+        scapy_time = time_per_call(lambda: bytes(make_scapy()), iterations)
+        writer_time = time_per_call(write_once, iterations)
+        print('{:<14} {:12.2f} {:12.2f} {:8.1f}x'.format(name, scapy_time * 1e6, writer_time * 1e6,
+                                                        scapy_time / writer_time))
+
+
+if __name__ == '__main__':
+    main()
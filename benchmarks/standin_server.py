@@ -0,0 +1,246 @@
+"""
+Minimal local HTTP/2 server used as a stand-in target by the benchmark suite.
+
+Serves h2c on one port, with prior knowledge or upgraded from HTTP/1.1 with Upgrade: h2c, and h2 over TLS
+(self-signed certificate, ALPN h2) on another.
+Every request that is ended with END_STREAM gets a 200 response with a body of a fixed size. The response
+headers carry x-arrival-ns: the perf_counter_ns time at which the server handled the frame that ended the
+request, so clients on the same host can measure the server-observed arrival spread of a race, and x-body-bytes: the
+number of request body bytes received. Received DATA is checked against the flow-control windows, which start at
+the default 65535 bytes: a client that overruns the connection window gets GOAWAY with FLOW_CONTROL_ERROR, one that
+overruns a stream window gets the stream reset. The window is given back with WINDOW_UPDATE once the DATA is read.
+Streams opened beyond the advertised SETTINGS_MAX_CONCURRENT_STREAMS are refused with REFUSED_STREAM. If a limit of
+requests per connection is given, the server sends GOAWAY once it is reached and ignores later streams, like
+servers that recycle their connections after a number of requests.
+
+The server only looks at frame headers, request header blocks are not decoded.
+
+Run standalone from the repository root as follows:
+PYTHONPATH=. python benchmarks/standin_server.py [body_size] [max_concurrent_streams] [max_requests]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+import typing as T
+
+import scapy.contrib.http2 as scapy
+
+import h2tinker as h2
+from h2tinker.hpack import DEFAULT_MAX_FRAME_SIZE
+
+PREFACE = b'PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n'
+# Receive windows of the server, which keeps the default SETTINGS_INITIAL_WINDOW_SIZE
+INITIAL_WINDOW_SIZE = 65_535
+# :status 200 from the HPACK static table
+STATUS_200 = b'\x88'
+ARRIVAL_HEADER = b'x-arrival-ns'
+BODY_BYTES_HEADER = b'x-body-bytes'
+
+
+def make_self_signed_cert(directory: str) -> T.Tuple[str, str]:
+    """
+    Create a self-signed certificate for 127.0.0.1 and localhost with the openssl command line tool.
+    :param directory: directory to write cert.pem and key.pem to
+    :return: paths of the certificate and the key
+    """
+    cert_file = os.path.join(directory, 'cert.pem')
+    key_file = os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-addext', 'subjectAltName=IP:127.0.0.1,DNS:localhost',
+                    '-keyout', key_file, '-out', cert_file],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert_file, key_file
+
+
+def literal_header(name: bytes, value: int) -> bytes:
+    # Literal header field without indexing and with a new name, neither string Huffman-encoded
+    value = str(value).encode('ascii')
+    return b'\x00' + bytes([len(name)]) + name + bytes([len(value)]) + value
+
+
+def response_header_block(arrival_ns: int, body_bytes: int = 0) -> bytes:
+    return STATUS_200 + literal_header(ARRIVAL_HEADER, arrival_ns) + literal_header(BODY_BYTES_HEADER, body_bytes)
+
+
+def write_response(out: h2.FrameWriter, stream_id: int, arrival_ns: int, body: bytes, body_bytes: int = 0):
+    out.headers(stream_id, response_header_block(arrival_ns, body_bytes), end_stream=not body)
+    for offset in range(0, len(body), DEFAULT_MAX_FRAME_SIZE):
+        out.data(stream_id, body[offset:offset + DEFAULT_MAX_FRAME_SIZE],
+                 end_stream=offset + DEFAULT_MAX_FRAME_SIZE >= len(body))
+
+
+async def serve_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, body_size: int,
+                           max_concurrent_streams: int, max_requests: T.Optional[int] = None):
+    body = bytes(body_size)
+    settings = h2.FrameWriter().settings([(scapy.H2Setting.SETTINGS_MAX_CONCURRENT_STREAMS, max_concurrent_streams)])
+    try:
+        start = await reader.readexactly(len(PREFACE))
+        if start != PREFACE:
+            # HTTP/1.1 request that asks for an upgrade, answered on stream 1 once upgraded
+            request = start + await reader.readuntil(b'\r\n\r\n')
+            if b'upgrade: h2c' not in request.lower():
+                writer.write(b'HTTP/1.1 400 Bad Request\r\nConnection: close\r\nContent-Length: 0\r\n\r\n')
+                return
+            writer.write(b'HTTP/1.1 101 Switching Protocols\r\nConnection: Upgrade\r\nUpgrade: h2c\r\n\r\n')
+            writer.write(settings.getvalue())
+            settings.clear()
+            response = h2.FrameWriter()
+            write_response(response, 1, time.perf_counter_ns(), body)
+            writer.write(response.getvalue())
+            assert await reader.readexactly(len(PREFACE)) == PREFACE
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, AssertionError):
+        writer.close()
+        return
+    writer.write(settings.getvalue())
+    decoder = h2.H2FrameDecoder()
+    body_bytes = {}
+    open_streams = set()
+    # Receive windows left to the client, the connection window and those of open streams
+    conn_window = INITIAL_WINDOW_SIZE
+    stream_windows = {}  # type: T.Dict[int, int]
+    # Number of streams accepted so far and the last one of them, GOAWAY cuts off streams above it
+    num_accepted = 0
+    last_accepted = 0
+    goaway_sent = False
+    try:
+        while True:
+            chunk = await reader.read(65_535)
+            if not chunk:
+                break
+            out = h2.FrameWriter()
+            # (stream ID, arrival time, body bytes) of the requests ended in this chunk
+            ended = []
+            # Window given back with this chunk's WINDOW_UPDATE frames, it only counts once they are sent
+            conn_credit = 0
+            stream_credits = {}  # type: T.Dict[int, int]
+            for f in decoder.feed_views(chunk):
+                if f.type == scapy.H2SettingsFrame.type_id and 'A' not in f.flags:
+                    out.settings(is_ack=True)
+                elif f.type == scapy.H2PingFrame.type_id and 'A' not in f.flags:
+                    out.ping(bytes(f.raw_payload), is_ack=True)
+                elif f.type == scapy.H2GoAwayFrame.type_id:
+                    return
+                if goaway_sent and f.stream_id > last_accepted:
+                    continue
+                if f.type == scapy.H2HeadersFrame.type_id and f.stream_id not in open_streams:
+                    if max_requests is not None and num_accepted >= max_requests:
+                        out.goaway(scapy.H2ErrorCodes.NO_ERROR, last_accepted)
+                        goaway_sent = True
+                        continue
+                    if len(open_streams) >= max_concurrent_streams:
+                        out.rst_stream(f.stream_id, scapy.H2ErrorCodes.REFUSED_STREAM)
+                        continue
+                    open_streams.add(f.stream_id)
+                    stream_windows[f.stream_id] = INITIAL_WINDOW_SIZE
+                    num_accepted += 1
+                    last_accepted = f.stream_id
+                if f.type == scapy.H2DataFrame.type_id and f.len:
+                    conn_window -= f.len
+                    if conn_window < 0:
+                        out.goaway(scapy.H2ErrorCodes.FLOW_CONTROL_ERROR, last_accepted)
+                        writer.write(out.getvalue())
+                        return
+                    out.window_update(0, f.len)
+                    conn_credit += f.len
+                    if f.stream_id not in stream_windows:
+                        continue
+                    stream_windows[f.stream_id] -= f.len
+                    if stream_windows[f.stream_id] < 0:
+                        out.rst_stream(f.stream_id, scapy.H2ErrorCodes.FLOW_CONTROL_ERROR)
+                        del stream_windows[f.stream_id]
+                        body_bytes.pop(f.stream_id, None)
+                        open_streams.discard(f.stream_id)
+                        continue
+                    body_bytes[f.stream_id] = body_bytes.get(f.stream_id, 0) + f.len
+                    if 'ES' not in f.flags:
+                        out.window_update(f.stream_id, f.len)
+                        stream_credits[f.stream_id] = stream_credits.get(f.stream_id, 0) + f.len
+                if f.type in (scapy.H2DataFrame.type_id, scapy.H2HeadersFrame.type_id) and 'ES' in f.flags:
+                    # Timestamped per frame: the final frames of a race are usually read in one chunk, but like
+                    # requests in a real server, they are handled one after another. Responses are written after
+                    # the loop, so that their serialization doesn't count towards the spread
+                    ended.append((f.stream_id, time.perf_counter_ns(), body_bytes.pop(f.stream_id, 0)))
+                    open_streams.discard(f.stream_id)
+                    stream_windows.pop(f.stream_id, None)
+            for stream_id, arrival_ns, num_body_bytes in ended:
+                write_response(out, stream_id, arrival_ns, body, num_body_bytes)
+            if len(out):
+                writer.write(out.getvalue())
+                conn_window += conn_credit
+                for stream_id, credit in stream_credits.items():
+                    if stream_id in stream_windows:
+                        stream_windows[stream_id] += credit
+                await writer.drain()
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        writer.close()
+
+
+async def run_server(host: str, body_size: int, cert_file: str, key_file: str,
+                     ready: T.Callable[[int, int], None], max_concurrent_streams: int = 100_000,
+                     max_requests: T.Optional[int] = None):
+    ssl_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ssl_ctx.load_cert_chain(cert_file, key_file)
+    ssl_ctx.set_alpn_protocols(['h2'])
+
+    def handler(reader, writer):
+        return serve_connection(reader, writer, body_size, max_concurrent_streams, max_requests)
+
+    plain_server = await asyncio.start_server(handler, host, 0)
+    tls_server = await asyncio.start_server(handler, host, 0, ssl=ssl_ctx)
+    ready(plain_server.sockets[0].getsockname()[1], tls_server.sockets[0].getsockname()[1])
+    async with plain_server, tls_server:
+        await asyncio.gather(plain_server.serve_forever(), tls_server.serve_forever())
+
+
+def _server_process(host: str, body_size: int, cert_file: str, key_file: str, queue: multiprocessing.Queue,
+                    max_concurrent_streams: int, max_requests: T.Optional[int]):
+    asyncio.run(run_server(host, body_size, cert_file, key_file, lambda *ports: queue.put(ports),
+                           max_concurrent_streams, max_requests))
+
+
+def start_in_process(body_size: int, cert_file: str, key_file: str, host: str = '127.0.0.1',
+                     max_concurrent_streams: int = 100_000, max_requests: T.Optional[int] = None) \
+        -> T.Tuple[multiprocessing.Process, int, int]:
+    """
+    Start the server in a separate process, so that it doesn't compete with the client for the GIL.
+    :param body_size: response body size in bytes
+    :param cert_file: TLS certificate, see make_self_signed_cert
+    :param key_file: TLS key
+    :param host: address to listen on
+    :param max_concurrent_streams: SETTINGS_MAX_CONCURRENT_STREAMS to advertise and enforce
+    :param max_requests: number of streams accepted per connection before GOAWAY, None for no limit
+    :return: the server process, which should be terminated when done, the h2c port and the h2 port
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_server_process,
+                                      args=(host, body_size, cert_file, key_file, queue, max_concurrent_streams,
+                                            max_requests),
+                                      daemon=True)
+    process.start()
+    plain_port, tls_port = queue.get(timeout=10)
+    return process, plain_port, tls_port
+
+
+def main():
+    body_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    max_concurrent_streams = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    max_requests = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    with tempfile.TemporaryDirectory() as cert_dir:
+        cert_file, key_file = make_self_signed_cert(cert_dir)
+        print('certificate: {}'.format(cert_file))
+        asyncio.run(run_server('127.0.0.1', body_size, cert_file, key_file,
+                               lambda plain_port, tls_port: print('h2c port {}, h2 port {}'.format(plain_port,
+                                                                                                   tls_port)),
+                               max_concurrent_streams, max_requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Benchmark suite running last-frame synchronization races against a local stand-in server.
+
+For every transport (h2c with H2PlainConnection, with prior knowledge or upgraded from HTTP/1.1, and h2 with
+H2TLSConnection) and stream count, a fresh connection
+races that many POST requests and reports:
+- setup_us: time to set the connection up, including the TCP, TLS and HTTP/2 handshakes
+- handshake_us: time of the TLS handshake alone, resumed after the first connection unless --no-resume is given
+- build_us_per_req: time to encode the withheld request frames, per request
+- burst_us: time to serialize and plan the final-frame burst
+- settle_us: time waited before the burst, until the server acked a marker PING unless --settle-time is given
+- send_window_us: time the final-frame burst took to write
+- arrival_spread_us: time between the server handling the first and the last final frame
+- recv_mb_per_s: response body throughput while collecting the responses
+Each scenario is repeated and the medians are reported. All results are written as JSON so that runs can be
+compared, see standin_server for the server side.
+
+Run from the repository root as follows:
+PYTHONPATH=. python benchmarks/suite.py [--streams 10 100 1000] [--repeat 3] [--body-size 16384] [--output FILE]
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import typing as T
+
+import h2tinker as h2
+import standin_server
+
+HOST = '127.0.0.1'
+METRICS = ('setup_us', 'handshake_us', 'build_us_per_req', 'burst_us', 'settle_us', 'send_window_us',
+           'arrival_spread_us', 'recv_mb_per_s')
+
+
+def connect(transport: str, port: int, logger: logging.Logger, tls_cache: h2.TLSSessionCache, cert_file: str,
+            resume: bool) -> h2.H2Connection:
+    if transport == 'h2':
+        conn = h2.H2TLSConnection(logger, frame_log_mode=h2.FrameLogMode.OFF,
+                                  ssl_context=tls_cache.get_context(cafile=cert_file), session_cache=tls_cache,
+                                  resume_session=resume)
+        conn.setup(HOST, port)
+    else:
+        conn = h2.H2PlainConnection(logger, frame_log_mode=h2.FrameLogMode.OFF)
+        conn.setup(HOST, port, upgrade=transport == 'h2c-upgrade')
+    return conn
+
+
+def run_race(conn: h2.H2Connection, num_streams: int, settle_time: T.Optional[float]) -> T.Dict[str, float]:
+    requests = [h2.H2Request('POST', '/race', sid, [('user-agent', 'h2tinker-bench')], b'race=1')
+                for sid in conn.allocate_stream_ids(num_streams)]
+
+    start = time.perf_counter_ns()
+    prefix_frames, final_frames = conn.create_withheld_request_frames(requests)
+    build_ns = time.perf_counter_ns() - start
+    conn.send_frames(*prefix_frames)
+
+    start = time.perf_counter_ns()
+    burst = conn.prepare_burst(*final_frames, mode=h2.SegmentMode.NODELAY)
+    burst_ns = time.perf_counter_ns() - start
+
+    start = time.perf_counter_ns()
+    conn.settle(settle_time)
+    settle_ns = time.perf_counter_ns() - start
+    trace = conn.enable_io_trace()
+    mark = trace.mark()
+    conn.send_burst(burst)
+    send = trace.events_since(mark, 'send')[0]
+
+    responses = conn.collect_responses([req.stream_id for req in requests])
+    arrivals = [int(r.get_header('x-arrival-ns')) for r in responses if r.get_header('x-arrival-ns')]
+    body_bytes = sum(len(r.body) for r in responses)
+    collect_s = (responses.end_ns - responses.start_ns) / 1e9
+    return {
+        'build_us_per_req': build_ns / 1000 / num_streams,
+        'burst_us': burst_ns / 1000,
+        'settle_us': settle_ns / 1000,
+        'send_window_us': (send.end_ns - send.start_ns) / 1000,
+        'arrival_spread_us': (max(arrivals) - min(arrivals)) / 1000 if arrivals else None,
+        'recv_mb_per_s': body_bytes / 1e6 / collect_s if collect_s > 0 else None,
+        'completed_streams': len(responses.completion_order()),
+        'segments': burst.num_segments,
+    }
+
+
+def run_scenario(transport: str, port: int, num_streams: int, args: argparse.Namespace, logger: logging.Logger,
+                 tls_cache: h2.TLSSessionCache, cert_file: str) -> T.Dict[str, T.Any]:
+    scenario = {'transport': transport, 'streams': num_streams, 'runs': []}
+    for _ in range(args.repeat):
+        try:
+            start = time.perf_counter_ns()
+            conn = connect(transport, port, logger, tls_cache, cert_file, not args.no_resume)
+            setup_ns = time.perf_counter_ns() - start
+        except Exception as e:
+            scenario['error'] = '{}: {}'.format(type(e).__name__, e)
+            return scenario
+        try:
+            run = run_race(conn, num_streams, args.settle_time)
+        finally:
+            conn.close()
+        timing = getattr(conn, 'handshake_timing', None)
+        run['setup_us'] = setup_ns / 1000
+        run['handshake_us'] = timing.duration_us if timing is not None else None
+        run['tls_resumed'] = timing.resumed if timing is not None else None
+        scenario['runs'].append(run)
+    scenario['median'] = {}
+    for metric in METRICS:
+        values = [run[metric] for run in scenario['runs'] if run[metric] is not None]
+        scenario['median'][metric] = statistics.median(values) if values else None
+    return scenario
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Race benchmarks against a local HTTP/2 stand-in server')
+    parser.add_argument('--streams', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--transports', nargs='+', choices=['h2c', 'h2c-upgrade', 'h2'], default=['h2c', 'h2'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--body-size', type=int, default=16_384, help='response body size in bytes')
+    parser.add_argument('--settle-time', type=float, default=None,
+                        help='seconds to wait before the final frames, by default until the server acks a marker PING')
+    parser.add_argument('--no-resume', action='store_true', help='do a full TLS handshake on every connection')
+    parser.add_argument('--output', default='benchmark-results.json')
+    args = parser.parse_args()
+
+    logger = logging.getLogger('h2tinker.bench')
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as cert_dir:
+        cert_file, key_file = standin_server.make_self_signed_cert(cert_dir)
+        tls_cache = h2.TLSSessionCache()
+        server, plain_port, tls_port = standin_server.start_in_process(args.body_size, cert_file, key_file, HOST)
+        try:
+            scenarios = []
+            for transport in args.transports:
+                port = tls_port if transport == 'h2' else plain_port
+                for num_streams in args.streams:
+                    scenario = run_scenario(transport, port, num_streams, args, logger, tls_cache, cert_file)
+                    scenarios.append(scenario)
+                    if 'error' in scenario:
+                        print('{:<11} {:>5} streams: failed: {}'.format(transport, num_streams, scenario['error']))
+                    else:
+                        print('{:<11} {:>5} streams: '.format(transport, num_streams) + ', '.join(
+                            '{} {}'.format(m, '-' if v is None else '{:.2f}'.format(v))
+                            for m, v in scenario['median'].items()))
+        finally:
+            server.terminate()
+
+    report = {
+        'timestamp': time.time(),
+        'python': sys.version,
+        'platform': platform.platform(),
+        'body_size': args.body_size,
+        'repeat': args.repeat,
+        'tls_resumption_rate': tls_cache.resumption_rate(),
+        'scenarios': scenarios,
+    }
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    print('results written to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark for sending large request bodies.
+
+Uploads a body to the local stand-in server on an h2c connection, first built as scapy frames with
+create_request_frames and sent with send_frames, then streamed with send_streaming_request. The stand-in server
+enforces flow control, so the scapy frames are sent in batches that fit the send windows, reading the server's
+WINDOW_UPDATE frames in between like send_streaming_request does. Reports the time each takes until the response
+arrives and checks that the server received the whole body.
+
+Run from the repository root as follows: PYTHONPATH=. python benchmarks/upload_bench.py [body_size]
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import scapy.contrib.http2 as scapy
+
+import h2tinker as h2
+import standin_server
+
+
+def send_within_windows(conn: h2.H2Connection, seq: scapy.H2Seq, stream_id: int):
+    # Compliant baseline for scapy frames: send as many frames at once as the windows allow, then read until
+    # the server opens them again. The connection tracks the windows from the frames it sends and reads
+    batch = []
+    window = min(conn.send_window, conn.peer_settings.initial_window_size)
+    for f in seq.frames:
+        size = len(f.payload.data) if f.type == scapy.H2DataFrame.type_id else 0
+        while size > window:
+            if batch:
+                conn.send_frames(*batch)
+                batch = []
+            else:
+                conn.recv_frames()
+            window = min(conn.send_window,
+                         conn.stream_send_windows.get(stream_id, conn.peer_settings.initial_window_size))
+        batch.append(f)
+        window -= size
+    conn.send_frames(*batch)
+
+
+def upload(conn: h2.H2Connection, body: bytes, streaming: bool) -> float:
+    stream_id = conn.allocate_stream_ids(1)[0]
+    start = time.perf_counter()
+    if streaming:
+        conn.send_streaming_request('POST', '/upload', stream_id, body=body)
+    else:
+        send_within_windows(conn, conn.create_request_frames('POST', '/upload', stream_id, body=body), stream_id)
+    response = conn.collect_responses([stream_id])[stream_id]
+    elapsed = time.perf_counter() - start
+    received = int(response.get_header('x-body-bytes') or 0)
+    assert received == len(body), 'server received {} of {} bytes'.format(received, len(body))
+    return elapsed
+
+
+def main():
+    body_size = int(sys.argv[1]) if len(sys.argv) > 1 else 8 << 20
+    body = os.urandom(body_size)
+    logger = logging.getLogger('h2tinker.bench')
+    with tempfile.TemporaryDirectory() as cert_dir:
+        cert_file, key_file = standin_server.make_self_signed_cert(cert_dir)
+        server, plain_port, _ = standin_server.start_in_process(0, cert_file, key_file)
+        try:
+            conn = h2.H2PlainConnection(logger, frame_log_mode=h2.FrameLogMode.OFF)
+            conn.setup('127.0.0.1', plain_port)
+            for streaming in (False, True):
+                elapsed = upload(conn, body, streaming)
+                print('{:<10} {} bytes in {:.3f} s, {:.1f} MB/s'.format(
+                    'streaming' if streaming else 'scapy', body_size, elapsed, body_size / 1e6 / elapsed))
+            conn.close()
+        finally:
+            server.terminate()
+
+
+if __name__ == '__main__':
+    main()
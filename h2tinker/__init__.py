@@ -1,6 +1,27 @@
 from h2tinker.h2_connection import H2Connection
 from h2tinker.h2_plain_connection import H2PlainConnection
 from h2tinker.h2_tls_connection import H2TLSConnection
+from h2tinker.tls import TLSSessionCache, HandshakeTiming
+from h2tinker.resolver import ResolverCache
+from h2tinker.async_connection import AsyncH2Connection
+from h2tinker.pool import H2ConnectionPool
+from h2tinker.fanout import FanoutRace, FanoutResult
+from h2tinker.waves import Wave, WaveRace, WaveResult
+from h2tinker.rounds import MultiRoundRace, MultiRoundResult, RoundResult
+from h2tinker.stream_ids import StreamIdAllocator
+from h2tinker.burst import PreparedBurst, SegmentMode
+from h2tinker.body import BodyReader
+from h2tinker.decoder import H2FrameDecoder
+from h2tinker.settings import PeerSettings
+from h2tinker.rtt import RttEstimator
+from h2tinker.frame_view import H2FrameView
+from h2tinker.serializer import FrameWriter
+from h2tinker.hpack import HPackEncoder, HPackDecoder
+from h2tinker.request import H2Request
+from h2tinker.response import CloseReason, ResponseSet, StreamResponse
+from h2tinker.timing import IOTrace, SkewReport
+from h2tinker.corpus import CompiledCorpus, race_corpus
+from h2tinker.dependency import DependencyTree, DependencyResult
 
 from h2tinker.frames import *
-from h2tinker.log import LogLevel, set_global_log_level
+from h2tinker.log import LogLevel, FrameLogMode, OutputLogger, set_global_log_level, set_log_output
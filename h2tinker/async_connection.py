@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import socket
+import ssl
+import time
+import typing as T
+
+import scapy.contrib.http2 as h2
+
+from h2tinker.assrt import assert_error
+from h2tinker.burst import PreparedBurst, SegmentMode
+from h2tinker.frame_view import H2FrameView
+from h2tinker.frames import has_ack_set
+from h2tinker.h2_connection import H2Connection, READ_SIZE
+from h2tinker.log import FrameLogMode
+from h2tinker.serializer import FrameWriter
+from h2tinker.tls import DEFAULT_SESSION_CACHE
+
+
+class AsyncH2Connection(H2Connection):
+    """
+    HTTP/2 connection for use inside an asyncio event loop, e.g. in a mitmproxy addon.
+
+    Request building is shared with H2Connection, but all I/O is done on asyncio streams: setup, send_frames,
+    recv_frames, ping and close are coroutines. After setup, a background task reads frames and dispatches
+    them to per-stream queues (see subscribe and stream_frames), so waiting for responses never blocks the
+    event loop. The read task acks the server's SETTINGS and PING frames by itself, and decodes every header
+    block it receives: the frame with END_HEADERS carries the decoded headers in its headers attribute.
+    Methods of H2Connection that block on the socket, e.g. collect_responses and settle, are not available.
+    """
+
+    def __init__(self, logger: logging.Logger, frame_log_mode: FrameLogMode = FrameLogMode.SUMMARY,
+                 window_update_threshold: int = 1 << 20, **kwargs):
+        """
+        :param logger: logger for connection events
+        :param frame_log_mode: how sent and received frames are logged, frames are only logged at DEBUG level
+        :param window_update_threshold: see H2Connection
+        :param kwargs: further arguments of H2Connection, e.g. resolver or send_buffer_size. Socket options are
+        applied once asyncio has connected the socket
+        """
+        super().__init__(logger, frame_log_mode, window_update_threshold, **kwargs)
+        self.reader = None  # type: T.Optional[asyncio.StreamReader]
+        self.writer = None  # type: T.Optional[asyncio.StreamWriter]
+        self._read_task = None  # type: T.Optional[asyncio.Task]
+        self._stream_queues = {}  # type: T.Dict[int, asyncio.Queue]
+        self._unclaimed = None  # type: T.Optional[asyncio.Queue]
+        self._pings = {}  # type: T.Dict[bytes, asyncio.Future]
+        self._settings_acked = None  # type: T.Optional[asyncio.Future]
+
+    async def setup(self, host: str, port: int = 443, server_name: T.Optional[str] = None,
+                    use_tls: bool = True, timeout: T.Optional[float] = None):
+        """
+        Set the connection up by opening the TCP connection, performing the TLS handshake with ALPN selected
+        protocol h2 if use_tls is set, and finally performing the HTTP/2 handshake.
+        :param host: host where to connect, e.g. example.com or 127.0.0.1
+        :param port: TCP port where to connect
+        :param server_name: server name to send in the TLS SNI extension, defaults to host
+        :param use_tls: whether to use TLS, otherwise h2c with prior knowledge is used
+        :param timeout: timeout in seconds for the whole setup, None to wait indefinitely
+        """
+        super().setup(host, port)
+        self.host = host
+        self.port = port
+        await asyncio.wait_for(self._setup(server_name, use_tls), timeout)
+        self.is_setup_completed = True
+        self.logger.info("Completed HTTP/2 connection setup")
+
+    async def _setup(self, server_name: T.Optional[str], use_tls: bool):
+        ssl_ctx = None
+        if use_tls:
+            assert_error(bool(ssl.HAS_ALPN), 'TLS ALPN extension not available but it is required for HTTP/2 over TLS')
+            ssl_ctx = DEFAULT_SESSION_CACHE.get_context()
+        self.IS_TLS = use_tls
+
+        # asyncio races the addresses of the host itself, pinned addresses still apply
+        address = self.resolver.pinned(self.host) or self.host
+        self.reader, self.writer = await asyncio.open_connection(
+            address, self.port, ssl=ssl_ctx, server_hostname=(server_name or self.host) if use_tls else None,
+            happy_eyeballs_delay=self.attempt_delay, interleave=1)
+        if use_tls:
+            ssl_obj = self.writer.get_extra_info('ssl_object')
+            assert_error('h2' == ssl_obj.selected_alpn_protocol(), 'Server did not agree to use HTTP/2 in ALPN')
+        self.sock = self.writer.get_extra_info('socket')
+        self._configure_socket(self.sock)
+        self.logger.debug("Socket connected")
+
+        loop = asyncio.get_running_loop()
+        self._unclaimed = asyncio.Queue()
+        self._settings_acked = loop.create_future()
+        self._send_preface()
+        self._send_initial_settings()
+        await self.writer.drain()
+        self._read_task = loop.create_task(self._read_loop())
+        await self._settings_acked
+
+    async def send_frames(self, *frames: h2.H2Frame):
+        """
+        Send frames on this connection.
+        :param frames: 1 or more frames to send
+        """
+        self._check_setup_completed()
+        self._send_frames(*frames)
+        await self.writer.drain()
+
+    async def send_burst(self, burst: PreparedBurst):
+        """
+        Send a prepared burst on this connection, with a single write unless it was planned in NODELAY mode.
+        asyncio enables TCP_NODELAY on its sockets, so the planned segments are written right away.
+        :param burst: burst created with prepare_burst
+        """
+        self._check_setup_completed()
+        self._account_sent_frames(burst.data)
+        if burst.mode is SegmentMode.CORK and self._set_tcp_option(getattr(socket, 'TCP_CORK', None), 1):
+            try:
+                self._send(burst.data)
+                await self.writer.drain()
+            finally:
+                self._set_tcp_option(socket.TCP_CORK, 0)
+            return
+        for seg in burst.segments:
+            self._send(seg)
+        await self.writer.drain()
+
+    async def send_raw(self, data: bytes):
+        """
+        Send already serialized frames on this connection.
+        :param data: serialized frames, e.g. from a compiled corpus
+        """
+        self._check_setup_completed()
+        self._account_sent_frames(data)
+        self._send(data)
+        await self.writer.drain()
+
+    async def reset_streams(self, stream_ids: T.Iterable[int], error_code: int = h2.H2ErrorCodes.CANCEL):
+        """
+        Reset streams with RST_STREAM frames sent in a single write, see H2Connection.reset_streams.
+        :param stream_ids: streams to reset
+        :param error_code: error code of the RST_STREAM frames
+        """
+        self._check_setup_completed()
+        writer = FrameWriter()
+        for sid in stream_ids:
+            writer.rst_stream(sid, error_code)
+        if len(writer):
+            self._send_written(writer)
+            await self.writer.drain()
+
+    async def recv_frames(self) -> T.List[H2FrameView]:
+        """
+        Receive frames that were not claimed by a stream subscriber. Wait if there aren't any.
+        :return: list of received frames
+        """
+        self._check_setup_completed()
+        frames = [await self._unclaimed.get()]
+        while not self._unclaimed.empty():
+            frames.append(self._unclaimed.get_nowait())
+        if frames[-1] is None:
+            frames.pop()
+            if not frames:
+                raise ConnectionError('Connection to {}:{} was closed'.format(self.host, self.port))
+            # Report the closed connection on the next call
+            self._unclaimed.put_nowait(None)
+        return frames
+
+    def subscribe(self, stream_id: int) -> asyncio.Queue:
+        """
+        Route all frames received on a stream to a dedicated queue from now on.
+        After the connection closes, None is put on the queue.
+        :param stream_id: stream whose frames to collect
+        :return: queue that receives the stream's frames
+        """
+        return self._stream_queues.setdefault(stream_id, asyncio.Queue())
+
+    async def stream_frames(self, stream_id: int) -> T.AsyncIterator[H2FrameView]:
+        """
+        Iterate over the frames received on a stream until the server ends or resets it.
+        The HEADERS or CONTINUATION frame that ends a header block carries the decoded headers, see
+        H2FrameView.headers.
+        Subscribe to the stream before sending the request to make sure no frames are missed.
+        :param stream_id: stream whose frames to iterate over
+        """
+        queue = self.subscribe(stream_id)
+        try:
+            while True:
+                f = await queue.get()
+                if f is None:
+                    raise ConnectionError('Connection to {}:{} was closed'.format(self.host, self.port))
+                yield f
+                if 'ES' in f.flags or f.type == h2.H2ResetFrame.type_id:
+                    return
+        finally:
+            self._stream_queues.pop(stream_id, None)
+
+    async def infinite_read_loop(self, num_streams: int = 100, timeout: float = 10):
+        """
+        Read unclaimed frames until num_streams streams have ended or the timeout expires.
+        Received frames are logged by the read task.
+        :param num_streams: number of END_STREAM flags after which to stop
+        :param timeout: maximum time to read in seconds
+        """
+        self._check_setup_completed()
+        deadline = time.monotonic() + timeout
+        endstream_flags_detected = 0
+        while endstream_flags_detected < num_streams:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                frames = await asyncio.wait_for(self.recv_frames(), remaining)
+            except asyncio.TimeoutError:
+                return
+            for f in frames:
+                if 'ES' in f.flags:
+                    endstream_flags_detected += 1
+
+    async def ping(self, timeout: float = 1.0) -> bool:
+        """
+        Check whether the connection is alive by sending a PING frame and waiting for its ACK.
+        :param timeout: how long to wait for the ACK in seconds
+        :return: True if the ACK arrived in time and the server has not sent GOAWAY, False otherwise
+        """
+        self._check_setup_completed()
+        opaque = self.rtt.new_ping()
+        ack = asyncio.get_running_loop().create_future()
+        self._pings[opaque] = ack
+        try:
+            self._send_written(FrameWriter().ping(opaque))
+            await self.writer.drain()
+            await asyncio.wait_for(ack, timeout)
+        except (asyncio.TimeoutError, OSError):
+            return False
+        finally:
+            self._pings.pop(opaque, None)
+        return self.goaway_frame is None
+
+    async def close(self):
+        """
+        Close the connection, notifying the server with a GOAWAY frame if possible.
+        """
+        if self.is_closed:
+            return
+        self.is_closed = True
+        if self.writer is None:
+            return
+        try:
+            if self.is_setup_completed:
+                self._send_written(FrameWriter().goaway())
+            self.writer.close()
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+        finally:
+            if self._read_task is not None:
+                self._read_task.cancel()
+
+    def collect_responses(self, stream_ids: T.Iterable[int], timeout: float = 10.0):
+        """
+        Not available, iterate over stream_frames of every stream instead.
+        """
+        self._blocking('collect_responses', 'iterate over stream_frames of every stream instead')
+
+    def send_streaming_request(self, *args, **kwargs):
+        """
+        Not available, send the frames of create_request_frames with send_frames instead.
+        """
+        self._blocking('send_streaming_request', 'send the frames of create_request_frames with send_frames instead')
+
+    def send_streaming_requests(self, *args, **kwargs):
+        """
+        Not available, send the frames of create_request_frames_batch with send_frames instead.
+        """
+        self._blocking('send_streaming_requests',
+                       'send the frames of create_request_frames_batch with send_frames instead')
+
+    def await_delivery(self, timeout: float = 10.0):
+        """
+        Not available, await ping instead: its ACK also marks the delivery of everything sent before it.
+        """
+        self._blocking('await_delivery', 'await ping instead')
+
+    def settle(self, settle_time: T.Optional[float] = None, timeout: float = 10.0):
+        """
+        Not available, await asyncio.sleep or ping instead.
+        """
+        self._blocking('settle', 'await asyncio.sleep or ping instead')
+
+    def _blocking(self, name: str, alternative: str):
+        assert_error(False, '{} blocks on the socket and is not available on AsyncH2Connection, {}', name,
+                     alternative)
+
+    def _send(self, bytez):
+        # Only buffers the data, the public coroutines drain the writer
+        self.writer.write(bytez)
+
+    async def _read_loop(self):
+        try:
+            while True:
+                chunk = await self.reader.read(READ_SIZE)
+                if len(chunk) == 0:
+                    self.logger.info(f"[AsyncH2Connection] connection to {self.host}:{self.port} was closed by "
+                                     f"the peer")
+                    break
+                frames = self.decoder.feed_views(chunk)
+                self._update_recv_windows(frames)
+                self._update_peer_state(frames)
+                for f in frames:
+                    self._dispatch(f)
+        except OSError as e:
+            self.logger.info(f"[AsyncH2Connection] read from {self.host}:{self.port} failed: {e}")
+        finally:
+            self.is_closed = True
+            if self._settings_acked is not None and not self._settings_acked.done():
+                self._settings_acked.set_exception(ConnectionError('Connection closed during setup'))
+            for queue in list(self._stream_queues.values()) + [self._unclaimed]:
+                queue.put_nowait(None)
+
+    def _dispatch(self, f: H2FrameView):
+        self._log_frame('Read', f)
+        if f.type == h2.H2SettingsFrame.type_id:
+            if not has_ack_set(f):
+                self._ack_settings()
+            elif not self._settings_acked.done():
+                self.logger.info("Server acked our settings")
+                self._settings_acked.set_result(None)
+            return
+        if f.type == h2.H2PingFrame.type_id:
+            if not has_ack_set(f):
+                self._send_written(FrameWriter().ping(bytes(f.raw_payload), is_ack=True))
+                return
+            ack = self._pings.get(bytes(f.raw_payload))
+            if ack is not None and not ack.done():
+                ack.set_result(None)
+                return
+        if f.type == h2.H2GoAwayFrame.type_id:
+            self.goaway_frame = f
+        elif f.type in (h2.H2HeadersFrame.type_id, h2.H2ContinuationFrame.type_id):
+            # Decoded here, in the order of arrival, whether or not anyone is waiting for the stream
+            self._decode_header_frame(f)
+
+        queue = self._stream_queues.get(f.stream_id) if f.stream_id != 0 else None
+        if queue is None:
+            queue = self._unclaimed
+        queue.put_nowait(f)
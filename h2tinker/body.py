@@ -0,0 +1,101 @@
+import io
+import typing as T
+
+# Request body given as bytes, a binary file or an iterable of byte chunks, e.g. a generator
+BodySource = T.Union[bytes, bytearray, memoryview, T.BinaryIO, T.Iterable[bytes]]
+
+# Size of the reads from file bodies
+DEFAULT_READ_SIZE = 1 << 16
+_EMPTY = memoryview(b'')
+
+
+def _iter_pieces(source: T.Optional[BodySource], read_size: int) -> T.Iterator[memoryview]:
+    # Non-empty pieces of the body as memoryviews. Byte strings are never copied, file reads go into fresh
+    # buffers since a piece may still be referenced when the next one is read
+    if source is None:
+        return
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        if len(source):
+            yield memoryview(source).cast('B')
+    elif hasattr(source, 'readinto'):
+        while True:
+            buf = bytearray(read_size)
+            n = source.readinto(buf)
+            if not n:
+                return
+            yield memoryview(buf)[:n]
+    elif hasattr(source, 'read'):
+        while True:
+            data = source.read(read_size)
+            if not data:
+                return
+            yield memoryview(data).cast('B')
+    else:
+        for piece in source:
+            if piece:
+                yield memoryview(piece).cast('B')
+
+
+class BodyReader:
+    """
+    Incremental reader of a request body of any BodySource, handing out chunks of a requested size as
+    memoryview slices of the source, so that bytes bodies are never copied.
+
+    If withhold_last_byte is set, the last byte of the body is never returned by read. It's available in
+    withheld once the rest of the body has been read, to be sent in the final frame of last-frame synchronization.
+    """
+
+    def __init__(self, source: T.Optional[BodySource], withhold_last_byte: bool = False,
+                 read_size: int = DEFAULT_READ_SIZE):
+        """
+        :param source: the body, None for no body
+        :param withhold_last_byte: whether to keep the last byte out of the chunks returned by read
+        :param read_size: size of the reads from file bodies
+        """
+        if isinstance(source, str):
+            source = io.BytesIO(source.encode('UTF-8'))
+        self.withhold_last_byte = withhold_last_byte
+        self.withheld = b''
+        self.bytes_read = 0
+        self._pieces = _iter_pieces(source, read_size)
+        self._current = _EMPTY
+        # One piece of lookahead tells whether the current piece holds the last byte
+        self._next = next(self._pieces, None)  # type: T.Optional[memoryview]
+        self._settle()
+
+    @property
+    def is_empty(self) -> bool:
+        """
+        Whether the body has no bytes at all.
+        """
+        return self.bytes_read == 0 and not self._current and not self.withheld
+
+    @property
+    def done(self) -> bool:
+        """
+        Whether all the body, except the withheld byte, has been read.
+        """
+        return not self._current
+
+    def read(self, n: int) -> memoryview:
+        """
+        Read the next chunk of the body.
+        :param n: maximum chunk size, must be positive
+        :return: chunk of up to n bytes, empty when the body has been read
+        """
+        if self.withhold_last_byte and self._next is None:
+            # The current piece is the last one, it's at least 2 bytes long after _settle
+            n = min(n, len(self._current) - 1)
+        chunk = self._current[:n]
+        self._current = self._current[n:]
+        self.bytes_read += len(chunk)
+        self._settle()
+        return chunk
+
+    def _settle(self):
+        # Move on to the next non-empty piece, and set the withheld byte aside once it's all that's left
+        while not self._current and self._next is not None:
+            self._current, self._next = self._next, next(self._pieces, None)
+        if self.withhold_last_byte and self._next is None and len(self._current) == 1:
+            self.withheld = bytes(self._current)
+            self._current = _EMPTY
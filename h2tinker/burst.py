@@ -0,0 +1,144 @@
+import enum
+import math
+import typing as T
+
+# Maximum plaintext size of a single TLS record, see RFC 8446 section 5.1
+TLS_MAX_RECORD_PLAINTEXT = 16_384
+# Upper bound of per-record overhead for AEAD ciphers: 5-byte header, 8-byte explicit nonce (TLS 1.2) and 16-byte tag
+TLS_RECORD_OVERHEAD = 29
+_FRAME_HEADER_LEN = 9
+
+
+class SegmentMode(enum.Enum):
+    """
+    How a burst is handed to the kernel, which decides where TCP segments start and end.
+    """
+    # One write; with Nagle's algorithm enabled, a tail shorter than the MSS may be delayed until the ACK
+    # of the previous segment arrives
+    DEFAULT = 0
+    # TCP_NODELAY and one write per planned segment, so that every segment ends at a frame boundary
+    NODELAY = 1
+    # One write between setting and clearing TCP_CORK, so that the kernel only sends full-sized segments
+    CORK = 2
+
+
+def pack_segments(data: bytes, capacity: int) -> T.List[memoryview]:
+    """
+    Split serialized frames into as few chunks of at most capacity bytes as possible without splitting any frame
+    or changing their order. A frame larger than the capacity gets a chunk of its own.
+    :param data: serialized frames
+    :param capacity: maximum chunk size, e.g. the payload size of one TCP segment
+    :return: chunks covering data in order
+    """
+    view = memoryview(data)
+    chunks = []
+    chunk_start = 0
+    pos = 0
+    while pos < len(view):
+        frame_end = pos + _FRAME_HEADER_LEN + int.from_bytes(view[pos:pos + 3], 'big')
+        # Greedy packing is optimal when the order has to be kept
+        if frame_end - chunk_start > capacity and pos > chunk_start:
+            chunks.append(view[chunk_start:pos])
+            chunk_start = pos
+        pos = frame_end
+    if pos > chunk_start:
+        chunks.append(view[chunk_start:pos])
+    return chunks
+
+
+class PreparedBurst:
+    """
+    A group of frames serialized ahead of time into one contiguous buffer, ready to be written to the socket
+    with as few calls as the segment mode allows. Used for sending the withheld final frames in last-frame
+    synchronization.
+
+    The burst is planned against the connection's MSS: in NODELAY mode the frames are packed into the fewest
+    segments that end at frame boundaries, each of them also being a single TLS record on TLS connections.
+    """
+
+    def __init__(self, data: bytes, num_frames: int, mss: T.Optional[int], is_tls: bool,
+                 mode: SegmentMode = SegmentMode.DEFAULT):
+        """
+        :param data: serialized frames
+        :param num_frames: number of frames in the buffer
+        :param mss: TCP maximum segment size of the connection, None if unknown
+        :param is_tls: whether the buffer will be wrapped into TLS records
+        :param mode: how the burst is going to be sent
+        """
+        self.data = data
+        self.num_frames = num_frames
+        self.mss = mss
+        self.is_tls = is_tls
+        self.mode = mode
+        # Buffers written with one call each
+        if mode is SegmentMode.NODELAY and mss:
+            self.segments = pack_segments(data, self.segment_capacity)
+        else:
+            self.segments = [memoryview(data)]
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def segment_capacity(self) -> T.Optional[int]:
+        """
+        Number of frame bytes that fit into one TCP segment sent as one write, None if the MSS is unknown.
+        """
+        if not self.mss:
+            return None
+        if self.is_tls:
+            return min(self.mss - TLS_RECORD_OVERHEAD, TLS_MAX_RECORD_PLAINTEXT)
+        return self.mss
+
+    @property
+    def num_records(self) -> int:
+        """
+        Number of TLS records needed for the burst, 0 for plaintext connections.
+        """
+        if not self.is_tls:
+            return 0
+        return sum(max(1, math.ceil(len(seg) / TLS_MAX_RECORD_PLAINTEXT)) for seg in self.segments)
+
+    @property
+    def wire_size(self) -> int:
+        """
+        Number of TCP payload bytes the burst will occupy, including TLS record overhead.
+        """
+        return len(self.data) + self.num_records * TLS_RECORD_OVERHEAD
+
+    @property
+    def num_segments(self) -> T.Optional[int]:
+        """
+        Number of TCP segments needed for the burst, None if the MSS is unknown.
+        """
+        if not self.mss:
+            return None
+        if len(self.segments) == 1:
+            return max(1, math.ceil(self.wire_size / self.mss))
+        # Every write starts a new segment
+        overhead = TLS_RECORD_OVERHEAD if self.is_tls else 0
+        return sum(max(1, math.ceil((len(seg) + overhead) / self.mss)) for seg in self.segments)
+
+    @property
+    def fits_single_segment(self) -> T.Optional[bool]:
+        """
+        Whether the whole burst fits into a single TCP segment, None if the MSS is unknown.
+        """
+        if self.num_segments is None:
+            return None
+        return self.num_segments == 1
+
+    def describe(self) -> str:
+        """
+        Human-readable summary of the burst size compared to the segment and record limits.
+        """
+        desc = '{} frames, {} bytes ({} bytes on the wire'.format(self.num_frames, len(self.data), self.wire_size)
+        if self.is_tls:
+            desc += ' in {} TLS record(s)'.format(self.num_records)
+        desc += ')'
+        if self.mss:
+            desc += ', MSS {}: {} segment(s)'.format(self.mss, self.num_segments)
+        else:
+            desc += ', MSS unknown'
+        desc += ', {} write(s) in {} mode'.format(len(self.segments), self.mode.name)
+        return desc
@@ -0,0 +1,274 @@
+import base64
+import hashlib
+import json
+import mmap
+import os
+import struct
+import typing as T
+
+from h2tinker.assrt import assert_error
+from h2tinker.burst import SegmentMode
+from h2tinker.h2_connection import H2Connection
+from h2tinker.hpack import HPackEncoder, DEFAULT_MAX_FRAME_SIZE
+from h2tinker.response import ResponseSet
+from h2tinker.serializer import FrameWriter
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'h2tinker')
+
+# Bumped whenever the compiled representation changes, so that stale cache files are not used
+_BUNDLE_MAGIC = b'H2C1'
+_BUNDLE_HEADER = struct.Struct('!4sI')
+_ENTRY_HEADER = struct.Struct('!IIH')
+_OFFSET = struct.Struct('!I')
+_STREAM_ID = struct.Struct('!I')
+# The stream ID is the last field of the 9-byte frame header
+_STREAM_ID_OFFSET = 5
+
+
+class CorpusRecord(T.NamedTuple):
+    """
+    A request read from a corpus file.
+    """
+    method: str
+    path: str
+    authority: str
+    headers: T.List[T.Tuple[str, str]]
+    body: bytes
+    scheme: str = 'http'
+
+
+def iter_jsonl_records(path: str) -> T.Iterator[CorpusRecord]:
+    """
+    Stream request records from a JSON Lines file, one JSON object per line:
+    {"method": "POST", "path": "/race", "authority": "example.com:443",
+     "headers": [["user-agent", "..."], ...], "body": "text body" or "body_base64": "...", "scheme": "https"}
+    Only method, path and authority are required. Empty lines are skipped.
+    :param path: file to read
+    """
+    with open(path, 'r', encoding='UTF-8') as fh:
+        for line_no, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            obj = json.loads(line)
+            assert_error(all(k in obj for k in ('method', 'path', 'authority')),
+                         'Record on line {} of {} is missing method, path or authority', line_no, path)
+            if 'body_base64' in obj:
+                body = base64.b64decode(obj['body_base64'])
+            else:
+                body = obj.get('body', '').encode('UTF-8')
+            yield CorpusRecord(obj['method'], obj['path'], obj['authority'],
+                               [(name, value) for name, value in obj.get('headers', [])],
+                               body, obj.get('scheme', 'http'))
+
+
+def iter_mitmproxy_records(path: str) -> T.Iterator[CorpusRecord]:
+    """
+    Stream request records from a mitmproxy flow dump, e.g. one saved with mitmdump -w. Requires mitmproxy.
+    :param path: dump file to read
+    """
+    from mitmproxy import http, io
+
+    with open(path, 'rb') as fh:
+        for flow in io.FlowReader(fh).stream():
+            if not isinstance(flow, http.HTTPFlow):
+                continue
+            req = flow.request
+            yield CorpusRecord(req.method, req.path, '{}:{}'.format(req.host, req.port),
+                               [(name, value) for name, value in req.headers.items(multi=True)],
+                               req.content or b'', req.scheme)
+
+
+class CompiledRequest:
+    """
+    Request frames serialized for last-frame synchronization: the prefix holds the HEADERS, CONTINUATION and DATA
+    frames without END_STREAM, the final frame is a DATA frame holding the last body byte and END_STREAM.
+
+    The header block only uses the static HPACK table and literals without indexing, so the bytes are valid on
+    any connection in any order. Stream IDs are patched in when the frames are sent.
+    """
+
+    __slots__ = ('prefix', 'final', 'prefix_frame_offsets')
+
+    def __init__(self, prefix: T.Union[bytes, memoryview], final: T.Union[bytes, memoryview],
+                 prefix_frame_offsets: T.Sequence[int]):
+        self.prefix = prefix
+        self.final = final
+        self.prefix_frame_offsets = prefix_frame_offsets
+
+
+def compile_record(record: CorpusRecord, max_frame_size: int = DEFAULT_MAX_FRAME_SIZE) -> CompiledRequest:
+    """
+    Serialize a record into context-free frames, see CompiledRequest.
+    :param record: request to compile
+    :param max_frame_size: maximum frame payload size
+    """
+    # A zero-size dynamic table makes the encoder use only static entries and literals without indexing
+    encoder = HPackEncoder(header_table_size=0)
+    placeholder_stream_id = 1
+    seq = encoder.encode_request(record.method, record.path, record.authority, placeholder_stream_id,
+                                 record.headers, record.body[:-1], record.scheme, max_frame_size)
+    offsets = []
+    chunks = []
+    pos = 0
+    for f in seq.frames:
+        if 'ES' in f.flags:
+            f.flags.remove('ES')
+        raw = bytes(f)
+        offsets.append(pos)
+        chunks.append(raw)
+        pos += len(raw)
+
+    final = FrameWriter(32).data(placeholder_stream_id, record.body[-1:], end_stream=True).getvalue()
+    return CompiledRequest(b''.join(chunks), final, offsets)
+
+
+class CompiledCorpus:
+    """
+    Requests of a corpus file compiled into serialized frames and cached on disk.
+
+    The cache file is keyed by a hash of the corpus file contents and memory-mapped when loaded, so running the
+    same scenario again skips HPACK encoding and scapy entirely. The prefix and final frames of the requests are
+    then views of the mapping, valid until close is called.
+    """
+
+    def __init__(self, requests: T.List[CompiledRequest], cache_path: T.Optional[str] = None,
+                 mapping: T.Optional[mmap.mmap] = None, view: T.Optional[memoryview] = None):
+        """
+        :param requests: compiled requests
+        :param cache_path: cache file the requests were loaded from
+        :param mapping: memory mapping of the cache file
+        :param view: view of the whole mapping that the prefix and final frames of the requests are slices of
+        """
+        self.requests = requests
+        self.cache_path = cache_path
+        self._mapping = mapping
+        self._view = view
+
+    def __len__(self):
+        return len(self.requests)
+
+    @classmethod
+    def load(cls, path: str, cache_dir: str = DEFAULT_CACHE_DIR, fmt: str = 'jsonl',
+             max_frame_size: int = DEFAULT_MAX_FRAME_SIZE) -> 'CompiledCorpus':
+        """
+        Load a compiled corpus from the cache, compiling and caching it first if necessary.
+        :param path: corpus file
+        :param cache_dir: directory for the cache files
+        :param fmt: corpus file format, 'jsonl' or 'mitmproxy'
+        :param max_frame_size: maximum frame payload size used for compiling
+        """
+        assert_error(fmt in ('jsonl', 'mitmproxy'), 'Unknown corpus format: {}', fmt)
+        cache_path = os.path.join(cache_dir, cls._cache_key(path, fmt, max_frame_size) + '.h2c')
+        if not os.path.exists(cache_path):
+            records = iter_jsonl_records(path) if fmt == 'jsonl' else iter_mitmproxy_records(path)
+            cls._write_cache(cache_path, (compile_record(r, max_frame_size) for r in records))
+        return cls._read_cache(cache_path)
+
+    def build(self, stream_ids: T.Sequence[int]) -> T.Tuple[bytes, bytes]:
+        """
+        Assemble the frames of all requests with the given stream IDs.
+        :param stream_ids: stream ID for each request, in order
+        :return: tuple of all prefixes to be sent first and all final frames to be sent as the burst
+        """
+        assert_error(len(stream_ids) == len(self.requests), 'Expected {} stream IDs, got {}',
+                     len(self.requests), len(stream_ids))
+        prefixes = bytearray(sum(len(r.prefix) for r in self.requests))
+        finals = bytearray(sum(len(r.final) for r in self.requests))
+        prefix_pos = 0
+        final_pos = 0
+        for req, sid in zip(self.requests, stream_ids):
+            prefixes[prefix_pos:prefix_pos + len(req.prefix)] = req.prefix
+            for offset in req.prefix_frame_offsets:
+                _STREAM_ID.pack_into(prefixes, prefix_pos + offset + _STREAM_ID_OFFSET, sid)
+            prefix_pos += len(req.prefix)
+            finals[final_pos:final_pos + len(req.final)] = req.final
+            _STREAM_ID.pack_into(finals, final_pos + _STREAM_ID_OFFSET, sid)
+            final_pos += len(req.final)
+        return bytes(prefixes), bytes(finals)
+
+    def close(self):
+        """
+        Release the memory mapping of the cache file. The compiled requests can't be used afterwards: the prefix
+        and final views of requests loaded from the cache are released, so references to them held by the caller
+        become invalid. Views the caller has sliced from them must be released before, otherwise the mapping
+        can't be closed and BufferError is raised.
+        """
+        requests, self.requests = self.requests, []
+        if self._mapping is None:
+            return
+        for req in requests:
+            for buf in (req.prefix, req.final):
+                if isinstance(buf, memoryview):
+                    buf.release()
+        self._view.release()
+        self._mapping.close()
+        self._mapping = None
+        self._view = None
+
+    @staticmethod
+    def _cache_key(path: str, fmt: str, max_frame_size: int) -> str:
+        digest = hashlib.sha256()
+        digest.update(_BUNDLE_MAGIC + '{}:{}'.format(fmt, max_frame_size).encode('ascii'))
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _write_cache(cache_path: str, compiled: T.Iterable[CompiledRequest]):
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        with open(tmp_path, 'wb') as fh:
+            fh.write(_BUNDLE_HEADER.pack(_BUNDLE_MAGIC, 0))
+            count = 0
+            for req in compiled:
+                fh.write(_ENTRY_HEADER.pack(len(req.prefix), len(req.final), len(req.prefix_frame_offsets)))
+                fh.write(b''.join(_OFFSET.pack(o) for o in req.prefix_frame_offsets))
+                fh.write(req.prefix)
+                fh.write(req.final)
+                count += 1
+            fh.seek(0)
+            fh.write(_BUNDLE_HEADER.pack(_BUNDLE_MAGIC, count))
+        os.replace(tmp_path, cache_path)
+
+    @classmethod
+    def _read_cache(cls, cache_path: str) -> 'CompiledCorpus':
+        with open(cache_path, 'rb') as fh:
+            mapping = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapping)
+        magic, count = _BUNDLE_HEADER.unpack_from(view)
+        assert_error(magic == _BUNDLE_MAGIC, 'Not a compiled corpus file: {}', cache_path)
+        pos = _BUNDLE_HEADER.size
+        requests = []
+        for _ in range(count):
+            prefix_len, final_len, num_offsets = _ENTRY_HEADER.unpack_from(view, pos)
+            pos += _ENTRY_HEADER.size
+            offsets = [_OFFSET.unpack_from(view, pos + i * _OFFSET.size)[0] for i in range(num_offsets)]
+            pos += num_offsets * _OFFSET.size
+            prefix = view[pos:pos + prefix_len]
+            pos += prefix_len
+            final = view[pos:pos + final_len]
+            pos += final_len
+            requests.append(CompiledRequest(prefix, final, offsets))
+        return cls(requests, cache_path, mapping, view)
+
+
+def race_corpus(conn: H2Connection, corpus: CompiledCorpus, settle_time: T.Optional[float] = None,
+                timeout: float = 10.0, segment_mode: SegmentMode = SegmentMode.NODELAY) -> ResponseSet:
+    """
+    Race all requests of a compiled corpus on a connection with last-frame synchronization.
+    :param conn: set-up connection
+    :param corpus: compiled requests
+    :param settle_time: time in seconds to wait after sending the prefixes so that they are delivered, None to wait
+    until the server has received them, see H2Connection.settle
+    :param timeout: maximum time in seconds to wait for the responses
+    :param segment_mode: how the final frames are handed to the kernel
+    :return: collected responses
+    """
+    stream_ids = conn.allocate_stream_ids(len(corpus))
+    prefixes, finals = corpus.build(stream_ids)
+    conn.send_raw(prefixes)
+    burst = conn.prepare_raw_burst(finals, len(corpus), segment_mode)
+    conn.settle(settle_time, timeout)
+    conn.send_burst(burst)
+    return conn.collect_responses(stream_ids, timeout)
@@ -0,0 +1,109 @@
+import typing as T
+
+import scapy.contrib.http2 as h2
+
+from h2tinker.assrt import assert_error
+from h2tinker.frame_view import H2FrameView
+
+FRAME_HEADER_LEN = 9
+# Largest frame size a peer may advertise via SETTINGS_MAX_FRAME_SIZE
+MAX_FRAME_SIZE_LIMIT = 16_777_215
+
+FrameBuffer = T.Union[bytearray, memoryview]
+
+
+class H2FrameDecoder:
+    """
+    Incremental HTTP/2 frame decoder that reassembles frames split across arbitrary read boundaries.
+
+    Frames contained entirely in one chunk are returned as memoryview slices of that chunk without copying.
+    Only the bytes of a frame that straddles chunk boundaries are copied, exactly once, into a reassembly buffer
+    that is then handed over to the caller.
+    """
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE_LIMIT):
+        """
+        :param max_frame_size: largest acceptable frame payload length, larger frames are treated as a protocol error
+        """
+        self.max_frame_size = max_frame_size
+        self._pending = bytearray()
+        self._pending_frame_len = 0
+
+    def has_pending_data(self) -> bool:
+        """
+        Check whether a partially received frame is waiting for more data.
+        """
+        return len(self._pending) > 0
+
+    def feed(self, data: bytes) -> T.List[h2.H2Frame]:
+        """
+        Feed received bytes into the decoder.
+        :param data: bytes read from the connection, can cut frames at any position
+        :return: list of frames completed by this chunk, can be empty
+        """
+        return [h2.H2Frame(bytes(buf)) for buf in self.feed_raw(data)]
+
+    def feed_views(self, data: bytes) -> T.List[H2FrameView]:
+        """
+        Feed received bytes into the decoder, decoding only the headers of the completed frames.
+        :param data: bytes read from the connection, must not be mutated afterwards
+        :return: list of frame views completed by this chunk, can be empty
+        """
+        return [H2FrameView(buf) for buf in self.feed_raw(data)]
+
+    def feed_raw(self, data: bytes) -> T.List[FrameBuffer]:
+        """
+        Feed received bytes into the decoder without dissecting the completed frames.
+        :param data: bytes read from the connection, must not be mutated afterwards
+        :return: list of buffers, each holding exactly one complete frame including its 9-byte header
+        """
+        view = memoryview(data)
+        frames = []
+
+        if self._pending:
+            view = self._fill_pending(view)
+            if self._pending_frame_len == 0 or len(self._pending) < self._pending_frame_len:
+                return frames
+            # The reassembly buffer holds exactly one frame: hand it over and start a fresh one
+            frames.append(self._pending)
+            self._pending = bytearray()
+            self._pending_frame_len = 0
+
+        pos = 0
+        end = len(view)
+        while end - pos >= FRAME_HEADER_LEN:
+            frame_len = FRAME_HEADER_LEN + self._payload_len(view[pos:pos + 3])
+            if end - pos < frame_len:
+                break
+            frames.append(view[pos:pos + frame_len])
+            pos += frame_len
+
+        if pos < end:
+            self._pending = bytearray(view[pos:])
+            if len(self._pending) >= FRAME_HEADER_LEN:
+                self._pending_frame_len = FRAME_HEADER_LEN + self._payload_len(self._pending[:3])
+
+        return frames
+
+    def _fill_pending(self, view: memoryview) -> memoryview:
+        """
+        Move bytes from the given chunk into the reassembly buffer until its frame is complete.
+        :return: rest of the chunk that was not consumed
+        """
+        if self._pending_frame_len == 0:
+            header_missing = FRAME_HEADER_LEN - len(self._pending)
+            self._pending += view[:header_missing]
+            view = view[header_missing:]
+            if len(self._pending) < FRAME_HEADER_LEN:
+                return view
+            self._pending_frame_len = FRAME_HEADER_LEN + self._payload_len(self._pending[:3])
+
+        missing = self._pending_frame_len - len(self._pending)
+        self._pending += view[:missing]
+        return view[missing:]
+
+    def _payload_len(self, length_field: FrameBuffer) -> int:
+        length = int.from_bytes(length_field, 'big')
+        assert_error(length <= self.max_frame_size, 'Received frame with payload length {} exceeding maximum '
+                                                    'frame size {}', length, self.max_frame_size)
+        return length
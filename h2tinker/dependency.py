@@ -0,0 +1,200 @@
+import typing as T
+
+import scapy.contrib.http2 as h2
+
+from h2tinker.assrt import assert_error
+from h2tinker.h2_connection import H2Connection
+from h2tinker.request import H2Request
+from h2tinker.response import ResponseSet
+from h2tinker.serializer import FrameWriter
+
+# Weight of streams that don't specify one, see RFC 7540 section 5.3.5
+DEFAULT_WEIGHT = 16
+
+
+class DependencyNode(T.NamedTuple):
+    """
+    Request or request-less group in a dependency tree, see DependencyTree.
+    """
+    key: str
+    # None for a group, which is announced with a PRIORITY frame only
+    request: T.Optional[H2Request]
+    depends_on: T.Tuple[str, ...]
+    # Weight between 1 and 256
+    weight: int
+    exclusive: bool
+    # Whether the last body byte is withheld and sent with the final burst
+    withhold: bool
+
+
+class DependencyPlan(T.NamedTuple):
+    """
+    Frames of a dependency tree scheduled on a connection, see DependencyTree.build.
+    """
+    # Stream ID of every node, in the order the nodes are sent
+    stream_ids: T.Dict[str, int]
+    # Stream dependency of every node, None for nodes depending on the root
+    parents: T.Dict[str, T.Optional[str]]
+    # PRIORITY frames and request frames, to be sent first in this order
+    frames: T.List[T.Union[h2.H2Frame, h2.H2Seq]]
+    # Final DATA frames of the withheld requests
+    finals: FrameWriter
+
+
+class DependencyResult(T.NamedTuple):
+    """
+    Responses to the requests of a dependency tree with the keys of the nodes.
+    """
+    plan: DependencyPlan
+    responses: ResponseSet
+
+    def completion_order(self) -> T.List[str]:
+        """
+        Keys of completed requests ordered by the time their streams were ended or reset.
+        """
+        keys = {sid: key for key, sid in self.plan.stream_ids.items()}
+        return [keys[sid] for sid in self.responses.completion_order()]
+
+    def order_violations(self) -> T.List[T.Tuple[str, str]]:
+        """
+        Find requests that completed before a request they depend on, directly or through other nodes,
+        i.e. where the server didn't respect the tree.
+        :return: list of (dependency key, dependant key) pairs
+        """
+        violations = []
+        for key, sid in self.plan.stream_ids.items():
+            if sid not in self.responses.responses:
+                continue
+            end_ns = self.responses[sid].end_ns
+            parent = self.plan.parents[key]
+            while parent is not None:
+                parent_sid = self.plan.stream_ids[parent]
+                if parent_sid in self.responses.responses:
+                    parent_end_ns = self.responses[parent_sid].end_ns
+                    if end_ns is not None and (parent_end_ns is None or parent_end_ns > end_ns):
+                        violations.append((parent, key))
+                parent = self.plan.parents[parent]
+        return violations
+
+
+class DependencyTree:
+    """
+    Declarative description of requests and the HTTP/2 priority dependencies between them.
+
+    Nodes are added with the keys of the nodes they depend on. HTTP/2 gives every stream exactly one parent,
+    so a node with several dependencies is made dependent on the deepest of them; the others are only honored
+    by sending the node after them. Weights and exclusivity are applied to that single dependency.
+
+    Requests are sent in dependency order with priority HEADERS frames, groups with PRIORITY frames, all in one
+    write. Withheld requests are then completed with a single final burst, as in last-frame synchronization.
+    """
+
+    def __init__(self):
+        self.nodes = {}  # type: T.Dict[str, DependencyNode]
+
+    def add(self, key: str, request: H2Request, depends_on: T.Iterable[str] = (), weight: int = DEFAULT_WEIGHT,
+            exclusive: bool = False, withhold: bool = False) -> 'DependencyTree':
+        """
+        Add a request to the tree.
+        :param key: unique name of the node
+        :param request: request to send, its stream ID is ignored and assigned when the tree is built
+        :param depends_on: keys of the nodes this request depends on, empty to depend on the root
+        :param weight: weight between 1 and 256 relative to the other dependants of the same node
+        :param exclusive: whether to become the sole dependant of the node it depends on
+        :param withhold: whether to withhold the last body byte until the final burst
+        :return: the tree, so that calls can be chained
+        """
+        return self._add(DependencyNode(key, request, tuple(depends_on), weight, exclusive, withhold))
+
+    def add_group(self, key: str, depends_on: T.Iterable[str] = (), weight: int = DEFAULT_WEIGHT,
+                  exclusive: bool = False) -> 'DependencyTree':
+        """
+        Add a request-less node that other nodes can depend on, announced with a PRIORITY frame on an idle stream.
+        :param key: unique name of the node
+        :param depends_on: keys of the nodes this group depends on, empty to depend on the root
+        :param weight: weight between 1 and 256 relative to the other dependants of the same node
+        :param exclusive: whether to become the sole dependant of the node it depends on
+        :return: the tree, so that calls can be chained
+        """
+        return self._add(DependencyNode(key, None, tuple(depends_on), weight, exclusive, False))
+
+    def build(self, conn: H2Connection) -> DependencyPlan:
+        """
+        Assign stream IDs in dependency order and create the frames of all nodes.
+        :param conn: set-up connection, its HPACK context and stream IDs are used
+        :return: frames to send, see run
+        """
+        order, parents = self._resolve()
+        stream_ids = dict(zip(order, conn.allocate_stream_ids(len(order))))
+        frames = []
+        finals = FrameWriter()
+        for key in order:
+            node = self.nodes[key]
+            sid = stream_ids[key]
+            dep_sid = stream_ids[parents[key]] if parents[key] is not None else 0
+            if node.request is None:
+                frames.append(h2.H2Frame(stream_id=sid) /
+                              h2.H2PriorityFrame(exclusive=int(node.exclusive), stream_dependency=dep_sid,
+                                                 weight=node.weight - 1))
+                continue
+
+            req = node.request
+            body = req.body or b''
+            seq = conn.create_dependant_request_frames(req.method, req.path, sid, dep_sid, node.weight - 1,
+                                                       node.exclusive, req.headers,
+                                                       body[:-1] if node.withhold else body)
+            if node.withhold:
+                for f in seq.frames:
+                    if 'ES' in f.flags:
+                        f.flags.remove('ES')
+                finals.data(sid, body[-1:], end_stream=True)
+            frames.append(seq)
+        return DependencyPlan(stream_ids, parents, frames, finals)
+
+    def run(self, conn: H2Connection, settle_time: T.Optional[float] = None, timeout: float = 10.0) -> DependencyResult:
+        """
+        Send the whole tree and collect the responses.
+        :param conn: set-up connection
+        :param settle_time: time in seconds to wait before the final burst so that the other frames are delivered,
+        None to wait until the server has received them, see H2Connection.settle
+        :param timeout: maximum time in seconds to wait for the responses
+        :return: responses and the plan they were sent with
+        """
+        plan = self.build(conn)
+        conn.send_frames(*plan.frames)
+        if plan.finals.num_frames:
+            burst = conn.prepare_raw_burst(plan.finals.getvalue(), plan.finals.num_frames)
+            conn.settle(settle_time, timeout)
+            conn.send_burst(burst)
+        request_sids = [plan.stream_ids[key] for key in plan.stream_ids if self.nodes[key].request is not None]
+        return DependencyResult(plan, conn.collect_responses(request_sids, timeout))
+
+    def _add(self, node: DependencyNode) -> 'DependencyTree':
+        assert_error(node.key not in self.nodes, 'Node {} already exists', node.key)
+        assert_error(1 <= node.weight <= 256, 'Weight of node {} must be between 1 and 256, got {}',
+                     node.key, node.weight)
+        self.nodes[node.key] = node
+        return self
+
+    def _resolve(self) -> T.Tuple[T.List[str], T.Dict[str, T.Optional[str]]]:
+        # Topological order that keeps the insertion order where possible, and the parent of every node
+        for node in self.nodes.values():
+            for dep in node.depends_on:
+                assert_error(dep in self.nodes, 'Node {} depends on unknown node {}', node.key, dep)
+
+        order = []
+        depth = {}  # type: T.Dict[str, int]
+        parents = {}  # type: T.Dict[str, T.Optional[str]]
+        remaining = list(self.nodes)
+        while remaining:
+            ready = [key for key in remaining if all(dep in depth for dep in self.nodes[key].depends_on)]
+            assert_error(len(ready) > 0, 'Dependency cycle between nodes {}', remaining)
+            for key in ready:
+                deps = self.nodes[key].depends_on
+                # The deepest dependency, the last listed one on ties
+                parent = max(reversed(deps), key=lambda d: depth[d]) if deps else None
+                depth[key] = depth[parent] + 1 if parent is not None else 0
+                parents[key] = parent
+                order.append(key)
+            remaining = [key for key in remaining if key not in depth]
+        return order, parents
@@ -0,0 +1,172 @@
+import concurrent.futures
+import logging
+import threading
+import time
+import typing as T
+
+from h2tinker.assrt import assert_error
+from h2tinker.burst import SegmentMode
+from h2tinker.h2_connection import H2Connection
+from h2tinker.pool import H2ConnectionPool
+from h2tinker.request import H2Request
+from h2tinker.response import StreamResponse
+
+
+class ConnectionTrigger(T.NamedTuple):
+    """
+    Timing of the final-frame flush on one connection, in perf_counter_ns time.
+    """
+    connection_index: int
+    num_requests: int
+    send_start_ns: int
+    send_end_ns: int
+
+
+class FanoutResult(T.NamedTuple):
+    """
+    Merged result of a fan-out race.
+    """
+    # Response to each request, keyed by the request's index in the input sequence
+    responses: T.Dict[int, StreamResponse]
+    triggers: T.List[ConnectionTrigger]
+
+    @property
+    def trigger_skew_ns(self) -> int:
+        """
+        Time between the first and the last connection starting its final-frame flush.
+        """
+        starts = [t.send_start_ns for t in self.triggers]
+        return max(starts) - min(starts)
+
+    @property
+    def send_window_ns(self) -> int:
+        """
+        Time between the first flush starting and the last flush returning.
+        """
+        return max(t.send_end_ns for t in self.triggers) - min(t.send_start_ns for t in self.triggers)
+
+
+class FanoutRace:
+    """
+    Last-frame synchronization spread over several connections, for races that need more concurrent requests
+    than the server's SETTINGS_MAX_CONCURRENT_STREAMS allows on one connection.
+
+    Every connection is driven by its own thread: it builds and sends its share of the request prefixes,
+    serializes its final frames into a prepared burst and then waits on a barrier shared by all connections,
+    so the final flushes start together. Sockets release the GIL while sending, so the flushes overlap.
+    """
+
+    def __init__(self, logger: logging.Logger, connections: T.Sequence[H2Connection]):
+        """
+        :param logger: logger for race events
+        :param connections: set-up connections to spread the requests over
+        """
+        self.logger = logger
+        self.connections = list(connections)
+
+    @classmethod
+    def open(cls, logger: logging.Logger, pool: H2ConnectionPool, num_connections: int,
+             host: str, port: int = 443, server_name: T.Optional[str] = None) -> 'FanoutRace':
+        """
+        Acquire connections for a fan-out race from a pool, setting up missing connections in parallel.
+        :param logger: logger for race events
+        :param pool: pool to acquire the connections from, see release
+        :param num_connections: number of connections to use
+        :param host: host where to connect
+        :param port: TCP port where to connect
+        :param server_name: TLS server name, defaults to host
+        """
+        with concurrent.futures.ThreadPoolExecutor(num_connections) as executor:
+            conns = list(executor.map(lambda _: pool.acquire(host, port, server_name), range(num_connections)))
+        return cls(logger, conns)
+
+    def release(self, pool: H2ConnectionPool):
+        """
+        Return the connections to the pool they were acquired from.
+        """
+        for conn in self.connections:
+            pool.release(conn)
+
+    def run(self, requests: T.Sequence[H2Request], settle_time: T.Optional[float] = None,
+            read_timeout: float = 10.0, segment_mode: SegmentMode = SegmentMode.NODELAY) -> FanoutResult:
+        """
+        Run the race: split the requests into contiguous groups, one per connection and no larger than its
+        SETTINGS_MAX_CONCURRENT_STREAMS, send all prefixes,
+        then flush all final frames at the same time and collect the responses.
+        :param requests: requests to race, their stream IDs are ignored and allocated per connection
+        :param settle_time: time in seconds to wait after sending the prefixes so that they are delivered, None to
+        wait until each server has received them, see H2Connection.settle
+        :param read_timeout: maximum time in seconds to wait for the responses after the flush
+        :param segment_mode: how the final frames are handed to the kernel on each connection
+        :return: responses merged over all connections and the measured trigger timings
+        """
+        assert_error(len(requests) > 0 and len(self.connections) > 0, 'Fan-out race needs at least one request '
+                                                                      'and one connection')
+        # Groups of request indices keyed by connection index, connections without requests are left out
+        groups = {}  # type: T.Dict[int, T.List[int]]
+        start = 0
+        for i, size in enumerate(self._group_sizes(len(requests))):
+            if size:
+                groups[i] = list(range(start, start + size))
+                start += size
+        num_groups = len(groups)
+
+        barrier = threading.Barrier(num_groups)
+        with concurrent.futures.ThreadPoolExecutor(num_groups) as executor:
+            futures = [executor.submit(self._race_on_connection, i, self.connections[i],
+                                       [requests[j] for j in group], group, barrier, settle_time, read_timeout,
+                                       segment_mode)
+                       for i, group in groups.items()]
+            conn_results = [f.result() for f in futures]
+
+        responses = {}
+        triggers = []
+        for trigger, conn_responses in conn_results:
+            triggers.append(trigger)
+            responses.update(conn_responses)
+        result = FanoutResult(responses, triggers)
+        self.logger.info(f"[FanoutRace] {len(requests)} requests over {num_groups} connections, "
+                         f"trigger skew {result.trigger_skew_ns / 1000:.1f} us, "
+                         f"send window {result.send_window_ns / 1000:.1f} us")
+        return result
+
+    def _group_sizes(self, num_requests: int) -> T.List[int]:
+        # Spread the requests evenly over the connections without exceeding the concurrent stream limit of any,
+        # filling the connections with the lowest limits first
+        limits = [conn.peer_settings.max_concurrent_streams for conn in self.connections]
+        limits = [num_requests if limit is None else limit for limit in limits]
+        sizes = [0] * len(limits)
+        remaining = num_requests
+        order = sorted(range(len(limits)), key=lambda i: limits[i])
+        for n, i in enumerate(order):
+            sizes[i] = min(limits[i], -(-remaining // (len(order) - n)))
+            remaining -= sizes[i]
+        assert_error(remaining == 0, 'The connections allow {} concurrent streams in total, too few to race {} '
+                                     'requests at once, use more connections or WaveRace',
+                     num_requests - remaining, num_requests)
+        return sizes
+
+    def _race_on_connection(self, conn_index: int, conn: H2Connection, requests: T.List[H2Request],
+                            request_indices: T.List[int], barrier: threading.Barrier,
+                            settle_time: T.Optional[float], read_timeout: float, segment_mode: SegmentMode) \
+            -> T.Tuple[ConnectionTrigger, T.Dict[int, StreamResponse]]:
+        try:
+            stream_ids = conn.allocate_stream_ids(len(requests))
+            requests = [req._replace(stream_id=sid) for req, sid in zip(requests, stream_ids)]
+            prefix_frames, final_frames = conn.create_withheld_request_frames(requests)
+            conn.send_frames(*prefix_frames)
+            burst = conn.prepare_burst(*final_frames, mode=segment_mode)
+            conn.settle(settle_time, read_timeout)
+            barrier.wait()
+        except Exception:
+            # Don't leave the other connections waiting for this one forever
+            barrier.abort()
+            raise
+
+        send_start_ns = time.perf_counter_ns()
+        conn.send_burst(burst)
+        send_end_ns = time.perf_counter_ns()
+
+        response_set = conn.collect_responses(stream_ids, read_timeout)
+        responses = {req_index: response_set[sid] for req_index, sid in zip(request_indices, stream_ids)}
+        return ConnectionTrigger(conn_index, len(requests), send_start_ns, send_end_ns), responses
@@ -0,0 +1,167 @@
+import struct
+import typing as T
+
+import scapy.contrib.http2 as h2
+from scapy.packet import NoPayload
+
+from h2tinker.assrt import assert_error
+
+FrameBuffer = T.Union[bytearray, memoryview, bytes]
+
+# Frame header: 24-bit length and 8-bit type packed into one 32-bit integer, flags, reserved bit and stream ID
+_FRAME_HEADER = struct.Struct('!IBI')
+_U32 = struct.Struct('!I')
+_STREAM_ID_MASK = 0x7fffffff
+
+# Short flag names as used by scapy, per frame type and flag bit
+FRAME_FLAG_NAMES = {
+    0: {0x1: 'ES', 0x8: 'P'},
+    1: {0x1: 'ES', 0x4: 'EH', 0x8: 'P', 0x20: '+'},
+    4: {0x1: 'A'},
+    5: {0x4: 'EH', 0x8: 'P'},
+    6: {0x1: 'A'},
+    9: {0x4: 'EH'},
+}
+_FLAG_SETS = {}  # type: T.Dict[T.Tuple[int, int], T.FrozenSet[str]]
+
+_PAYLOAD_CLASSES = {
+    h2.H2PriorityFrame.type_id: h2.H2PriorityFrame,
+    h2.H2ResetFrame.type_id: h2.H2ResetFrame,
+    h2.H2SettingsFrame.type_id: h2.H2SettingsFrame,
+    h2.H2PingFrame.type_id: h2.H2PingFrame,
+    h2.H2GoAwayFrame.type_id: h2.H2GoAwayFrame,
+    h2.H2WindowUpdateFrame.type_id: h2.H2WindowUpdateFrame,
+    h2.H2ContinuationFrame.type_id: h2.H2ContinuationFrame,
+}
+
+
+def _flag_set(frame_type: int, flag_bits: int) -> T.FrozenSet[str]:
+    key = (frame_type, flag_bits)
+    flags = _FLAG_SETS.get(key)
+    if flags is None:
+        names = FRAME_FLAG_NAMES.get(frame_type, {})
+        flags = frozenset(name for bit, name in names.items() if flag_bits & bit)
+        _FLAG_SETS[key] = flags
+    return flags
+
+
+class H2FrameView:
+    """
+    Lightweight read-only view of a received frame. Only the 9-byte header is decoded, the payload is kept as
+    a memoryview of the received bytes.
+
+    The scapy packet is dissected the first time it is needed: by show, packet or payload, or by accessing a
+    payload field the view doesn't decode itself, e.g. hdrs or last_stream_id. DATA payloads, header block
+    fragments and RST_STREAM and GOAWAY error codes are decoded without scapy.
+    """
+
+    __slots__ = ('type', 'flags', 'flag_bits', 'reserved', 'stream_id', 'len', 'raw_payload', 'headers', '_buf',
+                 '_packet')
+
+    def __init__(self, buf: FrameBuffer):
+        """
+        :param buf: exactly one complete frame including its header, e.g. from H2FrameDecoder.feed_raw
+        """
+        length_and_type, flag_bits, stream_id = _FRAME_HEADER.unpack_from(buf)
+        self.type = length_and_type & 0xff
+        self.len = length_and_type >> 8
+        self.flag_bits = flag_bits
+        # Set of short flag names like the flags of a scapy frame, e.g. {'ES', 'EH'}
+        self.flags = _flag_set(self.type, flag_bits)
+        self.reserved = stream_id >> 31
+        self.stream_id = stream_id & _STREAM_ID_MASK
+        self._buf = buf
+        self.raw_payload = memoryview(buf)[_FRAME_HEADER.size:]
+        # Decoded header block, set by the connection on the HEADERS or CONTINUATION frame that ends it
+        self.headers = None  # type: T.Optional[T.List[T.Tuple[str, str]]]
+        self._packet = None  # type: T.Optional[h2.H2Frame]
+
+    @property
+    def packet(self) -> h2.H2Frame:
+        """
+        The frame dissected by scapy, built on first access.
+        """
+        if self._packet is None:
+            self._packet = h2.H2Frame(bytes(self._buf))
+        return self._packet
+
+    @property
+    def payload(self) -> h2.H2FramePayload:
+        return self.packet.payload
+
+    @property
+    def payload_class(self) -> T.Type[h2.H2FramePayload]:
+        """
+        Class scapy dissects the payload into, without dissecting it.
+        """
+        if self.len == 0:
+            return NoPayload
+        if self.type == h2.H2DataFrame.type_id:
+            return h2.H2PaddedDataFrame if 'P' in self.flags else h2.H2DataFrame
+        if self.type == h2.H2HeadersFrame.type_id:
+            if 'P' in self.flags:
+                return h2.H2PaddedPriorityHeadersFrame if '+' in self.flags else h2.H2PaddedHeadersFrame
+            return h2.H2PriorityHeadersFrame if '+' in self.flags else h2.H2HeadersFrame
+        if self.type == h2.H2PushPromiseFrame.type_id:
+            return h2.H2PaddedPushPromiseFrame if 'P' in self.flags else h2.H2PushPromiseFrame
+        return _PAYLOAD_CLASSES.get(self.type, h2.H2FramePayload)
+
+    @property
+    def data(self) -> bytes:
+        """
+        Data of a DATA frame, without padding.
+        """
+        if self.type != h2.H2DataFrame.type_id:
+            return self.packet.data
+        if 'P' in self.flags:
+            return bytes(self.raw_payload[1:self.len - self.raw_payload[0]])
+        return bytes(self.raw_payload)
+
+    @property
+    def header_fragment(self) -> memoryview:
+        """
+        Header block fragment of a HEADERS or CONTINUATION frame, without padding and priority fields.
+        """
+        if self.type == h2.H2ContinuationFrame.type_id:
+            return self.raw_payload
+        assert_error(self.type == h2.H2HeadersFrame.type_id, 'Frame of type {} carries no header block', self.type)
+        start, end = 0, self.len
+        if 'P' in self.flags:
+            start, end = 1, self.len - self.raw_payload[0]
+        if '+' in self.flags:
+            start += 5
+        return self.raw_payload[start:end]
+
+    @property
+    def error(self) -> int:
+        """
+        Error code of a RST_STREAM or GOAWAY frame.
+        """
+        if self.type == h2.H2ResetFrame.type_id:
+            return _U32.unpack_from(self.raw_payload)[0]
+        if self.type == h2.H2GoAwayFrame.type_id:
+            return _U32.unpack_from(self.raw_payload, 4)[0]
+        return self.packet.error
+
+    def show(self, dump: bool = False) -> T.Optional[str]:
+        """
+        Show the dissected frame like scapy's Packet.show.
+        :param dump: return the description instead of printing it
+        """
+        return self.packet.show(dump=dump)
+
+    def __getattr__(self, name: str):
+        # Only called for attributes that aren't slots or properties, i.e. payload fields
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.packet, name)
+
+    def __bytes__(self):
+        return bytes(self._buf)
+
+    def __len__(self):
+        return len(self._buf)
+
+    def __repr__(self):
+        return '<H2FrameView type={} stream_id={} flags={} len={}>'.format(
+            self.type, self.stream_id, ','.join(sorted(self.flags)) or '-', self.len)
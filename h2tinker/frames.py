@@ -3,8 +3,22 @@ import typing as T
 import scapy.contrib.http2 as h2
 from scapy.packet import NoPayload
 
+from h2tinker.frame_view import H2FrameView
 from h2tinker.log import warn
 
+FRAME_TYPE_NAMES = {
+    0: 'DATA',
+    1: 'HEADERS',
+    2: 'PRIORITY',
+    3: 'RST_STREAM',
+    4: 'SETTINGS',
+    5: 'PUSH_PROMISE',
+    6: 'PING',
+    7: 'GOAWAY',
+    8: 'WINDOW_UPDATE',
+    9: 'CONTINUATION',
+}
+
 
 def create_ping_frame(data: T.Union[str, bytes, None] = None,
                       is_ack: bool = False) -> h2.H2Frame:
@@ -102,23 +116,27 @@ def create_window_update_frame(stream_id: int,
     return win
 
 
-def is_frame_type(h2_frame: h2.H2Frame,
+def is_frame_type(h2_frame: T.Union[h2.H2Frame, H2FrameView],
                   inner_frame_type: T.Type[h2.H2FramePayload]) -> bool:
     """
     Check the type of a HTTP/2 frame.
-    :param h2_frame: unknown-type frame
+    :param h2_frame: unknown-type frame, a frame view is checked without dissecting its payload
     :param inner_frame_type: specific frame type
     """
     
     this_frame_type = h2_frame.type
     type_id_matches = this_frame_type == inner_frame_type.type_id
-    class_matches = isinstance(h2_frame.payload, inner_frame_type) or isinstance(h2_frame.payload, NoPayload)
+    if isinstance(h2_frame, H2FrameView):
+        payload_class = h2_frame.payload_class
+    else:
+        payload_class = type(h2_frame.payload)
+    class_matches = issubclass(payload_class, (inner_frame_type, NoPayload))
     if type_id_matches != class_matches:
         warn("Frame type check inconsistent: type ID matches: {}, class matches: {}".format(type_id_matches, class_matches))
     return type_id_matches and class_matches
 
 
-def has_ack_set(h2_frame: h2.H2Frame) -> bool:
+def has_ack_set(h2_frame: T.Union[h2.H2Frame, H2FrameView]) -> bool:
     """
     Check whether the given frame has the ACK flag set.
     :param h2_frame: frame to check
@@ -126,6 +144,18 @@ def has_ack_set(h2_frame: h2.H2Frame) -> bool:
     return 'A' in h2_frame.flags
 
 
+def frame_summary(h2_frame: T.Union[h2.H2Frame, H2FrameView]) -> str:
+    """
+    Create a compact one-line description of a frame, e.g. 'HEADERS stream=1 flags=EH,ES len=42'.
+    :param h2_frame: frame to describe
+    """
+    length = h2_frame.len if h2_frame.len is not None else len(bytes(h2_frame.payload))
+    return '{} stream={} flags={} len={}'.format(FRAME_TYPE_NAMES.get(h2_frame.type, h2_frame.type),
+                                                 h2_frame.stream_id,
+                                                 ','.join(sorted(h2_frame.flags)) or '-',
+                                                 length)
+
+
 def gen_stream_ids(n: int) -> T.List[int]:
     """
     Generate n valid client-side stream IDs i.e. positive odd integers.
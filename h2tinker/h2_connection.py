@@ -1,30 +1,36 @@
+import logging
+import socket
+import struct
 import time
-import sys
 import typing as T
 from abc import ABC
 
 import scapy.contrib.http2 as h2
 from scapy.compat import hex_bytes
-from scapy.data import MTU
 
 from h2tinker import log
+from h2tinker.log import FrameLogMode, LazyStr, OutputLogger
 from h2tinker.assrt import assert_error
-from h2tinker.frames import is_frame_type, has_ack_set, create_settings_frame
-
-import logging
-import contextlib
-
-class OutputLogger:
-    def __init__(self, logger, level="INFO"):
-        self.logger = logger
-        self.name = self.logger.name
-        self.level = getattr(logging, level)
+from h2tinker.body import BodyReader, BodySource
+from h2tinker.burst import PreparedBurst, SegmentMode
+from h2tinker.decoder import H2FrameDecoder
+from h2tinker.frame_view import H2FrameView
+from h2tinker.frames import is_frame_type, has_ack_set, frame_summary
+from h2tinker.hpack import HPackEncoder, HPackDecoder, HPACK_ENTRY_OVERHEAD
+from h2tinker.request import H2Request, Headers, normalize_headers
+from h2tinker.resolver import DEFAULT_ATTEMPT_DELAY, DEFAULT_RESOLVER, ResolverCache, happy_eyeballs_connect
+from h2tinker.response import CloseReason, ResponseSet, TimedFrame
+from h2tinker.rtt import RttEstimator
+from h2tinker.serializer import FrameWriter, FLAG_END_STREAM, pack_frame_header, iter_frame_headers
+from h2tinker.settings import PeerSettings, parse_settings
+from h2tinker.stream_ids import StreamIdAllocator
+from h2tinker.timing import IOTrace, TxTimestamp, enable_tx_timestamps, read_tx_timestamps
 
-    def write(self, msg):
-        if msg and not msg.isspace():
-            self.logger.log(self.level, msg)
-
-    def flush(self): pass
+# Maximum number of bytes read from the socket at once
+READ_SIZE = 65_535
+# Maximum number of buffers passed to one sendmsg call, well below the usual IOV_MAX of 1024
+MAX_SEND_BUFFERS = 512
+_U32 = struct.Struct('!I')
 
 
 class H2Connection(ABC):
@@ -33,15 +39,70 @@ class H2Connection(ABC):
     """
 
     PREFACE = hex_bytes('505249202a20485454502f322e300d0a0d0a534d0d0a0d0a')
+    IS_TLS = False
+    # Initial flow-control window of the connection and of every stream, as defined by the spec
+    DEFAULT_WINDOW_SIZE = 65_535
+    # Receive window we advertise for the connection and for every stream
+    RECV_WINDOW_SIZE = 2_147_483_647
 
-    def __init__( self, logger ):
+    def __init__(self, logger: logging.Logger, frame_log_mode: FrameLogMode = FrameLogMode.SUMMARY,
+                 window_update_threshold: int = 1 << 20, connect_timeout: T.Optional[float] = 10.0,
+                 tcp_nodelay: bool = True, send_buffer_size: T.Optional[int] = None,
+                 recv_buffer_size: T.Optional[int] = None, resolver: T.Optional[ResolverCache] = None,
+                 attempt_delay: float = DEFAULT_ATTEMPT_DELAY):
+        """
+        :param logger: logger for connection events
+        :param frame_log_mode: how sent and received frames are logged, frames are only logged at DEBUG level
+        :param window_update_threshold: number of received DATA bytes after which the consumed window of the
+        connection or a stream is given back to the server with a WINDOW_UPDATE frame
+        :param connect_timeout: timeout in seconds for connecting and for each step of the handshakes,
+        None to wait indefinitely
+        :param tcp_nodelay: whether to disable Nagle's algorithm, so that small writes are sent right away
+        :param send_buffer_size: SO_SNDBUF of the socket, None for the system default
+        :param recv_buffer_size: SO_RCVBUF of the socket, None for the system default
+        :param resolver: cache of resolved and pinned addresses, defaults to one shared by the whole process
+        :param attempt_delay: time in seconds to wait for a connection attempt to one address of the host before
+        also trying the next one
+        """
         self.host = None
         self.port = None
         self.sock = None
         self.is_setup_completed = False
+        self.is_closed = False
+        # Last GOAWAY frame received from the server, None if there hasn't been any
+        self.goaway_frame = None
+        self.stream_ids = StreamIdAllocator()
+        # Send/receive trace, None unless enabled with enable_io_trace
+        self.io_trace = None  # type: T.Optional[IOTrace]
+        self.tx_timestamps_enabled = False
+        self.window_update_threshold = window_update_threshold
+        # Received flow-controlled bytes not yet given back with WINDOW_UPDATE, per connection and per open stream
+        self.unacked_conn_bytes = 0
+        self.unacked_stream_bytes = {}  # type: T.Dict[int, int]
+        # Settings of the server, updated by every SETTINGS frame it sends
+        self.peer_settings = PeerSettings()
+        # Our send windows, see send_streaming_requests. Only streams we haven't ended yet have an entry
+        self.send_window = self.DEFAULT_WINDOW_SIZE
+        self.stream_send_windows = {}  # type: T.Dict[int, int]
+        # Round-trip time estimate, updated by the ACK of every PING sent with send_ping
+        self.rtt = RttEstimator()
+        # Frames received while waiting for a send window or a PING ACK, handed out by the next read
+        self._backlog = []  # type: T.List[H2FrameView]
+        self.decoder = H2FrameDecoder()
+        self.hpack_encoder = HPackEncoder()
+        self.hpack_decoder = HPackDecoder()
+        # Fragments of header blocks whose END_HEADERS hasn't arrived yet, per stream
+        self._header_fragments = {}  # type: T.Dict[int, bytearray]
         self.logger = logger
-        self.output_logger = OutputLogger(logger)
-        sys.stdout = self.output_logger
+        self.frame_log_mode = frame_log_mode
+        self.connect_timeout = connect_timeout
+        self.tcp_nodelay = tcp_nodelay
+        self.send_buffer_size = send_buffer_size
+        self.recv_buffer_size = recv_buffer_size
+        self.resolver = resolver if resolver is not None else DEFAULT_RESOLVER
+        self.attempt_delay = attempt_delay
+        # Address the socket is connected to
+        self.remote_addrinfo = None  # type: T.Optional[tuple]
 
     def _check_setup_completed(self):
         assert_error(self.is_setup_completed, 'Connection setup has not been completed, call setup(...) '
@@ -51,44 +112,201 @@ class H2Connection(ABC):
         assert_error(not self.is_setup_completed, 'Connection setup has already been completed with '
                                                   '{}:{}', self.host, self.port)
 
+    @property
+    def is_reusable(self) -> bool:
+        """
+        Whether new streams can still be opened on this connection.
+        """
+        return self.is_setup_completed and not self.is_closed and self.goaway_frame is None and \
+            self.stream_ids.remaining > 0
+
+    @property
+    def goaway_last_stream_id(self) -> T.Optional[int]:
+        """
+        Last stream ID in the GOAWAY frame of the server, streams above it were not processed. None if the server
+        hasn't sent GOAWAY.
+        """
+        if self.goaway_frame is None:
+            return None
+        return _U32.unpack_from(self.goaway_frame.raw_payload)[0] & 0x7fffffff
+
+    @property
+    def next_stream_id(self) -> int:
+        """
+        Stream ID the next allocation starts with.
+        """
+        return self.stream_ids.next_id
+
+    def enable_io_trace(self, tx_timestamps: bool = False) -> IOTrace:
+        """
+        Start recording a perf_counter_ns timestamp, byte count and number of socket calls of every send
+        and receive on this connection.
+        :param tx_timestamps: also ask the kernel for software TX timestamps, see read_tx_timestamps.
+        Only available for plain TCP connections on Linux
+        :return: the trace that events are recorded to
+        """
+        self._check_setup_completed()
+        if self.io_trace is None:
+            self.io_trace = IOTrace()
+        if tx_timestamps and not self.tx_timestamps_enabled:
+            if self.IS_TLS:
+                self.logger.warning("[h2tinker.enable_io_trace] kernel TX timestamps are not available with TLS")
+            else:
+                self.tx_timestamps_enabled = enable_tx_timestamps(self.sock)
+        return self.io_trace
+
+    def disable_io_trace(self) -> T.Optional[IOTrace]:
+        """
+        Stop recording sends and receives, see enable_io_trace. Kernel TX timestamps stay enabled.
+        :return: the trace that events were recorded to, None if tracing wasn't enabled
+        """
+        trace = self.io_trace
+        self.io_trace = None
+        return trace
+
+    def read_tx_timestamps(self) -> T.List[TxTimestamp]:
+        """
+        Read the kernel TX timestamps reported since the last call, see enable_io_trace.
+        :return: timestamps in the order of sending, empty if TX timestamps are not enabled
+        """
+        if not self.tx_timestamps_enabled:
+            return []
+        return read_tx_timestamps(self.sock)
+
+    def allocate_stream_ids(self, n: int) -> T.List[int]:
+        """
+        Allocate n unused client-side stream IDs on this connection. Unlike gen_stream_ids, consecutive calls
+        never return the same ID, so the connection can be used for more than one batch of requests.
+        :param n: the number of IDs to allocate
+        :return: list of allocated IDs in increasing order
+        """
+        return self.stream_ids.allocate(n)
+
+    def reserve_stream_ids(self, n: int) -> range:
+        """
+        Reserve a contiguous block of n unused client-side stream IDs on this connection for one batch of requests.
+        Fails once the connection runs out of stream IDs, check stream_ids.has_room first when running many batches.
+        :param n: the number of IDs to reserve
+        :return: range of the reserved IDs
+        """
+        return self.stream_ids.reserve_block(n)
+
     def create_request_frames(self, method: str, path: str, stream_id: int,
-                              headers: tuple[tuple[str, str] , ...] = None,
+                              headers: T.Optional[Headers] = None,
                               body: T.Optional[bytes] = None) -> h2.H2Seq:
         """
         Create HTTP/2 frames representing a HTTP request.
+        The headers are encoded with the connection's shared HPACK context, so the frames of different requests
+        must be sent in the same order as they were created.
         :param method: HTTP request method, e.g. GET
         :param path: request path, e.g. /example/path
         :param stream_id: stream ID to use for this request, e.g. 1
-        :param headers: request headers
+        :param headers: request headers, either (name, value) pairs or a multi-valued mapping like mitmproxy's Headers
         :param body: request body
         :return: frame sequence consisting of a single HEADERS frame, potentially followed by CONTINUATION and DATA frames
         """
-        header_table = h2.HPackHdrTable()
-        req_str = (':method {}\n'
-                   ':path {}\n'
-                   ':scheme http\n'
-                   ':authority {}:{}\n').format(method, path, self.host, self.port)
-        self.logger.info(f"[h2tinker.create_request_frames] req_str before headers: {req_str}")
-
-        if headers is not None:
-            for header in headers:
-                all_vals = headers.get_all(header)
-                for val in all_vals:
-                    req_str += f'\n{header}: {val}'
-            self.logger.info(f"[h2tinker.create_request_frames] req_str after headers: {req_str}")
-
-        # noinspection PyTypeChecker
-        return header_table.parse_txt_hdrs(
-            bytes(req_str.strip(), 'UTF-8'),
-            stream_id=stream_id,
-            body=body
-        )
+        authority = '{}:{}'.format(self.host, self.port)
+        if self.peer_settings.max_header_list_size is not None:
+            self._check_header_list_size(method, path, authority, stream_id, headers)
+        frame_seq = self.hpack_encoder.encode_request(method, path, authority, stream_id, headers, body,
+                                                      max_frame_size=self.peer_settings.max_frame_size)
+        self.logger.debug(f"[h2tinker.create_request_frames] encoded {method} {path} on stream {stream_id}")
+        return frame_seq
+
+    def create_request_frames_batch(self, requests: T.Iterable[H2Request]) -> T.List[h2.H2Seq]:
+        """
+        Create HTTP/2 frames for several HTTP requests at once using the connection's shared HPACK context.
+        Headers repeated across requests are encoded as dynamic table references after their first occurrence.
+        The returned frame sequences must be sent in the given order.
+        :param requests: requests to encode
+        :return: list of frame sequences, one per request
+        """
+        return [self.create_request_frames(*req) for req in requests]
+
+    def create_withheld_request_frames(self, requests: T.Iterable[H2Request]) \
+            -> T.Tuple[T.List[h2.H2Seq], T.List[h2.H2Frame]]:
+        """
+        Create frames for last-frame synchronization. The last byte of each request body is withheld
+        in a separate final DATA frame, so the server can't process any request before the final frames are sent.
+        :param requests: requests to encode
+        :return: tuple of the request frame sequences without END_STREAM flags, to be sent first, and the final
+        DATA frames carrying the withheld byte (empty for requests without a body) and the END_STREAM flag
+        """
+        requests = list(requests)
+        prefix_seqs = self.create_request_frames_batch(req._replace(body=(req.body or b'')[:-1]) for req in requests)
+        for seq in prefix_seqs:
+            for f in seq.frames:
+                if 'ES' in f.flags:
+                    f.flags.remove('ES')
+        final_frames = [h2.H2Frame(flags={'ES'}, stream_id=req.stream_id) / h2.H2DataFrame(data=(req.body or b'')[-1:])
+                        for req in requests]
+        return prefix_seqs, final_frames
+
+    def send_streaming_request(self, method: str, path: str, stream_id: int, headers: T.Optional[Headers] = None,
+                               body: T.Optional[BodySource] = None, withhold_last_byte: bool = False,
+                               timeout: float = 10.0) -> FrameWriter:
+        """
+        Send a HTTP request with a body streamed from bytes, a file or an iterator of chunks, without building
+        scapy frames for it. See send_streaming_requests.
+        :param method: HTTP request method, e.g. POST
+        :param path: request path, e.g. /example/path
+        :param stream_id: stream ID to use for this request
+        :param headers: request headers
+        :param body: request body
+        :param withhold_last_byte: whether to withhold the last body byte, as in create_withheld_request_frames
+        :param timeout: maximum time in seconds to wait for the server to open its flow-control windows
+        :return: the final DATA frame with the withheld byte, empty if withhold_last_byte isn't set
+        """
+        return self.send_streaming_requests([H2Request(method, path, stream_id, headers, body)],
+                                            withhold_last_byte, timeout)
+
+    def send_streaming_requests(self, requests: T.Iterable[H2Request], withhold_last_byte: bool = False,
+                                timeout: float = 10.0) -> FrameWriter:
+        """
+        Send HTTP requests with bodies streamed from bytes, files or iterators of chunks. The bodies are split into
+        DATA frames no larger than the server's SETTINGS_MAX_FRAME_SIZE and its flow-control windows, waiting for
+        WINDOW_UPDATE frames whenever a window is exhausted. Frame payloads are written as memoryview slices of
+        the bodies, headers and small bodies of all requests are sent with as few writes as possible.
+        Frames of other streams received while waiting for a window are handed out by the next read.
+        :param requests: requests to send, their bodies can be any BodySource
+        :param withhold_last_byte: whether to withhold the last body byte of every request for last-frame
+        synchronization, the windows keep room for it
+        :param timeout: maximum time in seconds to wait for the server to open its flow-control windows
+        :return: the final DATA frames with the withheld bytes and END_STREAM flags, to be sent with
+        prepare_raw_burst, empty if withhold_last_byte isn't set
+        """
+        self._check_setup_completed()
+        requests = list(requests)
+        readers = [BodyReader(req.body, withhold_last_byte) for req in requests]
+        deadline = time.monotonic() + timeout
+        finals = FrameWriter()
+        out = []  # type: T.List[T.Union[bytes, memoryview]]
+        # Connection window kept for the withheld bytes
+        reserve = sum(1 for reader in readers if not reader.is_empty) if withhold_last_byte else 0
+        for req, reader in zip(requests, readers):
+            seq = self.create_request_frames(req.method, req.path, req.stream_id, req.headers)
+            # Withheld requests always end with the final frame, even without a body
+            if withhold_last_byte or not reader.is_empty:
+                for f in seq.frames:
+                    if 'ES' in f.flags:
+                        f.flags.remove('ES')
+            for f in seq.frames:
+                self._log_frame('Sending', f)
+            header_block = bytes(seq)
+            self._account_sent_frames(header_block)
+            out.append(header_block)
+            self._stream_body(req.stream_id, reader, reserve, deadline, out)
+            if withhold_last_byte:
+                finals.data(req.stream_id, reader.withheld, end_stream=True)
+                reserve -= len(reader.withheld)
+        self._send_buffers(out)
+        return finals
 
     def create_dependant_request_frames(self, method: str, path: str, stream_id: int,
                                         dependency_stream_id: int = 0,
                                         dependency_weight: int = 0,
                                         dependency_is_exclusive: bool = False,
-                                        headers: tuple[tuple[bytes, bytes], ...] = None,
+                                        headers: T.Optional[Headers] = None,
                                         body: T.Optional[bytes] = None) -> h2.H2Seq:
         """
         Create HTTP/2 frames representing a HTTP request that depends on another request (stream).
@@ -134,15 +352,72 @@ class H2Connection(ABC):
                 return
             frames = self._recv_frames()
             for f in frames:
-                if 'ES' in frame.flags:
+                if f.type in (h2.H2HeadersFrame.type_id, h2.H2ContinuationFrame.type_id):
+                    # Keep the HPACK state in sync for later reads on this connection
+                    self._decode_header_frame(f)
+                if 'ES' in f.flags:
                     endstream_flags_detected = endstream_flags_detected + 1
                 if print_frames:
-                    self.logger.info("Read frame:")
-                    f.show()
+                    self._log_frame('Read', f)
             if endstream_flags_detected >= num_streams:
                 return
 
 
+    def collect_responses(self, stream_ids: T.Iterable[int], timeout: float = 10.0) -> ResponseSet:
+        """
+        Read frames until the responses on all given streams have been ended or reset, or until the timeout expires.
+        Frames are sorted per stream together with their arrival time and response headers are decoded with the
+        connection's HPACK decoder. Frames of other streams are discarded, but their headers are still decoded to
+        keep the HPACK state in sync. SETTINGS and PING frames from the server are acked.
+        Every stream is closed with a reason, see StreamResponse.close_reason: streams above the last stream ID of
+        a GOAWAY from the server are closed right away, as the server won't process them, and if the connection
+        fails, it is closed together with all streams that are still open.
+        :param stream_ids: streams to collect the responses of
+        :param timeout: maximum time to wait in seconds
+        :return: collected responses, including those of streams that did not complete in time
+        """
+        self._check_setup_completed()
+        result = ResponseSet(stream_ids, time.perf_counter_ns())
+        open_streams = set(result.responses)
+        self._close_goaway_streams(result, open_streams, result.start_ns)
+        deadline = time.monotonic() + timeout
+        prev_timeout = self.sock.gettimeout()
+        try:
+            while open_streams:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.sock.settimeout(remaining)
+                frames = self._recv_frames()
+                recv_ns = time.perf_counter_ns()
+                for f in frames:
+                    self._log_frame('Read', f)
+                    self._handle_response_frame(f, recv_ns, result, open_streams)
+                self._close_goaway_streams(result, open_streams, recv_ns)
+        except socket.timeout:
+            pass
+        except OSError as e:
+            self.logger.warning(f"[h2tinker.collect_responses] connection to {self.host}:{self.port} failed with "
+                                f"{len(open_streams)} streams open: {e}")
+            lost_ns = time.perf_counter_ns()
+            for sid in open_streams:
+                result[sid].close(CloseReason.CONNECTION_LOST, lost_ns)
+            open_streams.clear()
+            self.close()
+        finally:
+            if not self.is_closed:
+                self.sock.settimeout(prev_timeout)
+
+        result.end_ns = time.perf_counter_ns()
+        unprocessed = result.unprocessed_stream_ids
+        if unprocessed:
+            self.logger.warning(f"[h2tinker.collect_responses] server did not process {len(unprocessed)} of "
+                                f"{len(result)} streams")
+        if open_streams:
+            self.logger.warning(f"[h2tinker.collect_responses] {len(open_streams)} of {len(result)} streams "
+                                f"did not complete")
+        return result
+
     def send_frames(self, *frames: h2.H2Frame):
         """
         Send frames on this connection.
@@ -151,24 +426,233 @@ class H2Connection(ABC):
         self._check_setup_completed()
         self._send_frames(*frames)
 
-    def recv_frames(self) -> T.List[h2.H2Frame]:
+    def prepare_burst(self, *frames: h2.H2Frame, mode: SegmentMode = SegmentMode.DEFAULT) -> PreparedBurst:
+        """
+        Serialize frames ahead of time into one buffer that can later be sent with as few writes as possible,
+        e.g. the withheld final frames in last-frame synchronization.
+        :param frames: 1 or more frames to include in the burst
+        :param mode: how the burst is going to be sent, see SegmentMode
+        :return: prepared burst planned against the connection's MSS, see send_burst
+        """
+        return self.prepare_raw_burst(b''.join(bytes(f) for f in frames), len(frames), mode)
+
+    def prepare_raw_burst(self, data: bytes, num_frames: int,
+                          mode: SegmentMode = SegmentMode.DEFAULT) -> PreparedBurst:
+        """
+        Wrap already serialized frames into a prepared burst, see prepare_burst.
+        :param data: serialized frames
+        :param num_frames: number of frames in data
+        :param mode: how the burst is going to be sent, see SegmentMode
+        :return: prepared burst, see send_burst
+        """
+        burst = PreparedBurst(data, num_frames, self._get_mss(), self.IS_TLS, mode)
+        self.logger.info(f"[h2tinker.prepare_burst] prepared burst: {burst.describe()}")
+        if burst.fits_single_segment is False:
+            self.logger.warning(f"[h2tinker.prepare_burst] burst does not fit a single TCP segment, "
+                                f"it will be sent in {burst.num_segments} segments")
+        return burst
+
+    def send_burst(self, burst: PreparedBurst):
+        """
+        Send a prepared burst on this connection, with a single write unless it was planned in NODELAY mode.
+        :param burst: burst created with prepare_burst
+        """
+        self._check_setup_completed()
+        self._account_sent_frames(burst.data)
+        if burst.mode is SegmentMode.NODELAY:
+            self._set_tcp_option(socket.TCP_NODELAY, 1)
+            self._send_segments(burst.segments)
+        elif burst.mode is SegmentMode.CORK and self._set_tcp_option(getattr(socket, 'TCP_CORK', None), 1):
+            try:
+                self._send(burst.data)
+            finally:
+                # Clearing the cork flushes the partial last segment right away
+                self._set_tcp_option(socket.TCP_CORK, 0)
+        else:
+            self._send(burst.data)
+
+    def send_raw(self, data: bytes):
+        """
+        Send already serialized frames on this connection.
+        :param data: serialized frames, e.g. from a compiled corpus
+        """
+        self._check_setup_completed()
+        self._account_sent_frames(data)
+        self._send(data)
+
+    def reset_streams(self, stream_ids: T.Iterable[int], error_code: int = h2.H2ErrorCodes.CANCEL):
+        """
+        Reset streams with RST_STREAM frames sent in one write, e.g. streams whose responses are no longer awaited.
+        :param stream_ids: IDs of the streams to reset
+        :param error_code: error code of the RST_STREAM frames
+        """
+        self._check_setup_completed()
+        writer = FrameWriter()
+        for sid in stream_ids:
+            writer.rst_stream(sid, error_code)
+        if len(writer):
+            self._send_written(writer)
+
+    def ping(self, timeout: float = 1.0) -> bool:
+        """
+        Check whether the connection is alive by sending a PING frame and waiting for its ACK.
+        Frames of streams received in the meantime are kept for the next read, as in await_delivery.
+        :param timeout: how long to wait for the ACK in seconds
+        :return: True if the ACK arrived in time and the server has not sent GOAWAY, False otherwise
+        """
+        self._check_setup_completed()
+        prev_timeout = self.sock.gettimeout()
+        deadline = time.monotonic() + timeout
+        try:
+            opaque = self.send_ping()
+            while self.goaway_frame is None and self.rtt.is_pending(opaque):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.sock.settimeout(remaining)
+                for f in self._read_frames():
+                    self._log_frame('Read', f)
+                    if f.stream_id == 0:
+                        self._handle_connection_frame(f)
+                    else:
+                        self._backlog.append(f)
+            return self.goaway_frame is None
+        except OSError as e:
+            self.logger.info(f"[h2tinker.ping] connection to {self.host}:{self.port} failed the health check: {e}")
+            return False
+        finally:
+            if self.sock is not None:
+                self.sock.settimeout(prev_timeout)
+
+    def send_ping(self) -> bytes:
+        """
+        Send a PING frame with its send time as opaque data, without waiting for the ACK. The ACK updates the RTT
+        estimate whenever it is read, e.g. while collecting responses, see rtt.
+        :return: opaque data of the PING
+        """
+        self._check_setup_completed()
+        opaque = self.rtt.new_ping()
+        self._send_written(FrameWriter().ping(opaque))
+        return opaque
+
+    def await_delivery(self, timeout: float = 10.0) -> int:
+        """
+        Wait until the server has received everything sent so far. A marker PING is sent and its ACK awaited:
+        the server handles frames in the order they were sent, so by the time it acks the marker it has received
+        all frames written before it. Frames of streams received in the meantime are kept for the next read.
+        Fails right away if the server sends GOAWAY before acking the marker, as it may never ack it.
+        :param timeout: how long to wait for the ACK in seconds
+        :return: round-trip time of the marker PING in nanoseconds
+        """
+        marker = self.send_ping()
+        prev_timeout = self.sock.gettimeout()
+        deadline = time.monotonic() + timeout
+        try:
+            while self.rtt.is_pending(marker) and self.goaway_frame is None:
+                remaining = deadline - time.monotonic()
+                assert_error(remaining > 0, 'Timed out waiting for the server to ack the marker PING')
+                self.sock.settimeout(remaining)
+                for f in self._read_frames():
+                    self._log_frame('Read', f)
+                    if f.stream_id == 0:
+                        self._handle_connection_frame(f)
+                    else:
+                        self._backlog.append(f)
+        except socket.timeout:
+            assert_error(False, 'Timed out waiting for the server to ack the marker PING')
+        finally:
+            self.sock.settimeout(prev_timeout)
+        assert_error(not self.rtt.is_pending(marker), 'Server sent GOAWAY with last stream ID {} and error code {} '
+                     'before acking the marker PING', self.goaway_last_stream_id,
+                     self.goaway_frame.error if self.goaway_frame is not None else None)
+        return self.rtt.latest_rtt_ns
+
+    def settle(self, settle_time: T.Optional[float] = None, timeout: float = 10.0):
+        """
+        Wait before sending the final frames of a race, so that the frames sent before them have been delivered.
+        :param settle_time: time in seconds to sleep, None to wait only until the server has received them, see
+        await_delivery
+        :param timeout: how long to wait for the server when settle_time is None
+        """
+        if settle_time is not None:
+            time.sleep(settle_time)
+            return
+        rtt_ns = self.await_delivery(timeout)
+        self.logger.info(f"[h2tinker.settle] server received the sent frames after {rtt_ns / 1000:.1f} us, "
+                         f"{self.rtt.describe()}")
+
+    def close(self):
+        """
+        Close the connection, notifying the server with a GOAWAY frame if possible.
+        """
+        if self.is_closed:
+            return
+        self.is_closed = True
+        if self.sock is None:
+            return
+        try:
+            if self.is_setup_completed:
+                self._send_written(FrameWriter().goaway())
+        except OSError:
+            pass
+        finally:
+            self.sock.close()
+
+    def recv_frames(self) -> T.List[H2FrameView]:
         """
         Synchronously receive frames. Block if there aren't any frames to read.
-        :return: list of received frames
+        :return: list of received frames, their scapy packets are dissected on demand, see H2FrameView
         """
         self._check_setup_completed()
         return self._recv_frames()
 
-    def _setup_wait_loop(self):
+    def _open_socket(self, host: str, port: int) -> socket.socket:
+        # Shared by all transports: resolve, configure and connect a TCP socket, leaving the connect timeout set.
+        # All addresses of the host are raced with staggered attempts, so an unreachable one doesn't block setup
+        addrinfos = self.resolver.resolve(host, port)
+        assert_error(len(addrinfos) > 0, 'No TCP socket info available for host {} and port {}', host, port)
+        self.logger.debug('Endpoint addrinfos: {}'.format(addrinfos))
+
+        sock, self.remote_addrinfo = happy_eyeballs_connect(addrinfos, self.connect_timeout, self.attempt_delay,
+                                                            self._configure_socket)
+        self.logger.debug("Socket connected to {}".format(self.remote_addrinfo[4]))
+        return sock
+
+    def _configure_socket(self, sock: socket.socket):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        # Buffer sizes have to be set before connecting, the receive buffer determines the TCP window scale
+        if self.send_buffer_size:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer_size)
+        if self.recv_buffer_size:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.recv_buffer_size)
+        if self.tcp_nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _finish_setup(self, initial_data: bytes = b''):
+        # Shared by all transports once self.sock speaks HTTP/2: exchange prefaces and settings, then leave
+        # the socket in blocking mode
+        self._send_preface()
+        self._send_initial_settings()
+        self._setup_wait_loop(initial_data)
+        self.sock.settimeout(None)
+        self.is_setup_completed = True
+        self.logger.info("Completed HTTP/2 connection setup")
+
+    def _setup_wait_loop(self, initial_data: bytes = b''):
         server_has_acked_settings = False
         we_have_acked_settings = False
         while not server_has_acked_settings or not we_have_acked_settings:
-            frames = self._recv_frames()
+            frames = self._recv_frames(initial_data)
+            initial_data = b''
             for f in frames:
-                self.logger.info(f"[h2tinker/h2_connection.py info] _setup_wait_loop type(f): {type(f)}")
+                self._log_frame('Setup read', f)
+                if f.type in (h2.H2HeadersFrame.type_id, h2.H2ContinuationFrame.type_id):
+                    # E.g. the response to an upgrade request, its headers still update the HPACK state
+                    self._decode_header_frame(f)
                 try:
                     if is_frame_type(f, h2.H2SettingsFrame):
-                        self.logger.info(f"[h2tinker/h2_connection.py info] _setup_wait_loop: is H2SettingsFrame, true")
                         if has_ack_set(f):
                             self.logger.info("Server acked our settings")
                             server_has_acked_settings = True
@@ -180,41 +664,349 @@ class H2Connection(ABC):
                         self.logger.info(f"[h2tinker/h2_connection.py info] ValueError while attempting to check frame type - possibly raw packet")
 
 
+    def _handle_response_frame(self, f: H2FrameView, recv_ns: int, result: ResponseSet, open_streams: T.Set[int]):
+        if f.stream_id == 0:
+            self._handle_connection_frame(f)
+            return
+
+        hdrs = None
+        if f.type in (h2.H2HeadersFrame.type_id, h2.H2ContinuationFrame.type_id):
+            hdrs = self._decode_header_frame(f)
+
+        resp = result.responses.get(f.stream_id)
+        if resp is None:
+            return
+        resp.frames.append(TimedFrame(recv_ns, f))
+
+        if f.type == h2.H2HeadersFrame.type_id and resp.headers_ns is None:
+            resp.headers_ns = recv_ns
+        if hdrs is not None:
+            # Header blocks after the final (non-informational) response headers are trailers
+            if not resp.headers or (resp.status or 0) < 200:
+                resp.headers = hdrs
+            else:
+                resp.trailers = hdrs
+        elif f.type == h2.H2DataFrame.type_id:
+            resp.body += f.data
+        elif f.type == h2.H2ResetFrame.type_id:
+            resp.reset_error = f.error
+            resp.close(CloseReason.RESET, recv_ns)
+
+        if 'ES' in f.flags:
+            resp.close(CloseReason.ENDED, recv_ns)
+        if resp.is_closed:
+            open_streams.discard(f.stream_id)
+
+    def _close_goaway_streams(self, result: ResponseSet, open_streams: T.Set[int], recv_ns: int):
+        # Streams above the GOAWAY cutoff will never be processed, see RFC 7540 section 6.8
+        last_stream_id = self.goaway_last_stream_id
+        if last_stream_id is None:
+            return
+        for sid in [sid for sid in open_streams if sid > last_stream_id]:
+            result[sid].close(CloseReason.GOAWAY, recv_ns)
+            open_streams.discard(sid)
+
+    def _handle_connection_frame(self, f: H2FrameView):
+        if f.type == h2.H2SettingsFrame.type_id and not has_ack_set(f):
+            self._ack_settings()
+        elif f.type == h2.H2PingFrame.type_id and not has_ack_set(f):
+            self._send_written(FrameWriter().ping(bytes(f.raw_payload), is_ack=True))
+
     def _ack_settings(self):
-        self._send_frames(create_settings_frame(is_ack=True))
+        self._send_written(FrameWriter().settings(is_ack=True))
         self.logger.info("Acked server settings")
 
-    def _send_initial_settings(self):
-        settings = [
-            h2.H2Setting(id=h2.H2Setting.SETTINGS_ENABLE_PUSH, value=0),
-            h2.H2Setting(id=h2.H2Setting.SETTINGS_INITIAL_WINDOW_SIZE, value=2_147_483_647),
-            h2.H2Setting(id=h2.H2Setting.SETTINGS_MAX_CONCURRENT_STREAMS, value=1000)
+    def _initial_settings(self) -> T.List[T.Tuple[int, int]]:
+        return [
+            (h2.H2Setting.SETTINGS_ENABLE_PUSH, 0),
+            (h2.H2Setting.SETTINGS_INITIAL_WINDOW_SIZE, self.RECV_WINDOW_SIZE),
+            (h2.H2Setting.SETTINGS_MAX_CONCURRENT_STREAMS, 1000)
         ]
-        self._send_frames(create_settings_frame(settings))
+
+    def _send_initial_settings(self):
+        # Also enlarge the connection window, which can't be changed with SETTINGS
+        self._send_written(FrameWriter().settings(self._initial_settings())
+                           .window_update(0, self.RECV_WINDOW_SIZE - self.DEFAULT_WINDOW_SIZE))
         self.logger.info("Sent settings")
 
-    def _send_frames(self, *frames: h2.H2Frame):
-        b = bytes()
+    def _update_recv_windows(self, frames: T.Iterable[H2FrameView]):
+        # Account received DATA against the receive windows and give the consumed window back in batches
+        updates = FrameWriter()
+        for f in frames:
+            if f.type == h2.H2ResetFrame.type_id:
+                self.unacked_stream_bytes.pop(f.stream_id, None)
+            if f.type != h2.H2DataFrame.type_id:
+                continue
+            # The whole payload counts towards flow control, padding included
+            if f.len:
+                self.unacked_conn_bytes += f.len
+                if 'ES' not in f.flags:
+                    unacked = self.unacked_stream_bytes.get(f.stream_id, 0) + f.len
+                    if unacked >= self.window_update_threshold:
+                        updates.window_update(f.stream_id, unacked)
+                        unacked = 0
+                    self.unacked_stream_bytes[f.stream_id] = unacked
+            if 'ES' in f.flags:
+                # No more DATA on this stream, its window doesn't matter anymore
+                self.unacked_stream_bytes.pop(f.stream_id, None)
+
+        if self.unacked_conn_bytes >= self.window_update_threshold:
+            updates.window_update(0, self.unacked_conn_bytes)
+            self.unacked_conn_bytes = 0
+        if updates:
+            self._send_written(updates)
+
+    def _stream_body(self, stream_id: int, reader: BodyReader, reserve: int, deadline: float,
+                     out: T.List[T.Union[bytes, memoryview]]):
+        # Add DATA frames of the body to out, each as a frame header and a slice of the body, sending out
+        # whenever it has to wait for a window or has grown too long
+        stream_reserve = 1 if reader.withhold_last_byte and not reader.is_empty else 0
+        while not reader.done:
+            stream_window = self.stream_send_windows.get(stream_id, self.peer_settings.initial_window_size)
+            available = min(self.send_window - reserve, stream_window - stream_reserve,
+                            self.peer_settings.max_frame_size)
+            if available <= 0:
+                self._send_buffers(out)
+                self._wait_for_send_window(stream_id, deadline)
+                continue
+            chunk = reader.read(available)
+            end_stream = reader.done and not reader.withhold_last_byte
+            header = pack_frame_header(len(chunk), h2.H2DataFrame.type_id, FLAG_END_STREAM if end_stream else 0,
+                                       stream_id)
+            if self._is_frame_logging_enabled():
+                self._log_frame('Sending', H2FrameView(header + bytes(chunk)))
+            out.append(header)
+            out.append(chunk)
+            self.send_window -= len(chunk)
+            self.stream_send_windows[stream_id] = stream_window - len(chunk)
+            if end_stream:
+                del self.stream_send_windows[stream_id]
+            if len(out) >= MAX_SEND_BUFFERS:
+                self._send_buffers(out)
+
+    def _wait_for_send_window(self, stream_id: int, deadline: float):
+        # Read until the server sends WINDOW_UPDATE or SETTINGS frames, keeping the frames of other streams
+        prev_timeout = self.sock.gettimeout()
+        try:
+            remaining = deadline - time.monotonic()
+            assert_error(remaining > 0, 'Timed out waiting for the flow-control window to send stream {}', stream_id)
+            self.sock.settimeout(remaining)
+            frames = self._read_frames()
+        except socket.timeout:
+            assert_error(False, 'Timed out waiting for the flow-control window to send stream {}', stream_id)
+        finally:
+            self.sock.settimeout(prev_timeout)
+        for f in frames:
+            self._log_frame('Read', f)
+            if f.stream_id == 0:
+                self._handle_connection_frame(f)
+            elif f.type != h2.H2WindowUpdateFrame.type_id:
+                self._backlog.append(f)
+            assert_error(not (f.type == h2.H2ResetFrame.type_id and f.stream_id == stream_id),
+                         'Server reset stream {} while its body was being sent, error code {}', stream_id,
+                         f.error if f.type == h2.H2ResetFrame.type_id else None)
+        assert_error(self.goaway_frame is None, 'Server sent GOAWAY while the body of stream {} was being sent',
+                     stream_id)
+
+    def _check_header_list_size(self, method: str, path: str, authority: str, stream_id: int,
+                                headers: T.Optional[Headers]):
+        # The server may refuse requests whose headers exceed its SETTINGS_MAX_HEADER_LIST_SIZE
+        all_headers = [(':method', method), (':path', path), (':scheme', 'http'), (':authority', authority)]
+        all_headers.extend(normalize_headers(headers))
+        size = sum(len(name) + len(value) + HPACK_ENTRY_OVERHEAD for name, value in all_headers)
+        if size > self.peer_settings.max_header_list_size:
+            self.logger.warning(f"[h2tinker.create_request_frames] headers of stream {stream_id} are {size} bytes, "
+                                f"more than the server's limit of {self.peer_settings.max_header_list_size}")
+
+    def _apply_peer_settings(self, settings: T.List[T.Tuple[int, int]]):
+        prev = self.peer_settings
+        self.peer_settings = prev.updated(settings)
+        if self.peer_settings == prev:
+            return
+        # A new initial window size applies to the windows of all open streams, see RFC 7540 section 6.9.2
+        delta = self.peer_settings.initial_window_size - prev.initial_window_size
+        if delta:
+            for sid in self.stream_send_windows:
+                self.stream_send_windows[sid] += delta
+        # Our HPACK encoder follows the table size of the server's decoder
+        self.hpack_encoder.resize(self.peer_settings.header_table_size)
+        self.logger.info(f"[h2tinker] server settings: {self.peer_settings}")
+
+    def _update_peer_state(self, frames: T.Iterable[H2FrameView]):
+        # Track the server's settings, the windows it gives us to send DATA and the round-trip time
+        for f in frames:
+            if f.type == h2.H2SettingsFrame.type_id and not has_ack_set(f):
+                self._apply_peer_settings(parse_settings(f.raw_payload))
+            elif f.type == h2.H2WindowUpdateFrame.type_id and f.len >= _U32.size:
+                increment = _U32.unpack_from(f.raw_payload)[0] & 0x7fffffff
+                if f.stream_id == 0:
+                    self.send_window += increment
+                elif f.stream_id in self.stream_send_windows:
+                    self.stream_send_windows[f.stream_id] += increment
+            elif f.type == h2.H2ResetFrame.type_id:
+                self.stream_send_windows.pop(f.stream_id, None)
+            elif f.type == h2.H2PingFrame.type_id and has_ack_set(f):
+                self.rtt.on_ack(bytes(f.raw_payload), time.perf_counter_ns())
+
+    def _decode_header_frame(self, f: H2FrameView) -> T.Optional[T.List[T.Tuple[str, str]]]:
+        # Collect the fragment of a HEADERS or CONTINUATION frame and decode the header block once it is complete.
+        # Every block has to pass through here in the order of arrival to keep the HPACK state in sync
+        fragments = self._header_fragments.setdefault(f.stream_id, bytearray())
+        fragments += f.header_fragment
+        if 'EH' not in f.flags:
+            return None
+        del self._header_fragments[f.stream_id]
+        f.headers = self.hpack_decoder.decode_block(fragments)
+        return f.headers
+
+    def _account_sent_frames(self, data: T.Union[bytes, bytearray, memoryview]):
+        # Charge sent DATA frames to the send windows, and track which streams we have opened or ended
+        for length, frame_type, flags, stream_id in iter_frame_headers(data):
+            if frame_type == h2.H2DataFrame.type_id:
+                self.send_window -= length
+                self.stream_send_windows[stream_id] = \
+                    self.stream_send_windows.get(stream_id, self.peer_settings.initial_window_size) - length
+            elif frame_type != h2.H2HeadersFrame.type_id:
+                continue
+            if flags & FLAG_END_STREAM:
+                self.stream_send_windows.pop(stream_id, None)
+            elif stream_id not in self.stream_send_windows:
+                self.stream_send_windows[stream_id] = self.peer_settings.initial_window_size
+
+    def _send_frames(self, *frames: T.Union[h2.H2Frame, h2.H2Seq]):
+        chunks = []
         for f in frames:
-            self.logger.info(f"[h2tinker/h2_connection._send_frames] sending frame:")
-            f.show()
-            b += bytes(f)
-        self._send(b)
+            # Frame sequences are logged frame by frame but serialized as a whole
+            for inner in (f.frames if isinstance(f, h2.H2Seq) else (f,)):
+                self._log_frame('Sending', inner)
+            chunks.append(bytes(f))
+        data = b''.join(chunks)
+        self._account_sent_frames(data)
+        self._send(data)
+
+    def _send_written(self, writer: FrameWriter):
+        # Frames serialized without scapy are only dissected if they are going to be logged
+        if self._is_frame_logging_enabled():
+            for f in writer.to_scapy():
+                self._log_frame('Sending', f)
+        data = writer.getvalue()
+        self._account_sent_frames(data)
+        self._send(data)
+
+    def _is_frame_logging_enabled(self) -> bool:
+        return self.frame_log_mode is not FrameLogMode.OFF and self.logger.isEnabledFor(logging.DEBUG)
+
+    def _log_frame(self, action: str, frame: T.Union[h2.H2Frame, H2FrameView]):
+        # Frames are formatted only after the logger has accepted the DEBUG record
+        if not self._is_frame_logging_enabled():
+            return
+        if self.frame_log_mode is FrameLogMode.FULL:
+            self.logger.debug('%s frame:\n%s', action, LazyStr(frame.show, True))
+        else:
+            self.logger.debug('%s frame: %s', action, LazyStr(frame_summary, frame))
 
     def _send_preface(self):
         self._send(self.PREFACE)
 
     def _send(self, bytez):
-        self.sock.send(bytez)
+        if self.io_trace is None:
+            self.sock.sendall(bytez)
+            return
+        start_ns = time.perf_counter_ns()
+        view = memoryview(bytez)
+        num_calls = 0
+        while view:
+            view = view[self.sock.send(view):]
+            num_calls += 1
+        self.io_trace.record('send', start_ns, time.perf_counter_ns(), len(bytez), num_calls)
+
+    def _send_buffers(self, buffers: T.List[T.Union[bytes, memoryview]]):
+        # Gather write of the buffers without joining them, then clear the list. TLS sockets can't do
+        # scatter/gather I/O, the buffers are joined for them since they are copied to be encrypted anyway
+        if not buffers:
+            return
+        if self.IS_TLS or not hasattr(self.sock, 'sendmsg'):
+            self._send(b''.join(buffers))
+            buffers.clear()
+            return
+        start_ns = time.perf_counter_ns()
+        num_bytes = sum(len(buf) for buf in buffers)
+        num_calls = 0
+        pending = [memoryview(buf) for buf in buffers]
+        buffers.clear()
+        while pending:
+            sent = self.sock.sendmsg(pending)
+            num_calls += 1
+            # Drop what has been sent, a partial send may end in the middle of a buffer
+            i = 0
+            while i < len(pending) and sent >= len(pending[i]):
+                sent -= len(pending[i])
+                i += 1
+            pending = pending[i:]
+            if sent:
+                pending[0] = pending[0][sent:]
+        if self.io_trace is not None:
+            self.io_trace.record('send', start_ns, time.perf_counter_ns(), num_bytes, num_calls)
+
+    def _send_segments(self, segments: T.Sequence[memoryview]):
+        if self.io_trace is None:
+            for seg in segments:
+                self.sock.sendall(seg)
+            return
+        start_ns = time.perf_counter_ns()
+        num_calls = 0
+        for seg in segments:
+            while seg:
+                seg = seg[self.sock.send(seg):]
+                num_calls += 1
+        self.io_trace.record('send', start_ns, time.perf_counter_ns(), sum(len(seg) for seg in segments), num_calls)
 
-    def _recv_frames(self) -> T.List[h2.H2Frame]:
-        chunk = self._recv()
-        return h2.H2Seq(chunk).frames
+    def _set_tcp_option(self, option: T.Optional[int], value: int) -> bool:
+        if option is None:
+            self.logger.warning("[h2tinker._set_tcp_option] TCP option not available on this platform")
+            return False
+        try:
+            self.sock.setsockopt(socket.IPPROTO_TCP, option, value)
+            return True
+        except (AttributeError, OSError) as e:
+            self.logger.warning(f"[h2tinker._set_tcp_option] setting TCP option {option} failed: {e}")
+            return False
 
-    def _recv(self):
+    def _get_mss(self) -> T.Optional[int]:
+        try:
+            return self.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_MAXSEG)
+        except (AttributeError, OSError):
+            return None
+
+    def _recv_frames(self, initial_data: bytes = b'') -> T.List[H2FrameView]:
+        # Frames kept while waiting for a send window come first
+        if self._backlog:
+            frames, self._backlog = self._backlog, []
+            return frames
+        return self._read_frames(initial_data)
+
+    def _read_frames(self, initial_data: bytes = b'') -> T.List[H2FrameView]:
+        # Keep reading until at least one whole frame has been reassembled, starting with already received data
         while True:
-            try:
-                return self.sock.recv(MTU)
-            except AssertionError:
-                # Frame parsing failed on current data, try again in 100 ms
-                time.sleep(0.1)
+            frames = self.decoder.feed_views(initial_data or self._recv())
+            initial_data = b''
+            if frames:
+                self._update_recv_windows(frames)
+                self._update_peer_state(frames)
+                for f in frames:
+                    if f.type == h2.H2GoAwayFrame.type_id:
+                        self.goaway_frame = f
+                        self.logger.info(f"[h2tinker._recv_frames] server sent GOAWAY with last stream ID "
+                                         f"{self.goaway_last_stream_id}, error code {f.error}")
+                return frames
+
+    def _recv(self) -> bytes:
+        if self.io_trace is None:
+            chunk = self.sock.recv(READ_SIZE)
+        else:
+            start_ns = time.perf_counter_ns()
+            chunk = self.sock.recv(READ_SIZE)
+            self.io_trace.record('recv', start_ns, time.perf_counter_ns(), len(chunk))
+        if len(chunk) == 0:
+            raise ConnectionError('Connection to {}:{} was closed by the peer'.format(self.host, self.port))
+        return chunk
@@ -1,7 +1,15 @@
-import socket
+import base64
+import logging
+import typing as T
 
-from h2tinker import log
+from h2tinker.assrt import assert_error
 from h2tinker.h2_connection import H2Connection
+from h2tinker.log import FrameLogMode
+from h2tinker.resolver import DEFAULT_ATTEMPT_DELAY, ResolverCache
+from h2tinker.serializer import FrameWriter, FRAME_HEADER_LEN
+
+# Upper bound for the HTTP/1.1 response to an upgrade request
+MAX_UPGRADE_RESPONSE_SIZE = 65_536
 
 
 class H2PlainConnection(H2Connection):
@@ -9,25 +17,55 @@ class H2PlainConnection(H2Connection):
     Plain non-TLS HTTP/2 connection (h2c).
     """
 
-    def __init__(self):
-        super().__init__()
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    def __init__(self, logger: logging.Logger, frame_log_mode: FrameLogMode = FrameLogMode.SUMMARY,
+                 window_update_threshold: int = 1 << 20, connect_timeout: T.Optional[float] = 10.0,
+                 tcp_nodelay: bool = True, send_buffer_size: T.Optional[int] = None,
+                 recv_buffer_size: T.Optional[int] = None, resolver: T.Optional[ResolverCache] = None,
+                 attempt_delay: float = DEFAULT_ATTEMPT_DELAY):
+        super().__init__(logger, frame_log_mode, window_update_threshold, connect_timeout, tcp_nodelay,
+                         send_buffer_size, recv_buffer_size, resolver, attempt_delay)
 
-    def setup(self, host: str, port: int = 80):
+    def setup(self, host: str, port: int = 80, upgrade: bool = False):
         """
         Set the connection up by creating the TCP connection and then performing the HTTP/2 handshake.
         :param host: host where to connect, e.g. example.com or 127.0.0.1
         :param port: TCP port where to connect
+        :param upgrade: whether to start with an HTTP/1.1 request upgraded with Upgrade: h2c, instead of
+        speaking HTTP/2 right away (prior knowledge). The upgraded request occupies stream 1
         """
         super().setup(host, port)
         self.host = host
         self.port = port
-        self.sock.connect((host, port))
-        log.debug('Socket connected')
-        self._send_preface()
-        self._send_initial_settings()
-        self._setup_wait_loop()
-        self.is_setup_completed = True
-        log.info("Completed HTTP/2 connection setup")
+        self.sock = self._open_socket(host, port)
+        try:
+            initial_data = self._upgrade() if upgrade else b''
+            self._finish_setup(initial_data)
+        except Exception:
+            # Don't leak the socket of a connection that can't be used
+            self.close()
+            raise
 
+    def _upgrade(self) -> bytes:
+        # See RFC 7540 section 3.2. Returns the HTTP/2 data received after the 101 response
+        settings = FrameWriter().settings(self._initial_settings()).getvalue()[FRAME_HEADER_LEN:]
+        request = ('GET / HTTP/1.1\r\n'
+                   'Host: {}:{}\r\n'
+                   'Connection: Upgrade, HTTP2-Settings\r\n'
+                   'Upgrade: h2c\r\n'
+                   'HTTP2-Settings: {}\r\n'
+                   '\r\n').format(self.host, self.port, base64.urlsafe_b64encode(settings).decode('ascii').rstrip('='))
+        self._send(request.encode('ascii'))
 
+        response = b''
+        while b'\r\n\r\n' not in response:
+            assert_error(len(response) < MAX_UPGRADE_RESPONSE_SIZE, 'Upgrade response from {}:{} is too long',
+                         self.host, self.port)
+            response += self._recv()
+        head, _, rest = response.partition(b'\r\n\r\n')
+        status_line = head.split(b'\r\n', 1)[0].decode('latin-1')
+        assert_error(status_line.split(' ')[1:2] == ['101'], 'Server did not agree to upgrade to h2c: {}',
+                     status_line)
+        self.logger.debug("Upgraded to h2c")
+        # Stream 1 carries the response to the upgraded request
+        self.stream_ids.skip_to(3)
+        return rest
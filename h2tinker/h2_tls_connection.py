@@ -1,57 +1,99 @@
-import socket
 import ssl
+import time
+import typing as T
 
-import scapy.contrib.http2 as h2
-import scapy.supersocket as supersocket
-
-from h2tinker import log
 from h2tinker.h2_connection import H2Connection
+from h2tinker.log import FrameLogMode
+from h2tinker.resolver import DEFAULT_ATTEMPT_DELAY, ResolverCache
 from h2tinker.assrt import assert_error
+from h2tinker.tls import DEFAULT_SESSION_CACHE, HandshakeTiming, TLSSessionCache
 
 
 class H2TLSConnection(H2Connection):
     """
     TLS-secured HTTP/2 connection.
+
+    SSL contexts and sessions are shared through a TLSSessionCache, so that connecting to a host again resumes
+    the previous TLS session with an abbreviated handshake. The timing of the handshake is kept in
+    handshake_timing.
     """
 
-    def __init__(self, logger):
-        super().__init__(logger)
+    IS_TLS = True
+
+    def __init__(self, logger, frame_log_mode: FrameLogMode = FrameLogMode.SUMMARY,
+                 window_update_threshold: int = 1 << 20, connect_timeout: T.Optional[float] = 10.0,
+                 tcp_nodelay: bool = True, send_buffer_size: T.Optional[int] = None,
+                 recv_buffer_size: T.Optional[int] = None, resolver: T.Optional[ResolverCache] = None,
+                 attempt_delay: float = DEFAULT_ATTEMPT_DELAY, ssl_context: T.Optional[ssl.SSLContext] = None,
+                 session_cache: T.Optional[TLSSessionCache] = None, resume_session: bool = True):
+        """
+        :param ssl_context: client context to use, it should select ALPN protocol h2. Defaults to the shared
+        default context of the session cache
+        :param session_cache: cache of contexts and sessions, defaults to one shared by the whole process
+        :param resume_session: whether to offer a cached session to the server
+        """
+        super().__init__(logger, frame_log_mode, window_update_threshold, connect_timeout, tcp_nodelay,
+                         send_buffer_size, recv_buffer_size, resolver, attempt_delay)
         assert_error(bool(ssl.HAS_ALPN), 'TLS ALPN extension not available but it is required for HTTP/2 over TLS')
+        self.session_cache = session_cache if session_cache is not None else DEFAULT_SESSION_CACHE
+        self.ssl_context = ssl_context if ssl_context is not None else self.session_cache.get_context()
+        self.resume_session = resume_session
+        self.server_name = None  # type: T.Optional[str]
+        self.handshake_timing = None  # type: T.Optional[HandshakeTiming]
 
-    def setup(self, host: str, port: int = 443):
+    def setup(self, host: str, port: int = 443, server_name: T.Optional[str] = None):
         """
         Set the connection up by creating the TCP connection, performing the TLS handshake with ALPN
         selected protocol h2 and finally performing the HTTP/2 handshake.
         :param host: host where to connect, e.g. example.com or 127.0.0.1
         :param port: TCP port where to connect
+        :param server_name: server name to send in the TLS SNI extension and verify the certificate against,
+        defaults to host
         """
         super().setup(host, port)
         self.host = host
         self.port = port
+        self.server_name = server_name or host
 
         # TLS setup partly adapted from https://github.com/secdev/scapy/blob/master/doc/notebooks/HTTP_2_Tuto.ipynb
-        addrinfos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM, proto=socket.IPPROTO_TCP)
-        assert_error(len(addrinfos) > 0, 'No TCP socket info available for host {} and port {}', host, port)
-        addrinfo = addrinfos[0]
-        self.logger.debug('Endpoint addrinfo: {}'.format(addrinfo))
-
-        raw_sock = socket.socket(addrinfo[0], addrinfo[1], addrinfo[2])
-        raw_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        if hasattr(socket, 'SO_REUSEPORT'):
-            raw_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-
-        ssl_ctx = ssl.create_default_context()
-        ssl_ctx.set_alpn_protocols(['h2'])
-        ssl_sock = ssl_ctx.wrap_socket(raw_sock, server_hostname=host)
-        ssl_sock.connect(addrinfo[4])
-
-        assert_error('h2' == ssl_sock.selected_alpn_protocol(), 'Server did not agree to use HTTP/2 in ALPN')
-
-        self.sock = supersocket.SSLStreamSocket(ssl_sock, basecls=h2.H2Frame)
-        self.logger.debug("Socket connected")
-
-        self._send_preface()
-        self._send_initial_settings()
-        self._setup_wait_loop()
-        self.is_setup_completed = True
-        self.logger.info("Completed HTTP/2 connection setup")
+        raw_sock = self._open_socket(host, port)
+        session = None
+        if self.resume_session:
+            session = self.session_cache.get_session(self.ssl_context, self.server_name, port)
+        start_ns = time.perf_counter_ns()
+        try:
+            # The socket is already connected, so the handshake happens right away, within the connect timeout
+            ssl_sock = self.ssl_context.wrap_socket(raw_sock, server_hostname=self.server_name, session=session)
+        except (OSError, ssl.SSLError):
+            raw_sock.close()
+            raise
+        end_ns = time.perf_counter_ns()
+
+        self.sock = ssl_sock
+        self.handshake_timing = HandshakeTiming(self.server_name, port, start_ns, end_ns, session is not None,
+                                                ssl_sock.session_reused, ssl_sock.version())
+        self.session_cache.record_timing(self.handshake_timing)
+        self.logger.debug("TLS handshake completed in {:.0f} us, {}".format(
+            self.handshake_timing.duration_us, 'resumed' if ssl_sock.session_reused else 'full handshake'))
+        try:
+            assert_error('h2' == ssl_sock.selected_alpn_protocol(), 'Server did not agree to use HTTP/2 in ALPN')
+            self._finish_setup()
+        except Exception:
+            # Don't leak the socket of a connection that can't be used
+            self.close()
+            raise
+        # TLS 1.3 session tickets arrive after the handshake, so the session is stored once the server has
+        # sent its settings
+        self.session_cache.store_session(self.ssl_context, self.server_name, port, ssl_sock.session)
+
+    def close(self):
+        """
+        Close the connection, notifying the server with a GOAWAY frame if possible. The latest TLS session
+        is kept for resumption.
+        """
+        if not self.is_closed and self.is_setup_completed and self.server_name is not None:
+            try:
+                self.session_cache.store_session(self.ssl_context, self.server_name, self.port, self.sock.session)
+            except (OSError, ValueError):
+                pass
+        super().close()
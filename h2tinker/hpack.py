@@ -0,0 +1,177 @@
+import typing as T
+
+import scapy.contrib.http2 as h2
+from scapy.compat import raw
+
+from h2tinker.request import normalize_headers, Headers
+
+DEFAULT_HEADER_TABLE_SIZE = 4096
+DEFAULT_MAX_FRAME_SIZE = 16_384
+# Per-entry overhead counted towards the dynamic table size, see RFC 7541 section 4.1
+HPACK_ENTRY_OVERHEAD = 32
+
+
+class HPackEncoder:
+    """
+    Stateful HPACK encoder that is shared by all requests on a connection.
+
+    Headers are added to the dynamic table as they are encoded, so repeated headers (user-agent, cookies, etc.)
+    of later requests are encoded as single-byte index references. Because the peer's decoder mirrors this
+    table, the resulting header blocks must be sent in the same order as they were encoded.
+    """
+
+    def __init__(self, header_table_size: int = DEFAULT_HEADER_TABLE_SIZE,
+                 never_index: T.Container[str] = ()):
+        """
+        :param header_table_size: dynamic table size, must not exceed the peer's SETTINGS_HEADER_TABLE_SIZE
+        :param never_index: header names that are sent as never-indexed literals
+        """
+        self.table = h2.HPackHdrTable(header_table_size, header_table_size)
+        self.header_table_size = header_table_size
+        self.never_index = never_index
+        # Table sizes to signal at the start of the next header block
+        self._size_updates = []  # type: T.List[int]
+
+    def resize(self, header_table_size: int):
+        """
+        Change the dynamic table size, e.g. after the peer has changed its SETTINGS_HEADER_TABLE_SIZE. Entries that
+        don't fit anymore are evicted and the change is signalled with a dynamic table size update at the start of
+        the next header block.
+        :param header_table_size: new dynamic table size
+        """
+        if header_table_size == self.header_table_size:
+            return
+        self.table.recap(header_table_size)
+        self.table.resize(header_table_size)
+        self.header_table_size = header_table_size
+        # Of several changes before the next header block, the smallest size must be signalled first so that the
+        # peer evicts the same entries, see RFC 7541 section 4.2
+        smallest = min(self._size_updates[0] if self._size_updates else header_table_size, header_table_size)
+        self._size_updates = [smallest] if smallest == header_table_size else [smallest, header_table_size]
+
+    def encode_headers(self, headers: T.Iterable[T.Tuple[str, str]]) -> T.List[h2.HPackHeaders]:
+        """
+        Encode headers into HPACK header representations, updating the dynamic table. Pending dynamic table size
+        updates, see resize, come first.
+        :param headers: (name, value) pairs with lowercase names
+        :return: list of HPACK header representations in the given order
+        """
+        hpack_hdrs = [h2.HPackDynamicSizeUpdate(max_size=size) for size in self._size_updates]
+        self._size_updates = []
+        for name, value in headers:
+            hdr, _ = self.table._convert_a_header_to_a_h2_header(
+                name, value,
+                is_sensitive=lambda n, v: n in self.never_index,
+                should_index=lambda n, v=value: self._fits_table(n, v)
+            )
+            if isinstance(hdr, h2.HPackLitHdrFldWithIncrIndexing):
+                self.table.register(hdr)
+            hpack_hdrs.append(hdr)
+        return hpack_hdrs
+
+    def encode_request(self, method: str, path: str, authority: str, stream_id: int,
+                       headers: T.Optional[Headers] = None,
+                       body: T.Optional[bytes] = None,
+                       scheme: str = 'http',
+                       max_frame_size: int = DEFAULT_MAX_FRAME_SIZE) -> h2.H2Seq:
+        """
+        Encode a HTTP request into HTTP/2 frames.
+        :param method: HTTP request method, e.g. GET
+        :param path: request path, e.g. /example/path
+        :param authority: value of the :authority pseudo-header, e.g. example.com:443
+        :param stream_id: stream ID to use for this request
+        :param headers: request headers, see normalize_headers for accepted formats
+        :param body: request body
+        :param scheme: value of the :scheme pseudo-header
+        :param max_frame_size: maximum frame payload size, used to split the header block and body
+        :return: frame sequence consisting of a single HEADERS frame, potentially followed by CONTINUATION and DATA frames
+        """
+        all_headers = [(':method', method), (':path', path), (':scheme', scheme), (':authority', authority)]
+        all_headers.extend(normalize_headers(headers))
+        hpack_hdrs = self.encode_headers(all_headers)
+
+        seq = h2.H2Seq()
+        seq.frames = self._header_block_frames(hpack_hdrs, stream_id, bool(body), max_frame_size)
+        if body:
+            for offset in range(0, len(body), max_frame_size):
+                flags = {'ES'} if offset + max_frame_size >= len(body) else set()
+                seq.frames.append(h2.H2Frame(stream_id=stream_id, flags=flags) /
+                                  h2.H2DataFrame(data=body[offset:offset + max_frame_size]))
+        return seq
+
+    def _header_block_frames(self, hpack_hdrs: T.List[h2.HPackHeaders], stream_id: int,
+                             has_body: bool, max_frame_size: int) -> T.List[h2.H2Frame]:
+        # Split the header block into fragments that fit the frame size
+        fragments = [[]]
+        fragment_len = 0
+        for hdr in hpack_hdrs:
+            hdr_len = len(raw(hdr))
+            if fragment_len + hdr_len > max_frame_size and fragments[-1]:
+                fragments.append([])
+                fragment_len = 0
+            fragments[-1].append(hdr)
+            fragment_len += hdr_len
+
+        frames = []
+        for i, fragment in enumerate(fragments):
+            flags = set()
+            if i == 0 and not has_body:
+                flags.add('ES')
+            if i == len(fragments) - 1:
+                flags.add('EH')
+            payload = h2.H2HeadersFrame() if i == 0 else h2.H2ContinuationFrame()
+            payload.hdrs = fragment
+            frames.append(h2.H2Frame(stream_id=stream_id, flags=flags) / payload)
+        return frames
+
+    def _fits_table(self, name: str, value: str) -> bool:
+        return len(name) + len(value) + HPACK_ENTRY_OVERHEAD <= self.header_table_size
+
+
+class HPackDecoder:
+    """
+    Stateful HPACK decoder for the header blocks received on a connection.
+
+    The dynamic table mirrors the peer's encoder, so every header block received on the connection must be
+    decoded, in the order of arrival, even if the headers themselves are not needed.
+    """
+
+    def __init__(self, header_table_size: int = DEFAULT_HEADER_TABLE_SIZE):
+        """
+        :param header_table_size: maximum dynamic table size, i.e. our SETTINGS_HEADER_TABLE_SIZE
+        """
+        self.table = h2.HPackHdrTable(header_table_size, header_table_size)
+
+    def decode_block(self, block: T.Union[bytes, bytearray, memoryview]) -> T.List[T.Tuple[str, str]]:
+        """
+        Decode a complete header block, updating the dynamic table.
+        A field can be split across the fragments of a HEADERS frame and its CONTINUATION frames, so the fragments
+        have to be joined before decoding, see RFC 7540 section 4.3.
+        :param block: concatenated header block fragments, up to and including the frame with END_HEADERS
+        :return: list of (name, value) pairs in the received order
+        """
+        return self.decode_headers(h2.H2ContinuationFrame(bytes(block)).hdrs)
+
+    def decode_headers(self, hpack_hdrs: T.Iterable[h2.HPackHeaders]) -> T.List[T.Tuple[str, str]]:
+        """
+        Decode HPACK header representations, updating the dynamic table.
+        :param hpack_hdrs: header representations of a complete header block, e.g. frame.hdrs of a HEADERS frame
+        with END_HEADERS set
+        :return: list of (name, value) pairs in the received order
+        """
+        headers = []
+        for hdr in hpack_hdrs:
+            if isinstance(hdr, h2.HPackDynamicSizeUpdate):
+                self.table.resize(hdr.max_size)
+            elif isinstance(hdr, h2.HPackIndexedHdr):
+                entry = self.table[hdr.index]
+                headers.append((entry.name(), entry.value()))
+            else:
+                if hdr.index != 0:
+                    name = self.table[hdr.index].name()
+                else:
+                    name = hdr.hdr_name.getfieldval('data').origin()
+                headers.append((name, hdr.hdr_value.getfieldval('data').origin()))
+                if isinstance(hdr, h2.HPackLitHdrFldWithIncrIndexing):
+                    self.table.register(hdr)
+        return headers
@@ -1,5 +1,8 @@
+import logging
+import sys
 import time
 import enum
+import typing as T
 
 
 class LogLevel(enum.IntEnum):
@@ -9,7 +12,18 @@ class LogLevel(enum.IntEnum):
     NONE = 100
 
 
+class FrameLogMode(enum.Enum):
+    """
+    How sent and received frames are logged. Frames are only ever logged at DEBUG level.
+    """
+    OFF = 0
+    SUMMARY = 1
+    FULL = 2
+
+
 GLOBAL_LOG_LEVEL = LogLevel.INFO
+# Stream for the messages of this module, None means the current sys.stdout
+LOG_OUTPUT = None
 
 
 def set_global_log_level(log_level: LogLevel):
@@ -21,9 +35,19 @@ def set_global_log_level(log_level: LogLevel):
     GLOBAL_LOG_LEVEL = log_level
 
 
+def set_log_output(stream: T.Optional[T.TextIO]):
+    """
+    Set the stream that log messages are written to. The default is the current sys.stdout.
+    Use an OutputLogger to forward the messages to a standard library logger.
+    :param stream: writable text stream, or None to restore the default
+    """
+    global LOG_OUTPUT
+    LOG_OUTPUT = stream
+
+
 def _print_timed_formatted_msg(msg: str, *msg_args: object):
     formatted_msg = msg.format(*msg_args)
-    print('{} {}'.format(round(time.time(), 5), formatted_msg))
+    print('{} {}'.format(round(time.time(), 5), formatted_msg), file=LOG_OUTPUT or sys.stdout)
 
 
 def warn(msg: object, *msg_args: object):
@@ -39,3 +63,36 @@ def info(msg: object, *msg_args: object):
 def debug(msg: object, *msg_args: object):
     if GLOBAL_LOG_LEVEL >= LogLevel.DEBUG:
         _print_timed_formatted_msg('DEBUG :: ' + str(msg), *msg_args)
+
+
+class OutputLogger:
+    """
+    File-like object that forwards written text to a standard library logger.
+    """
+
+    def __init__(self, logger, level="INFO"):
+        self.logger = logger
+        self.name = self.logger.name
+        self.level = getattr(logging, level)
+
+    def write(self, msg):
+        if msg and not msg.isspace():
+            self.logger.log(self.level, msg)
+
+    def flush(self): pass
+
+
+class LazyStr:
+    """
+    Defers building a log message argument until the message is actually formatted,
+    i.e. only after the logger has checked that the level is enabled.
+    """
+
+    __slots__ = ('fn', 'args')
+
+    def __init__(self, fn: T.Callable[..., str], *args):
+        self.fn = fn
+        self.args = args
+
+    def __str__(self):
+        return self.fn(*self.args)
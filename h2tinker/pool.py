@@ -0,0 +1,143 @@
+import collections
+import logging
+import threading
+import typing as T
+import weakref
+
+from h2tinker.assrt import assert_error
+from h2tinker.h2_tls_connection import H2TLSConnection
+
+# (host, port, server_name)
+Origin = T.Tuple[str, int, str]
+
+
+class H2ConnectionPool:
+    """
+    Pool of set-up TLS connections keyed by origin, so that repeated runs against the same target can skip
+    the TCP, TLS and HTTP/2 handshakes.
+
+    Pooled connections have completed the SETTINGS exchange. They are health-checked with a PING before being
+    handed out and retired once the server has sent GOAWAY. Stream IDs are allocated per connection with
+    H2Connection.allocate_stream_ids, so a reused connection never reuses an ID, and connections that are running
+    out of stream IDs are retired as well.
+    """
+
+    def __init__(self, logger: logging.Logger, max_idle_per_origin: int = 2, ping_timeout: float = 1.0,
+                 min_free_stream_ids: int = 1000):
+        """
+        :param logger: logger for pool events, also passed on to created connections
+        :param max_idle_per_origin: maximum number of idle connections kept per origin, extra ones are closed
+        :param ping_timeout: how long to wait for the PING ACK when health-checking an idle connection
+        :param min_free_stream_ids: connections with fewer stream IDs left are not handed out again
+        """
+        self.logger = logger
+        self.max_idle_per_origin = max_idle_per_origin
+        self.ping_timeout = ping_timeout
+        self.min_free_stream_ids = min_free_stream_ids
+        self._idle = collections.defaultdict(collections.deque)  # type: T.Dict[Origin, T.Deque[H2TLSConnection]]
+        self._origins = weakref.WeakKeyDictionary()  # type: T.MutableMapping[H2TLSConnection, Origin]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def origin(host: str, port: int = 443, server_name: T.Optional[str] = None) -> Origin:
+        return host, port, server_name or host
+
+    def acquire(self, host: str, port: int = 443, server_name: T.Optional[str] = None) -> H2TLSConnection:
+        """
+        Get a set-up connection to the given origin, reusing a healthy idle connection if there is one.
+        :param host: host where to connect, e.g. example.com or 127.0.0.1
+        :param port: TCP port where to connect
+        :param server_name: TLS server name, defaults to host
+        :return: connection that is ready for sending requests
+        """
+        origin = self.origin(host, port, server_name)
+        while True:
+            with self._lock:
+                idle = self._idle[origin]
+                conn = idle.popleft() if idle else None
+            if conn is None:
+                break
+            if self._has_stream_ids(conn) and conn.is_reusable and conn.ping(self.ping_timeout):
+                self.logger.info(f"[H2ConnectionPool] reusing connection to {origin}, "
+                                 f"next stream ID {conn.next_stream_id}")
+                return conn
+            self.logger.info(f"[H2ConnectionPool] retiring unhealthy connection to {origin}")
+            self._retire(conn)
+
+        return self._connect(origin)
+
+    def release(self, conn: H2TLSConnection):
+        """
+        Return a connection acquired from this pool. Connections that can't be reused are closed.
+        :param conn: connection to return
+        """
+        origin = self._origins.get(conn)
+        if origin is None or not conn.is_reusable or not self._has_stream_ids(conn):
+            self._retire(conn)
+            return
+        with self._lock:
+            idle = self._idle[origin]
+            if len(idle) < self.max_idle_per_origin:
+                idle.append(conn)
+                return
+        self._retire(conn)
+
+    def replace(self, conn: H2TLSConnection) -> H2TLSConnection:
+        """
+        Close a connection acquired from this pool that should not be used any more, e.g. after the server sent
+        GOAWAY, and get another one to the same origin, see WaveRace.
+        :param conn: connection to replace
+        :return: connection that is ready for sending requests
+        """
+        origin = self._origins.get(conn)
+        assert_error(origin is not None, 'Connection to {}:{} was not acquired from this pool', conn.host, conn.port)
+        self._retire(conn)
+        return self.acquire(*origin)
+
+    def warm(self, host: str, port: int = 443, server_name: T.Optional[str] = None, count: int = 1):
+        """
+        Make sure there are at least count idle connections to the given origin, creating new ones if necessary.
+        :param host: host where to connect, e.g. example.com or 127.0.0.1
+        :param port: TCP port where to connect
+        :param server_name: TLS server name, defaults to host
+        :param count: number of idle connections to keep ready, capped at max_idle_per_origin
+        """
+        origin = self.origin(host, port, server_name)
+        with self._lock:
+            missing = min(count, self.max_idle_per_origin) - len(self._idle[origin])
+        for _ in range(missing):
+            self.release(self._connect(origin))
+
+    def close_all(self):
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            conns = [conn for idle in self._idle.values() for conn in idle]
+            self._idle.clear()
+        for conn in conns:
+            self._retire(conn)
+
+    def _connect(self, origin: Origin) -> H2TLSConnection:
+        host, port, server_name = origin
+        self.logger.info(f"[H2ConnectionPool] opening new connection to {origin}")
+        conn = H2TLSConnection(self.logger)
+        try:
+            conn.setup(host, port, server_name=server_name)
+        except Exception:
+            # Setup closes the connection itself once it has a socket, closing is a no-op then
+            conn.close()
+            raise
+        self._origins[conn] = origin
+        return conn
+
+    def _has_stream_ids(self, conn: H2TLSConnection) -> bool:
+        if conn.stream_ids.has_room(self.min_free_stream_ids):
+            return True
+        self.logger.info(f"[H2ConnectionPool] connection is running out of stream IDs, "
+                         f"{conn.stream_ids.remaining} left")
+        return False
+
+    def _retire(self, conn: H2TLSConnection):
+        self._origins.pop(conn, None)
+        conn.close()
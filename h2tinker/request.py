@@ -0,0 +1,52 @@
+import typing as T
+
+# Connection-specific headers are not allowed in HTTP/2 requests, see RFC 7540 section 8.1.2.2
+CONNECTION_SPECIFIC_HEADERS = frozenset(['connection', 'host', 'keep-alive', 'proxy-connection',
+                                         'transfer-encoding', 'upgrade'])
+
+HeaderValue = T.Union[str, bytes]
+Headers = T.Union[T.Iterable[T.Tuple[HeaderValue, HeaderValue]], T.Any]
+
+
+class H2Request(T.NamedTuple):
+    """
+    Description of a single HTTP request for building request frames in bulk.
+    """
+    method: str
+    path: str
+    stream_id: int
+    headers: T.Optional[Headers] = None
+    body: T.Optional[bytes] = None
+
+
+def _to_str(value: HeaderValue) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('UTF-8')
+    return str(value)
+
+
+def normalize_headers(headers: T.Optional[Headers]) -> T.List[T.Tuple[str, str]]:
+    """
+    Convert request headers to a list of HTTP/2-compatible (name, value) pairs. Names are lowercased and
+    connection-specific headers are dropped.
+    :param headers: either an iterable of (name, value) pairs of str or bytes, or a multi-valued mapping with a
+    get_all method such as mitmproxy's Headers
+    :return: list of (name, value) pairs in the original order
+    """
+    if headers is None:
+        return []
+
+    if hasattr(headers, 'get_all'):
+        pairs = [(name, val) for name in headers for val in headers.get_all(name)]
+    else:
+        pairs = headers
+
+    result = []
+    for name, val in pairs:
+        name = _to_str(name).lower()
+        if name in CONNECTION_SPECIFIC_HEADERS:
+            continue
+        if name == 'te' and _to_str(val).lower() != 'trailers':
+            continue
+        result.append((name, _to_str(val)))
+    return result
@@ -0,0 +1,182 @@
+import errno
+import os
+import selectors
+import socket
+import threading
+import time
+import typing as T
+
+# One socket.getaddrinfo result: family, type, proto, canonname, sockaddr
+AddrInfo = T.Tuple[int, int, int, str, tuple]
+
+# Time in seconds to wait for a connection attempt before starting the next one, see RFC 8305 section 5
+DEFAULT_ATTEMPT_DELAY = 0.25
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+
+class _CacheEntry(T.NamedTuple):
+    addrinfos: T.List[AddrInfo]
+    expires: float
+
+
+class ResolverCache:
+    """
+    Per-process cache of resolved TCP addresses, so that repeated connections to a target skip name resolution.
+
+    getaddrinfo doesn't report the record TTLs, so resolved addresses are kept for a fixed TTL. Hosts can be pinned
+    to a specific IP address, so that every connection hits the same backend of a target with several addresses.
+    Results are ordered for happy eyeballs, alternating between address families, see interleave_families.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        """
+        :param ttl: time in seconds resolved addresses are kept, 0 to resolve on every connection
+        """
+        self.ttl = ttl
+        self._entries = {}  # type: T.Dict[T.Tuple[str, int], _CacheEntry]
+        self._pins = {}  # type: T.Dict[str, str]
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> T.List[AddrInfo]:
+        """
+        Get the TCP addresses of a host, from the cache if they haven't expired.
+        :return: addresses in the order in which connecting to them should be attempted
+        """
+        pinned = self._pins.get(host)
+        if pinned is not None:
+            return socket.getaddrinfo(pinned, port, type=socket.SOCK_STREAM, proto=socket.IPPROTO_TCP,
+                                      flags=socket.AI_NUMERICHOST)
+
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry.expires > now:
+            return entry.addrinfos
+
+        addrinfos = interleave_families(socket.getaddrinfo(host, port, type=socket.SOCK_STREAM,
+                                                           proto=socket.IPPROTO_TCP))
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[key] = _CacheEntry(addrinfos, now + self.ttl)
+        return addrinfos
+
+    def pin(self, host: str, address: str):
+        """
+        Always connect to the given IP address when connecting to host, bypassing name resolution.
+        TLS server name and Host headers are not affected.
+        :param host: host name as given to setup
+        :param address: IPv4 or IPv6 address
+        """
+        # Fails early on anything that isn't an IP address
+        socket.getaddrinfo(address, None, flags=socket.AI_NUMERICHOST)
+        self._pins[host] = address
+
+    def pinned(self, host: str) -> T.Optional[str]:
+        """
+        Get the IP address host is pinned to, None if it isn't pinned.
+        """
+        return self._pins.get(host)
+
+    def unpin(self, host: str):
+        self._pins.pop(host, None)
+
+    def invalidate(self, host: T.Optional[str] = None):
+        """
+        Drop the cached addresses of a host, or of all hosts if None. Pins are kept.
+        """
+        with self._lock:
+            if host is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == host]:
+                    del self._entries[key]
+
+
+def interleave_families(addrinfos: T.Sequence[AddrInfo]) -> T.List[AddrInfo]:
+    """
+    Reorder addresses so that address families alternate, starting with the family of the first address,
+    as recommended by RFC 8305 section 4. The order within a family is kept.
+    """
+    by_family = {}  # type: T.Dict[int, T.List[AddrInfo]]
+    for info in addrinfos:
+        by_family.setdefault(info[0], []).append(info)
+    queues = list(by_family.values())
+    result = []
+    while queues:
+        for queue in queues:
+            result.append(queue.pop(0))
+        queues = [queue for queue in queues if queue]
+    return result
+
+
+def happy_eyeballs_connect(addrinfos: T.Sequence[AddrInfo], timeout: T.Optional[float],
+                           attempt_delay: float = DEFAULT_ATTEMPT_DELAY,
+                           configure: T.Optional[T.Callable[[socket.socket], None]] = None) \
+        -> T.Tuple[socket.socket, AddrInfo]:
+    """
+    Connect to the first address that accepts the connection, starting a new attempt every attempt_delay seconds
+    or as soon as the previous attempt fails, as in RFC 8305 section 5. The other attempts are abandoned.
+    :param addrinfos: addresses in the order to attempt them, see ResolverCache.resolve
+    :param timeout: timeout in seconds for the whole connection step, None to wait indefinitely
+    :param attempt_delay: time in seconds to wait for an attempt before starting the next one
+    :param configure: called with every socket before it connects, e.g. to set socket options
+    :return: the connected socket, with timeout set as its timeout, and its address
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    pending = list(addrinfos)
+    attempts = {}  # type: T.Dict[socket.socket, AddrInfo]
+    last_error = None  # type: T.Optional[OSError]
+    selector = selectors.DefaultSelector()
+    try:
+        while pending or attempts:
+            if pending:
+                info = pending.pop(0)
+                sock = socket.socket(info[0], info[1], info[2])
+                try:
+                    if configure is not None:
+                        configure(sock)
+                    sock.setblocking(False)
+                    err = sock.connect_ex(info[4])
+                except OSError as e:
+                    sock.close()
+                    last_error = e
+                    continue
+                if err == 0:
+                    sock.settimeout(timeout)
+                    return sock, info
+                if err not in _IN_PROGRESS:
+                    sock.close()
+                    last_error = OSError(err, os.strerror(err), info[4])
+                    continue
+                attempts[sock] = info
+                selector.register(sock, selectors.EVENT_WRITE)
+
+            wait = None if deadline is None else deadline - time.monotonic()
+            if wait is not None and wait <= 0:
+                break
+            if pending:
+                wait = attempt_delay if wait is None else min(wait, attempt_delay)
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                selector.unregister(sock)
+                info = attempts.pop(sock)
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0:
+                    sock.settimeout(timeout)
+                    return sock, info
+                sock.close()
+                last_error = OSError(err, os.strerror(err), info[4])
+
+        if attempts or pending:
+            # Only left with attempts or addresses remaining when the deadline has passed
+            raise socket.timeout('Timed out connecting to any of {} address(es)'.format(len(addrinfos)))
+        raise last_error if last_error is not None else OSError('No addresses to connect to')
+    finally:
+        for sock in attempts:
+            sock.close()
+        selector.close()
+
+
+# Cache used by connections that aren't given one
+DEFAULT_RESOLVER = ResolverCache()
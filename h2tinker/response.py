@@ -0,0 +1,166 @@
+import enum
+import typing as T
+
+import scapy.contrib.http2 as h2
+
+from h2tinker.frame_view import H2FrameView
+
+
+class TimedFrame(T.NamedTuple):
+    """
+    A received frame with its arrival time in perf_counter_ns time.
+    """
+    recv_ns: int
+    frame: H2FrameView
+
+
+class CloseReason(enum.Enum):
+    """
+    Why a stream was closed, see StreamResponse.close_reason.
+    """
+    # The server ended the stream with END_STREAM
+    ENDED = 'ended'
+    # The server reset the stream with RST_STREAM, see StreamResponse.reset_error
+    RESET = 'reset'
+    # The stream is above the last stream ID of the server's GOAWAY, so the server did not process it
+    GOAWAY = 'goaway'
+    # The connection failed before the stream was ended or reset
+    CONNECTION_LOST = 'connection lost'
+
+
+class StreamResponse:
+    """
+    Response received on one stream, with arrival times of its frames.
+    """
+
+    def __init__(self, stream_id: int):
+        self.stream_id = stream_id
+        self.headers = []  # type: T.List[T.Tuple[str, str]]
+        self.trailers = []  # type: T.List[T.Tuple[str, str]]
+        self.body = bytearray()
+        self.frames = []  # type: T.List[TimedFrame]
+        # Arrival of the first HEADERS frame
+        self.headers_ns = None  # type: T.Optional[int]
+        # Arrival of the frame carrying END_STREAM, RST_STREAM or GOAWAY, or time the connection was lost
+        self.end_ns = None  # type: T.Optional[int]
+        # Error code of the RST_STREAM frame if the server reset the stream
+        self.reset_error = None  # type: T.Optional[int]
+        # Why the stream was closed, None while it's open
+        self.close_reason = None  # type: T.Optional[CloseReason]
+
+    @property
+    def status(self) -> T.Optional[int]:
+        """
+        Response status code, None if no headers were received.
+        """
+        for name, value in self.headers:
+            if name == ':status':
+                return int(value)
+        return None
+
+    @property
+    def is_closed(self) -> bool:
+        """
+        Whether the stream has been closed, see close_reason.
+        """
+        return self.end_ns is not None
+
+    @property
+    def is_unprocessed(self) -> bool:
+        """
+        Whether the server is known not to have processed the request, so that it can be safely retried, see
+        RFC 7540 section 8.1.4: the stream was refused with REFUSED_STREAM or was above the GOAWAY cutoff.
+        """
+        return self.close_reason is CloseReason.GOAWAY or \
+            (self.close_reason is CloseReason.RESET and self.reset_error == h2.H2ErrorCodes.REFUSED_STREAM)
+
+    def close(self, reason: CloseReason, end_ns: int):
+        """
+        Record that the stream was closed, unless it already was.
+        """
+        if self.close_reason is None:
+            self.close_reason = reason
+            self.end_ns = end_ns
+
+    def get_header(self, name: str) -> T.Optional[str]:
+        """
+        Get the first value of a response header.
+        :param name: lowercase header name
+        """
+        for hdr_name, value in self.headers:
+            if hdr_name == name:
+                return value
+        return None
+
+    def __repr__(self):
+        return '<StreamResponse stream_id={} status={} body={} bytes closed={}>'.format(
+            self.stream_id, self.status, len(self.body), self.close_reason.value if self.close_reason else 'no')
+
+
+class ResponseSet:
+    """
+    Responses collected for a set of streams.
+    """
+
+    def __init__(self, stream_ids: T.Iterable[int], start_ns: int):
+        """
+        :param stream_ids: streams to collect responses for
+        :param start_ns: start of the collection in perf_counter_ns time
+        """
+        self.responses = {sid: StreamResponse(sid) for sid in stream_ids}  # type: T.Dict[int, StreamResponse]
+        self.start_ns = start_ns
+        self.end_ns = None  # type: T.Optional[int]
+
+    def __getitem__(self, stream_id: int) -> StreamResponse:
+        return self.responses[stream_id]
+
+    def __iter__(self) -> T.Iterator[StreamResponse]:
+        return iter(self.responses.values())
+
+    def __len__(self):
+        return len(self.responses)
+
+    @property
+    def open_stream_ids(self) -> T.List[int]:
+        """
+        Streams that have not been ended or reset yet.
+        """
+        return [sid for sid, resp in self.responses.items() if not resp.is_closed]
+
+    @property
+    def unprocessed_stream_ids(self) -> T.List[int]:
+        """
+        Streams the server is known not to have processed, see StreamResponse.is_unprocessed.
+        """
+        return [sid for sid, resp in self.responses.items() if resp.is_unprocessed]
+
+    @property
+    def is_complete(self) -> bool:
+        """
+        Whether all streams have been ended or reset.
+        """
+        return not self.open_stream_ids
+
+    def completion_order(self) -> T.List[int]:
+        """
+        IDs of closed streams ordered by the time they were ended or reset.
+        """
+        closed = [resp for resp in self.responses.values() if resp.is_closed]
+        return [resp.stream_id for resp in sorted(closed, key=lambda r: (r.end_ns, r.stream_id))]
+
+    def summary(self) -> str:
+        """
+        Human-readable one line per stream summary with status, body size and timings relative to the start.
+        """
+        lines = []
+        for resp in self.responses.values():
+            headers_us = '-' if resp.headers_ns is None else '{:.1f}'.format((resp.headers_ns - self.start_ns) / 1000)
+            end_us = '-' if resp.end_ns is None else '{:.1f}'.format((resp.end_ns - self.start_ns) / 1000)
+            line = 'stream {}: status {} body {} bytes, headers at {} us, end at {} us'.format(
+                resp.stream_id, resp.status, len(resp.body), headers_us, end_us)
+            if resp.reset_error is not None:
+                line += ', reset with error {}'.format(resp.reset_error)
+            elif resp.close_reason not in (None, CloseReason.ENDED):
+                line += ', {}'.format(resp.close_reason.value)
+            lines.append(line)
+        return '\n'.join(lines)
@@ -0,0 +1,185 @@
+import collections
+import logging
+import time
+import typing as T
+
+import scapy.contrib.http2 as h2
+
+from h2tinker.assrt import assert_error
+from h2tinker.burst import SegmentMode
+from h2tinker.h2_connection import H2Connection
+from h2tinker.pool import H2ConnectionPool
+from h2tinker.request import H2Request
+from h2tinker.waves import WaveRace, WaveResult
+
+# Requests of every round, or a function creating the requests of a round from its index
+RoundRequests = T.Union[T.Sequence[H2Request], T.Callable[[int], T.Sequence[H2Request]]]
+
+
+class RoundResult(T.NamedTuple):
+    """
+    Result of one round of a multi-round race, times are in perf_counter_ns time.
+    """
+    index: int
+    # Index of the connection the round ran on, it goes up whenever the connection was rotated
+    connection_index: int
+    start_ns: int
+    end_ns: int
+    race: WaveResult
+
+    @property
+    def duration_ns(self) -> int:
+        return self.end_ns - self.start_ns
+
+
+class MultiRoundResult(T.NamedTuple):
+    """
+    Results of all rounds of a multi-round race.
+    """
+    rounds: T.List[RoundResult]
+
+    @property
+    def num_connections(self) -> int:
+        return self.rounds[-1].connection_index + 1 if self.rounds else 0
+
+    def rounds_per_minute(self) -> T.Optional[float]:
+        """
+        Rate at which the rounds were run, None if there weren't any.
+        """
+        if not self.rounds:
+            return None
+        elapsed_ns = self.rounds[-1].end_ns - self.rounds[0].start_ns
+        return len(self.rounds) * 60e9 / elapsed_ns if elapsed_ns > 0 else None
+
+    def describe(self) -> str:
+        """
+        Human-readable summary with one line per round: status codes of the responses and trigger timing.
+        """
+        rate = self.rounds_per_minute()
+        lines = ['{} rounds on {} connection(s){}'.format(
+            len(self.rounds), self.num_connections, ', {:.0f} rounds per minute'.format(rate) if rate else '')]
+        for rnd in self.rounds:
+            statuses = collections.Counter(resp.status for resp in rnd.race.responses.values())
+            send_window_ns = max(wave.report.send_window_ns for wave in rnd.race.waves)
+            lines.append('round {} on connection {}: {:.1f} ms, {} wave(s), {} of {} requests raced, statuses {}, '
+                         'send window {:.1f} us'.format(
+                             rnd.index, rnd.connection_index, rnd.duration_ns / 1e6, rnd.race.num_waves,
+                             len(rnd.race.raced_requests()), len(rnd.race.responses) + len(rnd.race.unsent),
+                             dict(statuses), send_window_ns / 1000))
+        return '\n'.join(lines)
+
+
+class MultiRoundRace:
+    """
+    Many race rounds run back to back on one long-lived connection, instead of a new connection and handshake
+    per round.
+
+    Every round is a wave race (see WaveRace) and its responses are collected before the next round starts.
+    Streams the server hasn't closed by then are reset, so that they don't count against its concurrent stream
+    limit. The connection is rotated without interrupting the rounds: before a round that doesn't fit the
+    remaining stream IDs, or once the server has sent GOAWAY, it's retired and replaced by a new one.
+    """
+
+    def __init__(self, logger: logging.Logger, connect: T.Callable[[], H2Connection],
+                 release: T.Optional[T.Callable[[H2Connection], None]] = None,
+                 replace: T.Optional[T.Callable[[H2Connection], H2Connection]] = None):
+        """
+        :param logger: logger for race events
+        :param connect: creates a set-up connection, called for the first round
+        :param release: called with the last connection by close, closes it if None
+        :param replace: called on every rotation with the connection that can't be used any more, retires it
+        and returns a new one. If None, the connection is closed and connect is called
+        """
+        self.logger = logger
+        self.connect = connect
+        self.release = release if release is not None else H2Connection.close
+        self.replace = replace
+        self.conn = None  # type: T.Optional[H2Connection]
+        self.connection_index = -1
+
+    @classmethod
+    def from_pool(cls, logger: logging.Logger, pool: H2ConnectionPool, host: str, port: int = 443,
+                  server_name: T.Optional[str] = None) -> 'MultiRoundRace':
+        """
+        Run the rounds on connections acquired from a pool, see close.
+        :param logger: logger for race events
+        :param pool: pool to acquire connections from and release them to
+        :param host: host where to connect
+        :param port: TCP port where to connect
+        :param server_name: TLS server name, defaults to host
+        """
+        return cls(logger, lambda: pool.acquire(host, port, server_name), pool.release, pool.replace)
+
+    def run(self, rounds: int, requests: RoundRequests, settle_time: T.Optional[float] = None,
+            read_timeout: float = 10.0, segment_mode: SegmentMode = SegmentMode.NODELAY, pause: float = 0.0,
+            max_requeues: int = 0, on_round: T.Optional[T.Callable[[RoundResult], None]] = None) -> MultiRoundResult:
+        """
+        Run the rounds. The connection is kept afterwards, so that run can be called again, see close.
+        :param rounds: number of rounds
+        :param requests: requests to race in every round, or a function returning the requests of a round given
+        its index. Their stream IDs are ignored and allocated per round
+        :param settle_time: time in seconds to wait after sending the prefixes so that they are delivered, None to
+        wait until the server has received them, see H2Connection.settle
+        :param read_timeout: maximum time in seconds to wait for the responses of a round
+        :param segment_mode: how the final frames are handed to the kernel
+        :param pause: time in seconds to wait between rounds
+        :param max_requeues: how many times a request the server did not process is raced again within its round,
+        on a new connection if needed, see WaveRace
+        :param on_round: called with the result of every round as soon as it has finished
+        :return: results of every round
+        """
+        results = []  # type: T.List[RoundResult]
+        for index in range(rounds):
+            round_requests = requests(index) if callable(requests) else requests
+            assert_error(len(round_requests) > 0, 'Round {} has no requests', index)
+            conn = self._connection_for(len(round_requests))
+
+            start_ns = time.perf_counter_ns()
+            wave_race = WaveRace(self.logger, conn, self._replace)
+            race = wave_race.run(round_requests, settle_time, read_timeout, segment_mode, max_requeues=max_requeues)
+            # Streams on earlier connections of the round were closed together with them
+            unfinished = [sid for wave in race.waves if wave.connection_index == wave_race.connection_index
+                          for i, sid in zip(wave.request_indices, wave.stream_ids)
+                          if race.responses[i].stream_id == sid and not race.responses[i].is_closed]
+            if unfinished and self.conn.is_reusable:
+                self.logger.warning(f"[MultiRoundRace] resetting {len(unfinished)} unfinished streams of round {index}")
+                self.conn.reset_streams(unfinished, h2.H2ErrorCodes.CANCEL)
+            results.append(RoundResult(index, self.connection_index, start_ns, time.perf_counter_ns(), race))
+            if on_round is not None:
+                on_round(results[-1])
+            if pause and index < rounds - 1:
+                time.sleep(pause)
+
+        result = MultiRoundResult(results)
+        self.logger.info(f"[MultiRoundRace] {result.describe()}")
+        return result
+
+    def close(self):
+        """
+        Release the current connection.
+        """
+        if self.conn is not None:
+            self.release(self.conn)
+            self.conn = None
+
+    def _replace(self, conn: H2Connection) -> H2Connection:
+        # Also called by WaveRace when a round can't continue on the connection. The connection is retired rather
+        # than released, a pool would otherwise hand out the same connection again
+        if self.replace is not None:
+            self.conn = self.replace(conn)
+        else:
+            conn.close()
+            self.conn = self.connect()
+        self.connection_index += 1
+        return self.conn
+
+    def _connection_for(self, num_streams: int) -> H2Connection:
+        # Rotate the connection if the round can't be run on it
+        if self.conn is None:
+            self.conn = self.connect()
+            self.connection_index += 1
+        elif not (self.conn.is_reusable and self.conn.stream_ids.has_room(num_streams)):
+            self.logger.info(f"[MultiRoundRace] rotating connection {self.connection_index}, next stream ID "
+                             f"{self.conn.next_stream_id}, reusable {self.conn.is_reusable}")
+            self._replace(self.conn)
+        return self.conn
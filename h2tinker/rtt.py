@@ -0,0 +1,95 @@
+import collections
+import struct
+import time
+import typing as T
+
+# PING payload of the estimator: perf_counter_ns time at which the PING was sent
+_TIMESTAMP = struct.Struct('!Q')
+
+
+class RttEstimator:
+    """
+    Round-trip time estimate of a connection, from PING frames carrying their send time as opaque data.
+
+    The estimate is smoothed like TCP's retransmission timer, see RFC 6298: srtt follows the samples with a gain
+    of 1/8 and rttvar tracks their mean deviation with a gain of 1/4. Only ACKs of PINGs created with new_ping
+    are used as samples, so PINGs of others and duplicate ACKs are ignored.
+    """
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self, max_outstanding: int = 64):
+        """
+        :param max_outstanding: number of unacked PINGs remembered, the oldest ones are forgotten beyond that
+        """
+        self.max_outstanding = max_outstanding
+        self.srtt_ns = None  # type: T.Optional[float]
+        self.rttvar_ns = None  # type: T.Optional[float]
+        self.min_rtt_ns = None  # type: T.Optional[int]
+        self.latest_rtt_ns = None  # type: T.Optional[int]
+        self.num_samples = 0
+        self._outstanding = collections.OrderedDict()  # type: T.MutableMapping[bytes, int]
+
+    def new_ping(self) -> bytes:
+        """
+        Create the payload of a PING to be sent right away.
+        :return: 8 bytes of opaque data holding the current time
+        """
+        sent_ns = time.perf_counter_ns()
+        payload = _TIMESTAMP.pack(sent_ns)
+        # Two PINGs created within the same nanosecond would be indistinguishable
+        while payload in self._outstanding:
+            sent_ns += 1
+            payload = _TIMESTAMP.pack(sent_ns)
+        self._outstanding[payload] = sent_ns
+        while len(self._outstanding) > self.max_outstanding:
+            self._outstanding.popitem(last=False)
+        return payload
+
+    def on_ack(self, payload: bytes, ack_ns: int) -> T.Optional[int]:
+        """
+        Take the sample of a received PING ACK.
+        :param payload: opaque data of the ACK
+        :param ack_ns: perf_counter_ns time at which the ACK was received
+        :return: round-trip time in nanoseconds, None if the PING wasn't created by this estimator
+        """
+        sent_ns = self._outstanding.pop(payload, None)
+        if sent_ns is None:
+            return None
+        rtt_ns = ack_ns - sent_ns
+        self.add_sample(rtt_ns)
+        return rtt_ns
+
+    def add_sample(self, rtt_ns: int):
+        """
+        Update the estimate with a measured round-trip time.
+        """
+        if self.srtt_ns is None:
+            self.srtt_ns = float(rtt_ns)
+            self.rttvar_ns = rtt_ns / 2
+        else:
+            self.rttvar_ns = (1 - self.BETA) * self.rttvar_ns + self.BETA * abs(self.srtt_ns - rtt_ns)
+            self.srtt_ns = (1 - self.ALPHA) * self.srtt_ns + self.ALPHA * rtt_ns
+        self.min_rtt_ns = rtt_ns if self.min_rtt_ns is None else min(self.min_rtt_ns, rtt_ns)
+        self.latest_rtt_ns = rtt_ns
+        self.num_samples += 1
+
+    def is_pending(self, payload: bytes) -> bool:
+        """
+        Whether the PING with the given payload hasn't been acked yet.
+        """
+        return payload in self._outstanding
+
+    @property
+    def rto_ns(self) -> T.Optional[float]:
+        """
+        Time after which a PING ACK is overdue, srtt + 4 * rttvar, None before the first sample.
+        """
+        return None if self.srtt_ns is None else self.srtt_ns + 4 * self.rttvar_ns
+
+    def describe(self) -> str:
+        if self.srtt_ns is None:
+            return 'no RTT samples'
+        return 'srtt {:.1f} us, rttvar {:.1f} us, min {:.1f} us, latest {:.1f} us over {} samples'.format(
+            self.srtt_ns / 1000, self.rttvar_ns / 1000, self.min_rtt_ns / 1000, self.latest_rtt_ns / 1000,
+            self.num_samples)
@@ -0,0 +1,229 @@
+import struct
+import typing as T
+
+import scapy.contrib.http2 as h2
+
+from h2tinker.assrt import assert_error
+
+# Frame header: 24-bit length and 8-bit type packed into one 32-bit integer, flags, reserved bit and stream ID
+_FRAME_HEADER = struct.Struct('!IBI')
+_U32 = struct.Struct('!I')
+_SETTING = struct.Struct('!HI')
+_PRIORITY = struct.Struct('!IB')
+_GOAWAY = struct.Struct('!II')
+FRAME_HEADER_LEN = _FRAME_HEADER.size
+_STREAM_ID_MASK = 0x7fffffff
+
+FLAG_END_STREAM = 0x1
+FLAG_ACK = 0x1
+FLAG_END_HEADERS = 0x4
+FLAG_PRIORITY = 0x20
+
+
+def _to_bytes(data: T.Union[str, bytes, None]) -> bytes:
+    if data is None:
+        return b''
+    if isinstance(data, str):
+        return data.encode('UTF-8')
+    return data
+
+
+def pack_frame_header(length: int, frame_type: int, flags: int, stream_id: int) -> bytes:
+    """
+    Serialize a frame header alone, e.g. to send it followed by a payload that isn't copied into a FrameWriter.
+    """
+    return _FRAME_HEADER.pack((length << 8) | frame_type, flags, stream_id & _STREAM_ID_MASK)
+
+
+def iter_frame_headers(data: T.Union[bytes, bytearray, memoryview]) -> T.Iterator[T.Tuple[int, int, int, int]]:
+    """
+    Walk the headers of serialized frames without looking at their payloads.
+    :param data: whole frames
+    :return: iterator of (payload length, frame type, flags, stream ID) tuples
+    """
+    pos = 0
+    end = len(data) - FRAME_HEADER_LEN
+    while pos <= end:
+        length_and_type, flags, stream_id = _FRAME_HEADER.unpack_from(data, pos)
+        yield length_and_type >> 8, length_and_type & 0xff, flags, stream_id & _STREAM_ID_MASK
+        pos += FRAME_HEADER_LEN + (length_and_type >> 8)
+
+
+class FrameWriter:
+    """
+    Serializer that packs HTTP/2 frames straight into a growable buffer with struct.pack_into, without building
+    scapy packets. The output is byte-identical to serializing the frames created by the helpers in
+    h2tinker.frames and h2tinker.hpack. Use to_scapy to inspect the written frames.
+
+    The write methods return the writer, so calls can be chained:
+    FrameWriter().settings(is_ack=True).window_update(0, 1 << 20).getvalue()
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        :param capacity: initial buffer size in bytes, the buffer grows as needed
+        """
+        self.buf = bytearray(capacity)
+        self.pos = 0
+        self.num_frames = 0
+
+    def __len__(self):
+        return self.pos
+
+    def data(self, stream_id: int, data: T.Union[bytes, memoryview], end_stream: bool = False) -> 'FrameWriter':
+        """
+        Write a DATA frame.
+        :param stream_id: stream ID
+        :param data: frame payload
+        :param end_stream: whether to set the END_STREAM flag
+        """
+        offset = self._frame(len(data), h2.H2DataFrame.type_id, FLAG_END_STREAM if end_stream else 0, stream_id)
+        self.buf[offset:offset + len(data)] = data
+        return self
+
+    def headers(self, stream_id: int, header_block: T.Union[bytes, memoryview],
+                end_stream: bool = False, end_headers: bool = True,
+                priority: T.Optional[T.Tuple[int, int, bool]] = None) -> 'FrameWriter':
+        """
+        Write a HEADERS frame.
+        :param stream_id: stream ID
+        :param header_block: HPACK-encoded header block fragment
+        :param end_stream: whether to set the END_STREAM flag
+        :param end_headers: whether to set the END_HEADERS flag, clear it if CONTINUATION frames follow
+        :param priority: (dependency stream ID, weight, is exclusive) to send a priority HEADERS frame
+        """
+        flags = (FLAG_END_STREAM if end_stream else 0) | (FLAG_END_HEADERS if end_headers else 0)
+        length = len(header_block)
+        if priority is not None:
+            flags |= FLAG_PRIORITY
+            length += _PRIORITY.size
+        offset = self._frame(length, h2.H2HeadersFrame.type_id, flags, stream_id)
+        if priority is not None:
+            self._pack_priority(offset, *priority)
+            offset += _PRIORITY.size
+        self.buf[offset:offset + len(header_block)] = header_block
+        return self
+
+    def continuation(self, stream_id: int, header_block: T.Union[bytes, memoryview],
+                     end_headers: bool = True) -> 'FrameWriter':
+        """
+        Write a CONTINUATION frame.
+        :param stream_id: stream ID
+        :param header_block: HPACK-encoded header block fragment
+        :param end_headers: whether to set the END_HEADERS flag
+        """
+        offset = self._frame(len(header_block), h2.H2ContinuationFrame.type_id,
+                             FLAG_END_HEADERS if end_headers else 0, stream_id)
+        self.buf[offset:offset + len(header_block)] = header_block
+        return self
+
+    def priority(self, dependant_stream_id: int, dependency_stream_id: int, weight: int = 0,
+                 is_exclusive: bool = False) -> 'FrameWriter':
+        """
+        Write a PRIORITY frame, see create_priority_frame.
+        """
+        offset = self._frame(_PRIORITY.size, h2.H2PriorityFrame.type_id, 0, dependant_stream_id)
+        self._pack_priority(offset, dependency_stream_id, weight, is_exclusive)
+        return self
+
+    def rst_stream(self, stream_id: int, error_code: int = h2.H2ErrorCodes.NO_ERROR) -> 'FrameWriter':
+        """
+        Write a RST_STREAM frame, see create_rst_stream_frame.
+        """
+        offset = self._frame(_U32.size, h2.H2ResetFrame.type_id, 0, stream_id)
+        _U32.pack_into(self.buf, offset, error_code)
+        return self
+
+    def settings(self, settings: T.Iterable[T.Tuple[int, int]] = (), is_ack: bool = False) -> 'FrameWriter':
+        """
+        Write a SETTINGS frame, see create_settings_frame.
+        :param settings: (setting ID, value) pairs, e.g. (h2.H2Setting.SETTINGS_ENABLE_PUSH, 0), ignored for an ACK
+        :param is_ack: whether to set the ACK flag
+        """
+        settings = [] if is_ack else list(settings)
+        offset = self._frame(len(settings) * _SETTING.size, h2.H2SettingsFrame.type_id,
+                             FLAG_ACK if is_ack else 0, 0)
+        for setting_id, value in settings:
+            _SETTING.pack_into(self.buf, offset, setting_id, value)
+            offset += _SETTING.size
+        return self
+
+    def ping(self, data: T.Union[str, bytes, None] = None, is_ack: bool = False) -> 'FrameWriter':
+        """
+        Write a PING frame, see create_ping_frame.
+        :param data: 8 bytes or an 8-character string of opaque data, zeros if None
+        :param is_ack: whether to set the ACK flag
+        """
+        opaque = _to_bytes(data) or bytes(8)
+        assert_error(len(opaque) == 8, 'PING data must be 8 bytes long, got {}', len(opaque))
+        offset = self._frame(8, h2.H2PingFrame.type_id, FLAG_ACK if is_ack else 0, 0)
+        self.buf[offset:offset + 8] = opaque
+        return self
+
+    def goaway(self, error_code: int = h2.H2ErrorCodes.NO_ERROR, last_stream_id: int = 0,
+               additional_data: T.Union[str, bytes] = b'') -> 'FrameWriter':
+        """
+        Write a GOAWAY frame, see create_goaway_frame.
+        """
+        debug_data = _to_bytes(additional_data)
+        offset = self._frame(_GOAWAY.size + len(debug_data), h2.H2GoAwayFrame.type_id, 0, 0)
+        _GOAWAY.pack_into(self.buf, offset, last_stream_id & _STREAM_ID_MASK, error_code)
+        offset += _GOAWAY.size
+        self.buf[offset:offset + len(debug_data)] = debug_data
+        return self
+
+    def window_update(self, stream_id: int, window_increment: int, reserved_bit: int = 0) -> 'FrameWriter':
+        """
+        Write a WINDOW_UPDATE frame, see create_window_update_frame. Like there, the reserved bit is the one
+        of the frame header.
+        """
+        offset = self._frame(_U32.size, h2.H2WindowUpdateFrame.type_id, 0, stream_id, reserved_bit)
+        _U32.pack_into(self.buf, offset, window_increment & _STREAM_ID_MASK)
+        return self
+
+    def getvalue(self) -> bytes:
+        """
+        Get a copy of the written frames.
+        """
+        return bytes(self.buf[:self.pos])
+
+    def view(self) -> memoryview:
+        """
+        Get a view of the written frames without copying. The view must be released before writing more frames.
+        """
+        return memoryview(self.buf)[:self.pos]
+
+    def clear(self):
+        """
+        Discard the written frames, keeping the buffer for reuse.
+        """
+        self.pos = 0
+        self.num_frames = 0
+
+    def to_scapy(self) -> T.List[h2.H2Frame]:
+        """
+        Dissect the written frames into scapy packets, for inspection.
+        """
+        frames = []
+        pos = 0
+        while pos < self.pos:
+            length_and_type, _, _ = _FRAME_HEADER.unpack_from(self.buf, pos)
+            end = pos + FRAME_HEADER_LEN + (length_and_type >> 8)
+            frames.append(h2.H2Frame(bytes(self.buf[pos:end])))
+            pos = end
+        return frames
+
+    def _frame(self, length: int, frame_type: int, flags: int, stream_id: int, reserved_bit: int = 0) -> int:
+        # Write the frame header, making room for the payload, and return the payload offset
+        end = self.pos + FRAME_HEADER_LEN + length
+        if end > len(self.buf):
+            self.buf.extend(bytes(max(end, 2 * len(self.buf)) - len(self.buf)))
+        _FRAME_HEADER.pack_into(self.buf, self.pos, (length << 8) | frame_type, flags,
+                                (reserved_bit << 31) | (stream_id & _STREAM_ID_MASK))
+        self.pos = end
+        self.num_frames += 1
+        return end - length
+
+    def _pack_priority(self, offset: int, dependency_stream_id: int, weight: int, is_exclusive: bool):
+        _PRIORITY.pack_into(self.buf, offset,
+                            (0x80000000 if is_exclusive else 0) | (dependency_stream_id & _STREAM_ID_MASK), weight)
@@ -0,0 +1,52 @@
+import struct
+import typing as T
+
+import scapy.contrib.http2 as h2
+
+_SETTING = struct.Struct('!HI')
+
+
+class PeerSettings(T.NamedTuple):
+    """
+    Settings advertised by the server, with the initial values defined in RFC 7540 section 6.5.2 until it
+    sends its own. None means unlimited.
+    """
+    header_table_size: int = 4096
+    enable_push: bool = True
+    max_concurrent_streams: T.Optional[int] = None
+    initial_window_size: int = 65_535
+    max_frame_size: int = 16_384
+    max_header_list_size: T.Optional[int] = None
+
+    def updated(self, settings: T.Iterable[T.Tuple[int, int]]) -> 'PeerSettings':
+        """
+        Apply settings received in a SETTINGS frame, in order. Unknown settings are ignored as required.
+        :param settings: (setting ID, value) pairs, see parse_settings
+        :return: the updated settings
+        """
+        changes = {}  # type: T.Dict[str, T.Any]
+        for setting, value in settings:
+            name = _FIELDS.get(setting)
+            if name is not None:
+                changes[name] = bool(value) if name == 'enable_push' else value
+        return self._replace(**changes) if changes else self
+
+
+_FIELDS = {
+    h2.H2Setting.SETTINGS_HEADER_TABLE_SIZE: 'header_table_size',
+    h2.H2Setting.SETTINGS_ENABLE_PUSH: 'enable_push',
+    h2.H2Setting.SETTINGS_MAX_CONCURRENT_STREAMS: 'max_concurrent_streams',
+    h2.H2Setting.SETTINGS_INITIAL_WINDOW_SIZE: 'initial_window_size',
+    h2.H2Setting.SETTINGS_MAX_FRAME_SIZE: 'max_frame_size',
+    h2.H2Setting.SETTINGS_MAX_HEADER_LIST_SIZE: 'max_header_list_size',
+}
+
+
+def parse_settings(payload: T.Union[bytes, memoryview]) -> T.List[T.Tuple[int, int]]:
+    """
+    Decode the payload of a SETTINGS frame without scapy.
+    :param payload: frame payload, a multiple of 6 bytes long
+    :return: (setting ID, value) pairs in the order they were sent
+    """
+    return [_SETTING.unpack_from(payload, offset)
+            for offset in range(0, len(payload) - len(payload) % _SETTING.size, _SETTING.size)]
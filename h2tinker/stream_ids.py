@@ -0,0 +1,65 @@
+import typing as T
+
+from h2tinker.assrt import assert_error
+
+# Largest stream ID, stream IDs are 31-bit integers
+MAX_STREAM_ID = 2 ** 31 - 1
+
+
+class StreamIdAllocator:
+    """
+    Allocator of client-side stream IDs on one connection: increasing odd integers, each handed out only once,
+    as required by RFC 7540 section 5.1.1.
+
+    The ID space of a connection lasts for about a billion streams. Callers that run many races on one
+    connection should check has_room before each batch and move to a new connection once it's exhausted,
+    see H2ConnectionPool and MultiRoundRace.
+    """
+
+    def __init__(self, first_id: int = 1, max_id: int = MAX_STREAM_ID):
+        """
+        :param first_id: first ID to hand out, an odd integer
+        :param max_id: largest ID that may be handed out
+        """
+        assert_error(first_id % 2 == 1, 'Client-side stream IDs are odd, got {}', first_id)
+        self.next_id = first_id
+        self.max_id = max_id
+
+    @property
+    def remaining(self) -> int:
+        """
+        Number of IDs that can still be allocated.
+        """
+        return max(0, (self.max_id - self.next_id) // 2 + 1)
+
+    def has_room(self, n: int) -> bool:
+        """
+        Whether n more IDs can be allocated.
+        """
+        return self.remaining >= n
+
+    def allocate(self, n: int) -> T.List[int]:
+        """
+        Allocate n IDs.
+        :return: list of the IDs in increasing order
+        """
+        return list(self.reserve_block(n))
+
+    def reserve_block(self, n: int) -> range:
+        """
+        Reserve a contiguous block of n IDs for one batch, e.g. the requests of one race.
+        :return: range of the reserved IDs, in increasing order with a step of 2
+        """
+        assert_error(n >= 0, 'Number of stream IDs must not be negative, got {}', n)
+        assert_error(self.has_room(n), 'Stream IDs exhausted: {} requested but only {} left, use a new connection',
+                     n, self.remaining)
+        block = range(self.next_id, self.next_id + n * 2, 2)
+        self.next_id += n * 2
+        return block
+
+    def skip_to(self, stream_id: int):
+        """
+        Never hand out IDs below stream_id, e.g. after stream 1 was used by an HTTP/1.1 upgrade.
+        """
+        if stream_id > self.next_id:
+            self.next_id = stream_id if stream_id % 2 == 1 else stream_id + 1
@@ -0,0 +1,188 @@
+import json
+import socket
+import struct
+import typing as T
+
+from h2tinker.response import StreamResponse
+
+# Linux SO_TIMESTAMPING constants, see Documentation/networking/timestamping.rst
+SO_TIMESTAMPING = 37
+SCM_TIMESTAMPING = SO_TIMESTAMPING
+SOF_TIMESTAMPING_TX_SOFTWARE = 1 << 1
+SOF_TIMESTAMPING_SOFTWARE = 1 << 4
+SOF_TIMESTAMPING_OPT_ID = 1 << 7
+SOF_TIMESTAMPING_OPT_TSONLY = 1 << 11
+# struct sock_extended_err: errno, origin, type, code, pad, info, data
+_SOCK_EXTENDED_ERR = struct.Struct('=IBBBBII')
+# struct scm_timestamping: three struct timespec, the first one holds the software timestamp
+_SCM_TIMESTAMPING = struct.Struct('=qqqqqq')
+
+
+class IOEvent(T.NamedTuple):
+    """
+    One traced send or receive on a connection, timestamps are in perf_counter_ns time.
+    """
+    kind: str  # 'send' or 'recv'
+    start_ns: int
+    end_ns: int
+    num_bytes: int
+    # Number of socket send/recv calls it took
+    num_calls: int
+
+
+class TxTimestamp(T.NamedTuple):
+    """
+    Kernel software TX timestamp of sent data.
+    """
+    # Number of bytes sent on the socket up to and including the timestamped data
+    byte_offset: int
+    # CLOCK_REALTIME time in nanoseconds
+    realtime_ns: int
+
+
+class IOTrace:
+    """
+    Record of the sends and receives performed on a connection, see H2Connection.enable_io_trace.
+    """
+
+    def __init__(self):
+        self.events = []  # type: T.List[IOEvent]
+
+    def record(self, kind: str, start_ns: int, end_ns: int, num_bytes: int, num_calls: int = 1):
+        self.events.append(IOEvent(kind, start_ns, end_ns, num_bytes, num_calls))
+
+    def mark(self) -> int:
+        """
+        Get a position in the trace, to select the events recorded after it with events_since.
+        """
+        return len(self.events)
+
+    def events_since(self, mark: int, kind: T.Optional[str] = None) -> T.List[IOEvent]:
+        """
+        Get the events recorded after a mark.
+        :param mark: position returned by mark
+        :param kind: 'send' or 'recv' to select only one kind of events, None for all
+        """
+        return [e for e in self.events[mark:] if kind is None or e.kind == kind]
+
+    def totals(self, kind: str) -> T.Tuple[int, int]:
+        """
+        Get the total number of bytes and socket calls of one kind of events.
+        :param kind: 'send' or 'recv'
+        :return: tuple of bytes and calls
+        """
+        events = [e for e in self.events if e.kind == kind]
+        return sum(e.num_bytes for e in events), sum(e.num_calls for e in events)
+
+    def clear(self):
+        self.events.clear()
+
+
+def enable_tx_timestamps(sock: socket.socket) -> bool:
+    """
+    Ask the kernel to report software TX timestamps for data sent on a plain TCP socket.
+    Not available for TLS sockets, since the timestamps are read from the socket error queue.
+    :param sock: connected TCP socket
+    :return: whether timestamping was enabled
+    """
+    flags = (SOF_TIMESTAMPING_TX_SOFTWARE | SOF_TIMESTAMPING_SOFTWARE |
+             SOF_TIMESTAMPING_OPT_ID | SOF_TIMESTAMPING_OPT_TSONLY)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, flags)
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+def read_tx_timestamps(sock: socket.socket) -> T.List[TxTimestamp]:
+    """
+    Read the TX timestamps queued by the kernel since the last call without blocking.
+    :param sock: socket with TX timestamps enabled, see enable_tx_timestamps
+    :return: timestamps in the order they were queued
+    """
+    timestamps = []
+    while True:
+        try:
+            _, ancdata, _, _ = sock.recvmsg(0, 512, socket.MSG_ERRQUEUE | socket.MSG_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            break
+        except (OSError, NotImplementedError):
+            break
+        realtime_ns = None
+        byte_offset = None
+        for level, msg_type, data in ancdata:
+            if level == socket.SOL_SOCKET and msg_type == SCM_TIMESTAMPING and len(data) >= _SCM_TIMESTAMPING.size:
+                sec, nsec = _SCM_TIMESTAMPING.unpack_from(data)[:2]
+                realtime_ns = sec * 1_000_000_000 + nsec
+            elif len(data) >= _SOCK_EXTENDED_ERR.size:
+                byte_offset = _SOCK_EXTENDED_ERR.unpack_from(data)[6]
+        if realtime_ns is not None:
+            timestamps.append(TxTimestamp(byte_offset, realtime_ns))
+    return timestamps
+
+
+class SkewReport:
+    """
+    Timing report of a synchronized send: how long the trigger send took and how the responses arrived.
+    All times are in nanoseconds, arrival times are relative to the end of the trigger send.
+    """
+
+    def __init__(self, send_events: T.Sequence[IOEvent], responses: T.Iterable[StreamResponse],
+                 tx_timestamps: T.Sequence[TxTimestamp] = ()):
+        """
+        :param send_events: traced sends of the trigger, e.g. the final-frame burst
+        :param responses: responses to the raced requests
+        :param tx_timestamps: kernel TX timestamps of the trigger sends, if available
+        """
+        self.send_start_ns = min(e.start_ns for e in send_events)
+        self.send_end_ns = max(e.end_ns for e in send_events)
+        self.send_window_ns = self.send_end_ns - self.send_start_ns
+        self.send_bytes = sum(e.num_bytes for e in send_events)
+        self.send_calls = sum(e.num_calls for e in send_events)
+        tx_ns = [ts.realtime_ns for ts in tx_timestamps]
+        self.kernel_send_window_ns = max(tx_ns) - min(tx_ns) if tx_ns else None
+
+        responses = list(responses)
+        answered = sorted((r for r in responses if r.headers_ns is not None), key=lambda r: (r.headers_ns, r.stream_id))
+        self.arrival_order = [r.stream_id for r in answered]
+        self.response_ns = {r.stream_id: r.headers_ns - self.send_end_ns for r in answered}
+        self.response_spread_ns = (answered[-1].headers_ns - answered[0].headers_ns) if answered else None
+        self.unanswered = [r.stream_id for r in responses if r.headers_ns is None]
+
+    def to_dict(self) -> T.Dict[str, T.Any]:
+        return {
+            'send_start_ns': self.send_start_ns,
+            'send_end_ns': self.send_end_ns,
+            'send_window_ns': self.send_window_ns,
+            'send_bytes': self.send_bytes,
+            'send_calls': self.send_calls,
+            'kernel_send_window_ns': self.kernel_send_window_ns,
+            'arrival_order': self.arrival_order,
+            'response_ns': self.response_ns,
+            'response_spread_ns': self.response_spread_ns,
+            'unanswered': self.unanswered,
+        }
+
+    def write(self, path: str):
+        """
+        Write the report as JSON.
+        :param path: file to write to, overwritten if it exists
+        """
+        with open(path, 'w') as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+
+    def describe(self) -> str:
+        """
+        Human-readable summary of the report.
+        """
+        desc = 'send window {:.1f} us ({} bytes in {} call(s))'.format(
+            self.send_window_ns / 1000, self.send_bytes, self.send_calls)
+        if self.kernel_send_window_ns is not None:
+            desc += ', kernel TX window {:.1f} us'.format(self.kernel_send_window_ns / 1000)
+        if self.response_spread_ns is not None:
+            desc += ', response spread {:.1f} us, first response after {:.1f} us'.format(
+                self.response_spread_ns / 1000, min(self.response_ns.values()) / 1000)
+        desc += ', arrival order {}'.format(self.arrival_order)
+        if self.unanswered:
+            desc += ', unanswered streams {}'.format(self.unanswered)
+        return desc
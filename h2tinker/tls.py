@@ -0,0 +1,112 @@
+import ssl
+import threading
+import time
+import typing as T
+
+# (SSL context, server name, port) the sessions are cached under
+SessionKey = T.Tuple[ssl.SSLContext, str, int]
+
+
+class HandshakeTiming(T.NamedTuple):
+    """
+    Timing of a TLS handshake, timestamps are in perf_counter_ns time.
+    """
+    server_name: str
+    port: int
+    start_ns: int
+    end_ns: int
+    # Whether a cached session was offered and whether the server accepted it
+    session_offered: bool
+    resumed: bool
+    version: T.Optional[str]
+
+    @property
+    def duration_us(self) -> float:
+        return (self.end_ns - self.start_ns) / 1000
+
+
+class TLSSessionCache:
+    """
+    Shared SSL contexts and TLS sessions for resuming handshakes with hosts connected to before.
+
+    A session can only be resumed with the context it was negotiated with, so the cache creates one context per
+    configuration and keeps it for every later connection. Sessions are stored per context, server name and port,
+    and replaced with the latest one after every connection since TLS 1.3 servers may issue single-use tickets.
+    The cache is thread-safe so that it can be shared by connections set up from several threads.
+    """
+
+    def __init__(self, max_timings: int = 1000):
+        """
+        :param max_timings: number of most recent handshake timings to keep, see timings
+        """
+        self.max_timings = max_timings
+        self.timings = []  # type: T.List[HandshakeTiming]
+        self._contexts = {}  # type: T.Dict[T.Tuple[T.Optional[str], bool], ssl.SSLContext]
+        self._sessions = {}  # type: T.Dict[SessionKey, ssl.SSLSession]
+        self._lock = threading.Lock()
+
+    def get_context(self, cafile: T.Optional[str] = None, verify: bool = True) -> ssl.SSLContext:
+        """
+        Get the shared client context of a configuration, creating it on first use. ALPN is set to h2.
+        :param cafile: file with CA certificates to trust instead of the system default ones
+        :param verify: whether to verify the server certificate and host name
+        :return: SSL context that is reused by every call with the same configuration
+        """
+        key = (cafile, verify)
+        with self._lock:
+            ctx = self._contexts.get(key)
+            if ctx is None:
+                ctx = ssl.create_default_context(cafile=cafile)
+                if not verify:
+                    ctx.check_hostname = False
+                    ctx.verify_mode = ssl.CERT_NONE
+                ctx.set_alpn_protocols(['h2'])
+                self._contexts[key] = ctx
+            return ctx
+
+    def get_session(self, ctx: ssl.SSLContext, server_name: str, port: int) -> T.Optional[ssl.SSLSession]:
+        """
+        Get the session to resume with a server, if there is one that hasn't timed out.
+        """
+        key = (ctx, server_name, port)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None and time.time() > session.time + session.timeout:
+                del self._sessions[key]
+                session = None
+            return session
+
+    def store_session(self, ctx: ssl.SSLContext, server_name: str, port: int, session: T.Optional[ssl.SSLSession]):
+        """
+        Store the session negotiated with a server, to be resumed by the next connection to it.
+        """
+        if session is None:
+            return
+        with self._lock:
+            self._sessions[(ctx, server_name, port)] = session
+
+    def record_timing(self, timing: HandshakeTiming):
+        with self._lock:
+            self.timings.append(timing)
+            if len(self.timings) > self.max_timings:
+                del self.timings[:len(self.timings) - self.max_timings]
+
+    def resumption_rate(self) -> T.Optional[float]:
+        """
+        Fraction of the recorded handshakes that resumed a session, None if nothing has been recorded.
+        """
+        if not self.timings:
+            return None
+        return sum(t.resumed for t in self.timings) / len(self.timings)
+
+    def clear(self):
+        """
+        Forget all sessions and timings, the contexts are kept.
+        """
+        with self._lock:
+            self._sessions.clear()
+            self.timings.clear()
+
+
+# Cache used by TLS connections that aren't given one
+DEFAULT_SESSION_CACHE = TLSSessionCache()
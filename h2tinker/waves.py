@@ -0,0 +1,219 @@
+import logging
+import typing as T
+
+import scapy.contrib.http2 as h2
+
+from h2tinker.assrt import assert_error
+from h2tinker.burst import SegmentMode
+from h2tinker.h2_connection import H2Connection
+from h2tinker.request import H2Request
+from h2tinker.response import CloseReason, StreamResponse
+from h2tinker.timing import SkewReport
+
+
+class Wave(T.NamedTuple):
+    """
+    One group of requests of a wave race, raced against each other with last-frame synchronization.
+    """
+    index: int
+    # Indices of the requests in the input sequence and the stream IDs they were sent on
+    request_indices: T.List[int]
+    stream_ids: T.List[int]
+    report: SkewReport
+    # 0 for the first sending of the requests, n for their n-th requeue
+    attempt: int = 0
+    # Index of the connection the wave was sent on, it goes up whenever the connection was replaced
+    connection_index: int = 0
+
+
+class WaveResult(T.NamedTuple):
+    """
+    Merged result of a wave race.
+    """
+    # Last response to each sent request, keyed by the request's index in the input sequence
+    responses: T.Dict[int, StreamResponse]
+    waves: T.List[Wave]
+    # Indices of the requests that were never sent, because the connection could not be used any more
+    unsent: T.List[int]
+
+    @property
+    def num_waves(self) -> int:
+        return len(self.waves)
+
+    def raced_requests(self) -> T.List[int]:
+        """
+        Indices of the requests that took part in the race, i.e. that were sent and not left unprocessed by the
+        server. Compare with the number of requests to see how many were lost.
+        """
+        return [i for i, resp in self.responses.items() if not resp.is_unprocessed]
+
+    def unprocessed_requests(self) -> T.List[int]:
+        """
+        Indices of the requests the server did not process in their last attempt: refused or above the GOAWAY
+        cutoff, see StreamResponse.is_unprocessed.
+        """
+        return [i for i, resp in self.responses.items() if resp.is_unprocessed]
+
+    def refused_requests(self) -> T.List[int]:
+        """
+        Indices of the requests the server refused with REFUSED_STREAM, e.g. because streams were still open from
+        earlier use of the connection.
+        """
+        return [i for i, resp in self.responses.items() if resp.reset_error == h2.H2ErrorCodes.REFUSED_STREAM]
+
+    def describe(self) -> str:
+        """
+        Human-readable summary with the trigger timing of every wave.
+        """
+        lines = ['{} of {} requests raced in {} wave(s)'.format(
+            len(self.raced_requests()), len(self.responses) + len(self.unsent), self.num_waves)]
+        for wave in self.waves:
+            retry = ', requeue {}'.format(wave.attempt) if wave.attempt else ''
+            lines.append('wave {}: {} requests on connection {}{}, {}'.format(
+                wave.index, len(wave.request_indices), wave.connection_index, retry, wave.report.describe()))
+        unprocessed = self.unprocessed_requests()
+        refused = [i for i in unprocessed if self.responses[i].close_reason is CloseReason.RESET]
+        if refused:
+            lines.append('requests refused by the server: {}'.format(refused))
+        cut_off = [i for i in unprocessed if self.responses[i].close_reason is CloseReason.GOAWAY]
+        if cut_off:
+            lines.append('requests above the GOAWAY cutoff: {}'.format(cut_off))
+        if self.unsent:
+            lines.append('requests not sent: {}'.format(self.unsent))
+        return '\n'.join(lines)
+
+
+class WaveRace:
+    """
+    Last-frame synchronization on one connection for more requests than the server allows concurrent streams.
+
+    Requests are split into waves that fit the server's SETTINGS_MAX_CONCURRENT_STREAMS. Every wave is a race of
+    its own: its requests are streamed with their last bytes withheld, the final frames are sent with one burst and
+    the responses are collected before the next wave starts, so the streams of different waves are never open at
+    the same time. Only requests within the same wave race each other, use FanoutRace to race more requests at once.
+
+    Requests the server did not process, because it refused their streams or sent GOAWAY with a lower last stream
+    ID, can be requeued: they are raced again in waves of their own after the other requests, on a new connection
+    if the server won't accept new streams on the current one.
+    """
+
+    def __init__(self, logger: logging.Logger, conn: H2Connection,
+                 reconnect: T.Optional[T.Callable[[H2Connection], H2Connection]] = None):
+        """
+        :param logger: logger for race events
+        :param conn: set-up connection to race on
+        :param reconnect: replaces the connection once it can't be used any more, e.g. after GOAWAY: called with
+        the old connection, it disposes of it and returns a new set-up one, see H2ConnectionPool.replace.
+        The race continues on the new connection, which becomes conn. Without it the remaining requests are not
+        sent
+        """
+        self.logger = logger
+        self.conn = conn
+        self.reconnect = reconnect
+        self.connection_index = 0
+
+    def wave_size(self, max_wave_size: T.Optional[int] = None) -> T.Optional[int]:
+        """
+        Get the number of requests that fit one wave on the connection right now.
+        :param max_wave_size: upper limit of our own, None for no limit
+        :return: number of requests, None if there is no limit
+        """
+        limits = [n for n in (self.conn.peer_settings.max_concurrent_streams, max_wave_size) if n is not None]
+        return min(limits) if limits else None
+
+    def run(self, requests: T.Sequence[H2Request], settle_time: T.Optional[float] = None, read_timeout: float = 10.0,
+            segment_mode: SegmentMode = SegmentMode.NODELAY, max_wave_size: T.Optional[int] = None,
+            max_requeues: int = 0,
+            on_wave: T.Optional[T.Callable[[Wave, T.Dict[int, StreamResponse]], None]] = None) -> WaveResult:
+        """
+        Run the race wave by wave.
+        :param requests: requests to race, their stream IDs are ignored and allocated per wave
+        :param settle_time: time in seconds to wait after sending the prefixes of a wave so that they are delivered,
+        None to wait until the server has received them, see H2Connection.settle
+        :param read_timeout: maximum time in seconds to wait for the responses of a wave after its burst
+        :param segment_mode: how the final frames are handed to the kernel
+        :param max_wave_size: upper limit for the number of requests per wave, on top of the server's limit
+        :param max_requeues: how many times a request the server did not process is raced again
+        :param on_wave: called with every wave and its responses keyed by request index as soon as they have been
+        collected, e.g. to show results while later waves are still running
+        :return: responses merged over all waves and the trigger timing of every wave
+        """
+        assert_error(len(requests) > 0, 'Wave race needs at least one request')
+        responses = {}  # type: T.Dict[int, StreamResponse]
+        waves = []  # type: T.List[Wave]
+        pending = list(range(len(requests)))
+        unsent = []  # type: T.List[int]
+        for attempt in range(max_requeues + 1):
+            start = 0
+            while start < len(pending):
+                if not self._usable_for(len(pending) - start, max_wave_size):
+                    unsent = pending[start:]
+                    break
+                # The server may change its limit between waves
+                size = self.wave_size(max_wave_size)
+                assert_error(size is None or size > 0, 'Server does not allow any concurrent streams')
+                end = len(pending) if size is None else min(len(pending), start + size)
+                wave = self._run_wave(len(waves), requests, pending[start:end], settle_time, read_timeout,
+                                      segment_mode, attempt, responses)
+                waves.append(wave)
+                if on_wave is not None:
+                    on_wave(wave, {i: responses[i] for i in wave.request_indices})
+                start = end
+            pending = [i for i in pending if i in responses and responses[i].is_unprocessed]
+            if unsent or not pending or attempt == max_requeues:
+                break
+            self.logger.warning(f"[WaveRace] server did not process {len(pending)} requests, requeueing them")
+
+        result = WaveResult(responses, waves, unsent)
+        if result.num_waves > 1:
+            largest = max(len(wave.request_indices) for wave in waves)
+            self.logger.warning(f"[WaveRace] {len(requests)} requests were raced in {result.num_waves} waves of at "
+                                f"most {largest} requests, requests of different waves don't race each other")
+        not_raced = len(requests) - len(result.raced_requests())
+        if not_raced:
+            self.logger.warning(f"[WaveRace] {not_raced} of {len(requests)} requests did not take part in the race: "
+                                f"{len(result.unprocessed_requests())} not processed by the server, {len(unsent)} "
+                                f"not sent")
+        self.logger.info(f"[WaveRace] {result.describe()}")
+        return result
+
+    def _usable_for(self, num_requests: int, max_wave_size: T.Optional[int]) -> bool:
+        # Replace the connection if the next wave can't be sent on it
+        size = self.wave_size(max_wave_size)
+        wave_size = num_requests if size is None else min(num_requests, size)
+        if self.conn.is_reusable and self.conn.stream_ids.has_room(wave_size):
+            return True
+        if self.reconnect is None:
+            self.logger.warning(f"[WaveRace] connection can't be used for {num_requests} more requests and there is "
+                                f"no way to reconnect, they are not sent")
+            return False
+        self.logger.info(f"[WaveRace] replacing connection {self.connection_index} for {num_requests} more requests")
+        self.conn = self.reconnect(self.conn)
+        self.connection_index += 1
+        return True
+
+    def _run_wave(self, index: int, requests: T.Sequence[H2Request], indices: T.List[int],
+                  settle_time: T.Optional[float], read_timeout: float, segment_mode: SegmentMode, attempt: int,
+                  responses: T.Dict[int, StreamResponse]) -> Wave:
+        stream_ids = self.conn.allocate_stream_ids(len(indices))
+        wave_requests = [requests[i]._replace(stream_id=sid) for i, sid in zip(indices, stream_ids)]
+
+        finals = self.conn.send_streaming_requests(wave_requests, withhold_last_byte=True)
+        burst = self.conn.prepare_raw_burst(finals.getvalue(), finals.num_frames, mode=segment_mode)
+        self.conn.settle(settle_time, read_timeout)
+        # Only the flush is traced, unless the caller traces the connection itself. Tracing makes every send a
+        # loop of timed calls and the events would pile up over the waves of a long-lived connection
+        owns_trace = self.conn.io_trace is None
+        trace = self.conn.enable_io_trace()
+        mark = trace.mark()
+        try:
+            self.conn.send_burst(burst)
+        finally:
+            send_events = trace.events_since(mark, 'send')
+            if owns_trace:
+                self.conn.disable_io_trace()
+
+        response_set = self.conn.collect_responses(stream_ids, read_timeout)
+        for i, sid in zip(indices, stream_ids):
+            responses[i] = response_set[sid]
+        return Wave(index, indices, stream_ids, SkewReport(send_events, response_set), attempt, self.connection_index)
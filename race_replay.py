@@ -3,6 +3,7 @@ import time
 import scapy.contrib.http2 as scapy
 import logging
 from mitmproxy import command
+from mitmproxy import ctx
 from mitmproxy import flow
 from mitmproxy import http
 from mitmproxy.log import ALERT
@@ -11,54 +12,277 @@ import typing
 import abc
 import collections
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 
 this_logger = logging.getLogger(__name__)
 logging.basicConfig(filename='mitmproxy-race_replay.log', level=logging.DEBUG, force=True)
+# Keep h2tinker's own messages out of the mitmproxy console
+h2.set_log_output(h2.OutputLogger(this_logger))
+
+
+class RacedStream(typing.NamedTuple):
+    """
+    One stream of a race, to be shown in mitmproxy as a copy of the flow it was replayed from.
+    """
+    source: http.HTTPFlow
+    response: h2.StreamResponse
+    # Final-frame flush that triggered the stream, in perf_counter_ns time
+    send_start_ns: int
+    send_end_ns: int
+    # Race details and timing for the flow's metadata
+    metadata: typing.Dict[str, typing.Any]
+
+
+# Receives the streams of a race from the worker as soon as they are done, see RaceReplay._submit
+Publish = typing.Callable[[typing.List[RacedStream]], None]
+
+
+def _requests(http_flows: typing.Sequence[http.HTTPFlow]) -> typing.List[h2.H2Request]:
+    # Stream IDs are allocated by the races, from the IDs that haven't been used on the (possibly reused) connections
+    return [h2.H2Request(f.request.method, f.request.path, 0, headers=f.request.headers, body=f.request.content)
+            for f in http_flows]
+
+
+def _stream_metadata(race: str, request_index: int, resp: h2.StreamResponse, send_end_ns: int) \
+        -> typing.Dict[str, typing.Any]:
+    # Times are in microseconds after the final frames were sent
+    return {
+        'race': race,
+        'request_index': request_index,
+        'stream_id': resp.stream_id,
+        'raced': not resp.is_unprocessed,
+        'close_reason': resp.close_reason.value if resp.close_reason else None,
+        'reset_error': resp.reset_error,
+        'headers_after_us': None if resp.headers_ns is None else (resp.headers_ns - send_end_ns) / 1000,
+        'end_after_us': None if resp.end_ns is None else (resp.end_ns - send_end_ns) / 1000,
+    }
+
+
+def _wave_streams(race: str, http_flows: typing.Sequence[http.HTTPFlow], wave: h2.Wave,
+                  responses: typing.Dict[int, h2.StreamResponse], **extra) -> typing.List[RacedStream]:
+    # Only streams whose response is the one in responses are included. Given the final responses of a race, that's
+    # the last attempt of every request, earlier attempts of requeued requests are skipped
+    report = wave.report
+    streams = []
+    for i, sid in zip(wave.request_indices, wave.stream_ids):
+        resp = responses.get(i)
+        if resp is None or resp.stream_id != sid:
+            continue
+        metadata = _stream_metadata(race, i, resp, report.send_end_ns)
+        metadata.update(extra)
+        metadata.update({
+            'wave': wave.index,
+            'attempt': wave.attempt,
+            'connection': wave.connection_index,
+            'arrival_rank': report.arrival_order.index(sid) + 1 if sid in report.arrival_order else None,
+            'send_window_us': report.send_window_ns / 1000,
+            'response_spread_us': None if report.response_spread_ns is None else report.response_spread_ns / 1000,
+        })
+        streams.append(RacedStream(http_flows[i], resp, report.send_start_ns, report.send_end_ns, metadata))
+    return streams
+
+
+def _wall_time(perf_ns: typing.Optional[int]) -> typing.Optional[float]:
+    # mitmproxy timestamps are time.time() seconds
+    return None if perf_ns is None else time.time() - (time.perf_counter_ns() - perf_ns) / 1e9
+
+
+def _stream_error(resp: h2.StreamResponse) -> typing.Optional[str]:
+    if resp.close_reason is h2.CloseReason.ENDED:
+        return None
+    if resp.close_reason is h2.CloseReason.RESET:
+        return 'stream {} was reset by the server with error code {}'.format(resp.stream_id, resp.reset_error)
+    if resp.close_reason is h2.CloseReason.GOAWAY:
+        return 'stream {} was not processed, the server sent GOAWAY'.format(resp.stream_id)
+    if resp.close_reason is h2.CloseReason.CONNECTION_LOST:
+        return 'connection was lost before stream {} was closed'.format(resp.stream_id)
+    return 'stream {} did not complete in time'.format(resp.stream_id)
+
+
+def _raced_flow(stream: RacedStream) -> http.HTTPFlow:
+    # Duplicate of the source flow with the send time of the race and the response of the raced stream
+    dup = stream.source.copy()
+    dup.is_replay = 'request'
+    dup.metadata['race_replay'] = stream.metadata
+    dup.request.timestamp_start = _wall_time(stream.send_start_ns)
+    dup.request.timestamp_end = _wall_time(stream.send_end_ns)
+    resp = stream.response
+    if resp.status is not None:
+        dup.response = http.Response.make(resp.status, bytes(resp.body),
+                                          [(name.encode(), value.encode()) for name, value in resp.headers
+                                           if not name.startswith(':')])
+        dup.response.http_version = 'HTTP/2.0'
+        dup.response.timestamp_start = _wall_time(resp.headers_ns)
+        dup.response.timestamp_end = _wall_time(resp.end_ns)
+        if resp.trailers:
+            dup.response.trailers = http.Headers([(name.encode(), value.encode()) for name, value in resp.trailers])
+    else:
+        dup.response = None
+    error = _stream_error(resp)
+    dup.error = flow.Error(error) if error is not None else None
+    return dup
+
 
 class RaceReplay:
     #WIP, but the goal here is to take a sequence of compatible flows and string them all together into
     #a single-packet attack. This will allow building of the attack using the mitmproxy UI.
     #intended use is to run on @marked
+    #The commands return right away: races run one at a time in a worker thread, and every raced stream is added
+    #to the flow list as a copy of its source flow with the response attached, as soon as its wave is done.
+    #Race details and timing are in the flow metadata under race_replay
+    def __init__(self):
+        # Set-up connections are kept between runs so that repeated races skip the handshakes
+        self.pool = h2.H2ConnectionPool(this_logger)
+        # Connections aren't thread-safe, so all races share one worker
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='race_replay')
+        self.tasks = set()  # type: typing.Set[asyncio.Task]
+        self.num_races = 0
+
+    def done(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.pool.close_all()
+
     @command.command("race_replay")
     def race_replay(self, flows: collections.abc.Sequence[flow.Flow]) -> None:
-        if len(flows) > 0:
-            conn = h2.H2TLSConnection(this_logger)
-            request_naught = flows[0].request
-            this_url = flows[0].request.url
-            logging.info(f"[RaceReplay] Connecting to: {request_naught.host}")
-            conn.setup( request_naught.host )
-            logging.info(f"[RaceReplay] Established connection with: {request_naught.host}")
-
-            # We gather the final DATA frames here
-            final_frames = []
-            flow_index = 0
-
-            # Generate 10 valid client stream IDs
-            for i in h2.gen_stream_ids(len(flows)):
-                this_flow = flows[flow_index]
-                flow_index = flow_index + 1
-                if isinstance(this_flow, http.HTTPFlow):
-                    body_data = this_flow.request.content
-                    
-                    #withold the last byte of content data
-                    req = conn.create_request_frames(this_flow.request.method, this_flow.request.path , i, headers=this_flow.request.headers,body=body_data[:-1])
-
-                    # Remove END_STREAM flag from any frames that have it set:
-                    for frame in req.frames:
-                        if 'ES' in frame.flags:
-                            frame.flags.remove('ES')
-                    # Send the request frames
-                    conn.send_frames(req)
-                    # Create the final DATA frame using scapy and store it
-                    final_frames.append(scapy.H2Frame(flags={'ES'}, stream_id=i) / scapy.H2DataFrame(data=body_data[-1]))
-
-            # Sleep a little to make sure previous frames have been delivered
-            time.sleep(0.1)
-            # Send the final frames to complete the requests
-            conn.send_frames(*final_frames)
-
-            # Remain listening on the connection
-            conn.infinite_read_loop()
+        http_flows = [f for f in flows if isinstance(f, http.HTTPFlow)]
+        if len(http_flows) > 0:
+            request_naught = http_flows[0].request
+            requests = _requests(http_flows)
+            race_name = self._race_name('race_replay', len(requests), request_naught.host)
+
+            def work(publish: Publish):
+                logging.info(f"[RaceReplay] Connecting to: {request_naught.host}")
+                conn = self.pool.acquire(request_naught.host, request_naught.port)
+                logging.info(f"[RaceReplay] Established connection with: {request_naught.host}")
+
+                # Race the requests in waves that fit the server's SETTINGS_MAX_CONCURRENT_STREAMS, a single wave
+                # unless there are more flows than the server accepts at once. In every wave the last byte of
+                # content data of each request is withheld, bodies are streamed in frames sized to the server's
+                # limits and flow-control windows, and the final frames are packed into as few TCP segments as
+                # possible, sent as soon as the server has acked a PING sent after the previous frames, i.e. once
+                # it has received them. All requests are encoded with one shared HPACK context, repeated headers
+                # become table references. Requests the server refuses or cuts off with GOAWAY are raced once more
+                # in a wave of their own, on a new connection if needed
+                race = h2.WaveRace(this_logger, conn, reconnect=self.pool.replace)
+
+                def publish_wave(wave: h2.Wave, responses: typing.Dict[int, h2.StreamResponse]):
+                    # Requests the server didn't process may still be requeued, only their last attempt is
+                    # published once the race is done, like in race_replay_rounds
+                    publish([stream for stream in _wave_streams(race_name, http_flows, wave, responses)
+                              if not stream.response.is_unprocessed])
+
+                try:
+                    result = race.run(requests, max_requeues=1, on_wave=publish_wave)
+                except Exception:
+                    # Don't keep a connection that was left in an unknown state
+                    race.conn.close()
+                    raise
+                finally:
+                    # Keep the connection for the next run, it's health-checked before reuse
+                    self.pool.release(race.conn)
+                publish([stream for wave in result.waves
+                         for stream in _wave_streams(race_name, http_flows, wave, result.responses)
+                         if stream.response.is_unprocessed])
+                for i, this_flow in enumerate(http_flows):
+                    logging.info(f"[RaceReplay] {this_flow.request.method} {this_flow.request.path}: "
+                                 f"{result.responses.get(i, 'not sent')}")
+                logging.info(f"[RaceReplay] Skew report per wave:\n{result.describe()}")
+
+            self._submit(race_name, work)
+
+    #Same as race_replay, but the flows are split into groups raced on separate connections at the same time.
+    #Use when the race needs more requests than the server allows concurrent streams on one connection
+    @command.command("race_replay_fanout")
+    def race_replay_fanout(self, flows: collections.abc.Sequence[flow.Flow], connections: int) -> None:
+        http_flows = [f for f in flows if isinstance(f, http.HTTPFlow)]
+        if len(http_flows) > 0:
+            request_naught = http_flows[0].request
+            requests = _requests(http_flows)
+            race_name = self._race_name('race_replay_fanout', len(requests), request_naught.host)
+
+            def work(publish: Publish):
+                logging.info(f"[RaceReplay] Connecting {connections} times to: {request_naught.host}")
+                race = h2.FanoutRace.open(this_logger, self.pool, connections, request_naught.host,
+                                          request_naught.port)
+                try:
+                    result = race.run(requests)
+                finally:
+                    race.release(self.pool)
+                send_start_ns = min(t.send_start_ns for t in result.triggers)
+                send_end_ns = max(t.send_end_ns for t in result.triggers)
+                streams = []
+                for i, resp in result.responses.items():
+                    metadata = _stream_metadata(race_name, i, resp, send_end_ns)
+                    metadata['trigger_skew_us'] = result.trigger_skew_ns / 1000
+                    metadata['send_window_us'] = result.send_window_ns / 1000
+                    streams.append(RacedStream(http_flows[i], resp, send_start_ns, send_end_ns, metadata))
+                publish(streams)
+                for i, this_flow in enumerate(http_flows):
+                    logging.info(f"[RaceReplay] {this_flow.request.method} {this_flow.request.path}: "
+                                 f"{result.responses[i]}")
+
+            self._submit(race_name, work)
+
+    #Same as race_replay, repeated for the given number of rounds on one long-lived connection. The connection is
+    #replaced between rounds when the server sends GOAWAY or the stream IDs run out
+    @command.command("race_replay_rounds")
+    def race_replay_rounds(self, flows: collections.abc.Sequence[flow.Flow], rounds: int) -> None:
+        http_flows = [f for f in flows if isinstance(f, http.HTTPFlow)]
+        if len(http_flows) > 0:
+            request_naught = http_flows[0].request
+            requests = _requests(http_flows)
+            race_name = self._race_name('race_replay_rounds', len(requests), request_naught.host)
+
+            def publish_round(publish: Publish, rnd: h2.RoundResult):
+                publish([stream for wave in rnd.race.waves
+                         for stream in _wave_streams(race_name, http_flows, wave, rnd.race.responses,
+                                                     round=rnd.index)])
+
+            def work(publish: Publish):
+                logging.info(f"[RaceReplay] Running {rounds} rounds against: {request_naught.host}")
+                race = h2.MultiRoundRace.from_pool(this_logger, self.pool, request_naught.host, request_naught.port)
+                try:
+                    result = race.run(rounds, requests, max_requeues=1,
+                                      on_round=lambda rnd: publish_round(publish, rnd))
+                finally:
+                    race.close()
+                for rnd in result.rounds:
+                    for i, this_flow in enumerate(http_flows):
+                        logging.info(f"[RaceReplay] round {rnd.index} {this_flow.request.method} "
+                                     f"{this_flow.request.path}: {rnd.race.responses.get(i, 'not sent')}")
+                logging.info(f"[RaceReplay] Round summary:\n{result.describe()}")
+
+            self._submit(race_name, work)
+
+    def _race_name(self, command_name: str, num_requests: int, host: str) -> str:
+        self.num_races += 1
+        return f"{command_name} #{self.num_races} ({num_requests} requests to {host})"
+
+    def _submit(self, race_name: str, work: typing.Callable[[Publish], None]):
+        # Commands are called on mitmproxy's event loop: the race runs in the worker and hands its streams back
+        # to the loop, where their flows are added to the view
+        loop = asyncio.get_running_loop()
+
+        def publish(streams: typing.List[RacedStream]):
+            loop.call_soon_threadsafe(self._add_flows, streams)
+
+        logging.log(ALERT, f"[RaceReplay] {race_name} started")
+        task = loop.create_task(self._await_race(race_name, loop.run_in_executor(self.executor, work, publish)))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _await_race(self, race_name: str, future: asyncio.Future):
+        try:
+            await future
+        except Exception as e:
+            logging.exception(f"[RaceReplay] {race_name} failed")
+            logging.log(ALERT, f"[RaceReplay] {race_name} failed: {e}")
+        else:
+            logging.log(ALERT, f"[RaceReplay] {race_name} finished")
+
+    def _add_flows(self, streams: typing.List[RacedStream]):
+        if streams:
+            ctx.master.commands.call("view.flows.add", [_raced_flow(stream) for stream in streams])
 
 addons = [RaceReplay()]
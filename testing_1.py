@@ -20,7 +20,7 @@ test_headers = ((bytes("user-agent",'utf-8'), bytes("Mozilla/5.0 (X11; Linux x86
                 (bytes("upgrade-insecure-requests",'utf-8'), bytes("1",'utf-8')))
 
 # Generate 10 valid client stream IDs
-for i in h2.gen_stream_ids(10):
+for i in conn.reserve_stream_ids(10):
 
     # Create request frames for POST /race
     req = conn.create_request_frames('GET', '/about/', i, test_headers)
@@ -31,8 +31,8 @@ for i in h2.gen_stream_ids(10):
     # Create the final DATA frame using scapy and store it
     final_frames.append(scapy.H2Frame(flags={'ES'}, stream_id=i) / scapy.H2DataFrame())
 
-# Sleep a little to make sure previous frames have been delivered
-time.sleep(5)
+# Wait until the server acks a PING sent after the previous frames, i.e. until it has received them
+conn.await_delivery()
 # Send the final frames to complete the requests
 conn.send_frames(*final_frames)
 
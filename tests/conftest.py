@@ -0,0 +1,52 @@
+import logging
+import socket
+import typing as T
+
+import pytest
+
+from h2tinker.h2_plain_connection import H2PlainConnection
+
+
+def make_conn_pair() -> T.Tuple[H2PlainConnection, socket.socket]:
+    """
+    Create a set-up plain connection whose socket is one end of a socket pair, and the other end standing in for
+    the server. The handshake is skipped, so the connection starts with the default settings of the server.
+    """
+    client_sock, server_sock = socket.socketpair()
+    conn = H2PlainConnection(logging.getLogger('h2tinker.tests'))
+    conn.host = 'example.com'
+    conn.port = 80
+    conn.sock = client_sock
+    conn.is_setup_completed = True
+    server_sock.settimeout(5.0)
+    return conn, server_sock
+
+
+@pytest.fixture
+def conn_pair():
+    """
+    A connection and its server socket, see make_conn_pair.
+    """
+    conn, server_sock = make_conn_pair()
+    yield conn, server_sock
+    conn.close()
+    server_sock.close()
+
+
+def recv_all(sock: socket.socket) -> bytes:
+    """
+    Read whatever the connection has sent so far.
+    """
+    chunks = []
+    sock.setblocking(False)
+    try:
+        while True:
+            chunk = sock.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    except BlockingIOError:
+        pass
+    finally:
+        sock.settimeout(5.0)
+    return b''.join(chunks)
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import socket
+import threading
+import typing as T
+
+import pytest
+import scapy.contrib.http2 as h2
+
+from h2tinker.async_connection import AsyncH2Connection
+from h2tinker.decoder import H2FrameDecoder
+from h2tinker.h2_connection import H2Connection
+from h2tinker.hpack import HPackEncoder
+from h2tinker.resolver import ResolverCache
+from h2tinker.serializer import FrameWriter
+
+
+def test_passes_connection_arguments_through():
+    resolver = ResolverCache()
+    conn = AsyncH2Connection(logging.getLogger('h2tinker.tests'), resolver=resolver, send_buffer_size=1 << 20,
+                             attempt_delay=0.1)
+    assert conn.resolver is resolver
+    assert conn.send_buffer_size == 1 << 20
+    assert conn.attempt_delay == 0.1
+
+
+@pytest.mark.parametrize('call', [
+    lambda conn: conn.collect_responses([1]),
+    lambda conn: conn.send_streaming_requests([]),
+    lambda conn: conn.await_delivery(),
+    lambda conn: conn.settle(),
+])
+def test_blocking_methods_are_not_available(call):
+    conn = AsyncH2Connection(logging.getLogger('h2tinker.tests'))
+    with pytest.raises(AssertionError, match='not available on AsyncH2Connection'):
+        call(conn)
+
+
+def _serve_two_responses(listener: socket.socket, blocks: T.List[bytes]):
+    # Stand-in h2c server: settle the settings, then answer the client's PING with a response on streams 1 and 3,
+    # the first header block split in the middle of a field
+    sock, _ = listener.accept()
+    with sock:
+        sock.settimeout(5.0)
+        sock.sendall(FrameWriter().settings().settings(is_ack=True).getvalue())
+        decoder = H2FrameDecoder()
+        data = sock.recv(len(H2Connection.PREFACE))
+        while len(data) < len(H2Connection.PREFACE):
+            data += sock.recv(len(H2Connection.PREFACE) - len(data))
+        ping = None
+        while ping is None:
+            for f in decoder.feed_views(sock.recv(1 << 16)):
+                if f.type == h2.H2PingFrame.type_id:
+                    ping = bytes(f.raw_payload)
+        writer = FrameWriter()
+        writer.headers(1, blocks[0][:5], end_stream=True, end_headers=False).continuation(1, blocks[0][5:])
+        writer.headers(3, blocks[1], end_stream=True)
+        writer.ping(ping, is_ack=True)
+        sock.sendall(writer.getvalue())
+        sock.recv(1 << 16)
+
+
+def test_decodes_header_blocks_in_arrival_order():
+    encoder = HPackEncoder()
+    headers = [(':status', '200'), ('x-race-id', 'wave-1')]
+    blocks = [b''.join(bytes(h) for h in encoder.encode_headers(headers)) for _ in range(2)]
+    # The second block only refers to the dynamic table entry the first one added
+    assert any(isinstance(h, h2.HPackIndexedHdr) and h.index > 61 for h in h2.H2ContinuationFrame(blocks[1]).hdrs)
+
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    server = threading.Thread(target=_serve_two_responses, args=(listener, blocks), daemon=True)
+    server.start()
+
+    async def run():
+        conn = AsyncH2Connection(logging.getLogger('h2tinker.tests'))
+        await conn.setup('127.0.0.1', listener.getsockname()[1], use_tls=False, timeout=5)
+        try:
+            queues = [conn.subscribe(1), conn.subscribe(3)]
+            assert await conn.ping(timeout=5)
+            return [[queue.get_nowait() for _ in range(queue.qsize())] for queue in queues]
+        finally:
+            await conn.close()
+
+    try:
+        first, second = asyncio.run(run())
+    finally:
+        server.join(5)
+        listener.close()
+    assert [f.type for f in first] == [h2.H2HeadersFrame.type_id, h2.H2ContinuationFrame.type_id]
+    assert first[0].headers is None
+    assert first[1].headers == headers
+    assert second[0].headers == headers
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+
+from h2tinker.body import BodyReader
+
+
+def _read_all(reader: BodyReader, n: int) -> bytes:
+    chunks = []
+    while not reader.done:
+        chunks.append(bytes(reader.read(n)))
+    return b''.join(chunks)
+
+
+@pytest.mark.parametrize('source', [
+    b'0123456789',
+    bytearray(b'0123456789'),
+    io.BytesIO(b'0123456789'),
+    [b'012', b'', b'3456', b'789'],
+    (chunk for chunk in [b'0', b'123456789']),
+])
+def test_sources(source):
+    assert _read_all(BodyReader(source, read_size=4), 3) == b'0123456789'
+
+
+@pytest.mark.parametrize('source', [
+    b'0123456789',
+    [b'01234', b'56789'],
+    [b'012345678', b'9'],
+    io.BytesIO(b'0123456789'),
+])
+def test_withhold_last_byte(source):
+    reader = BodyReader(source, withhold_last_byte=True, read_size=4)
+    assert _read_all(reader, 4) == b'012345678'
+    assert reader.withheld == b'9'
+    assert reader.bytes_read == 9
+    assert not reader.is_empty
+
+
+def test_bytes_are_not_copied():
+    body = b'0123456789'
+    chunk = BodyReader(body).read(4)
+    assert isinstance(chunk, memoryview)
+    assert chunk.obj is body
+
+
+@pytest.mark.parametrize('source', [None, b'', [], [b'', b'']])
+def test_empty(source):
+    reader = BodyReader(source, withhold_last_byte=True)
+    assert reader.is_empty
+    assert reader.done
+    assert reader.withheld == b''
+
+
+def test_single_byte_is_withheld_right_away():
+    reader = BodyReader(b'x', withhold_last_byte=True)
+    assert reader.done
+    assert reader.withheld == b'x'
+    assert not reader.is_empty
@@ -0,0 +1,123 @@
+import logging
+import socket
+
+import pytest
+
+from h2tinker.burst import PreparedBurst, SegmentMode, TLS_MAX_RECORD_PLAINTEXT, TLS_RECORD_OVERHEAD, pack_segments
+from h2tinker.decoder import H2FrameDecoder
+from h2tinker.h2_plain_connection import H2PlainConnection
+from h2tinker.serializer import FrameWriter
+
+
+def _frames(*payload_sizes: int) -> bytes:
+    writer = FrameWriter()
+    for i, size in enumerate(payload_sizes):
+        writer.data(2 * i + 1, b'x' * size, end_stream=True)
+    return writer.getvalue()
+
+
+def _assert_whole_frames(chunks, data: bytes):
+    # Every chunk holds whole frames only, and together they cover the data in order
+    assert b''.join(chunks) == data
+    for chunk in chunks:
+        decoder = H2FrameDecoder()
+        assert decoder.feed_raw(bytes(chunk))
+        assert not decoder.has_pending_data()
+
+
+@pytest.mark.parametrize('capacity, chunk_sizes', [
+    (100, [100, 100, 50]),
+    (99, [50, 50, 50, 50, 50]),
+    (150, [150, 100]),
+    (1000, [250]),
+])
+def test_pack_segments_at_frame_boundaries(capacity, chunk_sizes):
+    data = _frames(41, 41, 41, 41, 41)
+    chunks = pack_segments(data, capacity)
+    assert [len(c) for c in chunks] == chunk_sizes
+    _assert_whole_frames(chunks, data)
+
+
+def test_pack_segments_oversized_frame():
+    data = _frames(10, 200, 10, 10)
+    chunks = pack_segments(data, 50)
+    assert [len(c) for c in chunks] == [19, 209, 38]
+    _assert_whole_frames(chunks, data)
+
+
+def test_segment_capacity_subtracts_tls_overhead():
+    data = _frames(*[41] * 30)
+    plain = PreparedBurst(data, 30, 1460, False, SegmentMode.NODELAY)
+    tls = PreparedBurst(data, 30, 1460, True, SegmentMode.NODELAY)
+    assert plain.segment_capacity == 1460
+    assert tls.segment_capacity == 1460 - TLS_RECORD_OVERHEAD
+    # 29 frames of 50 bytes fit 1460 bytes, only 28 leave room for the record overhead
+    assert [len(s) for s in plain.segments] == [1450, 50]
+    assert [len(s) for s in tls.segments] == [1400, 100]
+    assert (plain.num_records, plain.wire_size, plain.num_segments) == (0, 1500, 2)
+    assert (tls.num_records, tls.wire_size, tls.num_segments) == (2, 1500 + 2 * TLS_RECORD_OVERHEAD, 2)
+    # Large MSS, e.g. on loopback, are limited by the maximum TLS record size
+    assert PreparedBurst(data, 30, 65_483, True, SegmentMode.NODELAY).segment_capacity == TLS_MAX_RECORD_PLAINTEXT
+
+
+@pytest.mark.parametrize('mode', [SegmentMode.DEFAULT, SegmentMode.CORK])
+def test_single_write_modes(mode):
+    data = _frames(*[41] * 30)
+    burst = PreparedBurst(data, 30, 1460, False, mode)
+    assert [bytes(s) for s in burst.segments] == [data]
+    # One write still needs as many segments as the wire size takes
+    assert burst.num_segments == 2
+    assert burst.fits_single_segment is False
+
+
+def test_unknown_mss():
+    burst = PreparedBurst(_frames(41, 41), 2, None, True, SegmentMode.NODELAY)
+    assert len(burst.segments) == 1
+    assert burst.num_segments is None
+    assert burst.fits_single_segment is None
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        data += sock.recv(size - len(data))
+    return data
+
+
+@pytest.fixture
+def tcp_conn():
+    """
+    A set-up plain connection over loopback TCP, so that TCP options can be set, and the server's socket.
+    """
+    with socket.create_server(('127.0.0.1', 0)) as listener:
+        client_sock = socket.create_connection(listener.getsockname())
+        server_sock, _ = listener.accept()
+    conn = H2PlainConnection(logging.getLogger('h2tinker.tests'), tcp_nodelay=False)
+    conn.host = '127.0.0.1'
+    conn.sock = client_sock
+    conn.is_setup_completed = True
+    server_sock.settimeout(5.0)
+    yield conn, server_sock
+    conn.close()
+    server_sock.close()
+
+
+def test_send_burst_nodelay_writes_each_segment(tcp_conn):
+    conn, server = tcp_conn
+    data = _frames(41, 41, 41, 41, 41)
+    trace = conn.enable_io_trace()
+    conn.send_burst(PreparedBurst(data, 5, 100, False, SegmentMode.NODELAY))
+    assert [e.num_calls for e in trace.events_since(0, 'send')] == [3]
+    assert conn.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+    assert _recv_exactly(server, len(data)) == data
+
+
+@pytest.mark.skipif(not hasattr(socket, 'TCP_CORK'), reason='TCP_CORK is Linux only')
+def test_send_burst_cork_writes_once_and_uncorks(tcp_conn):
+    conn, server = tcp_conn
+    data = _frames(41, 41, 41, 41, 41)
+    trace = conn.enable_io_trace()
+    conn.send_burst(PreparedBurst(data, 5, 100, False, SegmentMode.CORK))
+    assert [e.num_calls for e in trace.events_since(0, 'send')] == [1]
+    assert conn.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_CORK) == 0
+    assert _recv_exactly(server, len(data)) == data
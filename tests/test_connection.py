@@ -0,0 +1,165 @@
+import threading
+import time
+import typing as T
+
+import pytest
+import scapy.contrib.http2 as h2
+from scapy.compat import raw
+
+from conftest import recv_all
+from h2tinker.decoder import H2FrameDecoder
+from h2tinker.hpack import HPackEncoder
+from h2tinker.response import CloseReason
+from h2tinker.serializer import FrameWriter
+
+
+def _header_block(encoder: HPackEncoder, headers) -> bytes:
+    return b''.join(raw(hdr) for hdr in encoder.encode_headers(headers))
+
+
+def _answer_ping(server, before_ack: FrameWriter):
+    # Read until the PING of the client, then send the given frames followed by its ACK
+    decoder = H2FrameDecoder()
+    while True:
+        for f in decoder.feed_views(server.recv(1 << 16)):
+            if f.type == h2.H2PingFrame.type_id:
+                server.sendall(before_ack.ping(bytes(f.raw_payload), is_ack=True).getvalue())
+                return
+
+
+def test_ping_keeps_stream_frames_for_next_read(conn_pair):
+    conn, server = conn_pair
+    encoder = HPackEncoder()
+    headers = [(':status', '200'), ('x-example', 'value')]
+    frames = FrameWriter().headers(1, _header_block(encoder, headers), end_stream=True)
+    answer = threading.Thread(target=_answer_ping, args=(server, frames))
+    answer.start()
+    assert conn.ping()
+    answer.join()
+
+    # The second header block refers to the dynamic table entries added by the first one
+    server.sendall(FrameWriter().headers(3, _header_block(encoder, headers), end_stream=True).getvalue())
+    responses = conn.collect_responses([1, 3], timeout=5.0)
+    assert responses[1].headers == headers
+    assert responses[3].headers == headers
+
+
+def test_header_table_size_setting_resizes_encoder(conn_pair):
+    conn, server = conn_pair
+    server.sendall(FrameWriter().settings([(h2.H2Setting.SETTINGS_HEADER_TABLE_SIZE, 256)]).getvalue())
+    conn.recv_frames()
+    assert conn.peer_settings.header_table_size == 256
+    frames = conn.create_request_frames('GET', '/', 1)
+    assert isinstance(frames.frames[0].hdrs[0], h2.HPackDynamicSizeUpdate)
+    assert frames.frames[0].hdrs[0].max_size == 256
+
+
+def test_send_raw_charges_send_windows(conn_pair):
+    conn, server = conn_pair
+    conn.send_raw(FrameWriter().data(1, b'x' * 100).data(3, b'y' * 10, end_stream=True).getvalue())
+    assert conn.send_window == conn.DEFAULT_WINDOW_SIZE - 110
+    assert conn.stream_send_windows == {1: conn.peer_settings.initial_window_size - 100}
+
+
+def test_header_block_split_mid_field(conn_pair):
+    conn, server = conn_pair
+    encoder = HPackEncoder()
+    headers = [(':status', '200'), ('x-long-header', 'v' * 40), ('x-example', 'value')]
+    block = _header_block(encoder, headers)
+    writer = FrameWriter().headers(1, block[:3], end_headers=False).continuation(1, block[3:20], end_headers=False)
+    writer.continuation(1, block[20:])
+    # A later block refers to the dynamic table entries the split one added
+    writer.headers(3, _header_block(encoder, headers), end_stream=True)
+    server.sendall(writer.data(1, b'body', end_stream=True).getvalue())
+    responses = conn.collect_responses([1, 3], timeout=5.0)
+    assert responses[1].headers == headers
+    assert responses[1].body == b'body'
+    assert responses[3].headers == headers
+
+
+def test_trailers(conn_pair):
+    conn, server = conn_pair
+    encoder = HPackEncoder()
+    trailers = [('grpc-status', '0'), ('grpc-message', 'done')]
+    block = _header_block(encoder, trailers)
+    writer = FrameWriter().headers(1, _header_block(encoder, [(':status', '200')])).data(1, b'body')
+    writer.headers(1, block[:4], end_stream=True, end_headers=False).continuation(1, block[4:])
+    server.sendall(writer.getvalue())
+    response = conn.collect_responses([1], timeout=5.0)[1]
+    assert response.headers == [(':status', '200')]
+    assert response.trailers == trailers
+    assert response.body == b'body'
+
+
+def test_informational_response_is_replaced(conn_pair):
+    conn, server = conn_pair
+    encoder = HPackEncoder()
+    writer = FrameWriter().headers(1, _header_block(encoder, [(':status', '103'), ('link', '</style.css>')]))
+    final = _header_block(encoder, [(':status', '200'), ('link', '</style.css>')])
+    writer.headers(1, final[:2], end_headers=False).continuation(1, final[2:])
+    server.sendall(writer.data(1, b'body', end_stream=True).getvalue())
+    response = conn.collect_responses([1], timeout=5.0)[1]
+    assert response.status == 200
+    assert response.headers == [(':status', '200'), ('link', '</style.css>')]
+    assert response.trailers == []
+
+
+def test_await_delivery_fails_on_goaway(conn_pair):
+    conn, server = conn_pair
+    server.sendall(FrameWriter().goaway(h2.H2ErrorCodes.ENHANCE_YOUR_CALM, last_stream_id=1).getvalue())
+    start = time.monotonic()
+    with pytest.raises(AssertionError, match='GOAWAY with last stream ID 1 and error code 11'):
+        conn.await_delivery(timeout=5.0)
+    assert time.monotonic() - start < 1.0
+
+
+def test_close_reasons(conn_pair):
+    conn, server = conn_pair
+    writer = FrameWriter().headers(1, _header_block(HPackEncoder(), [(':status', '200')]), end_stream=True)
+    writer.rst_stream(3, h2.H2ErrorCodes.CANCEL).rst_stream(5, h2.H2ErrorCodes.REFUSED_STREAM)
+    server.sendall(writer.goaway(last_stream_id=5).getvalue())
+    responses = conn.collect_responses([1, 3, 5, 7, 9], timeout=5.0)
+    assert [responses[sid].close_reason for sid in (1, 3, 5, 7, 9)] == \
+        [CloseReason.ENDED, CloseReason.RESET, CloseReason.RESET, CloseReason.GOAWAY, CloseReason.GOAWAY]
+    assert responses[3].reset_error == h2.H2ErrorCodes.CANCEL
+    assert responses.unprocessed_stream_ids == [5, 7, 9]
+
+
+def test_close_reason_of_lost_connection(conn_pair):
+    conn, server = conn_pair
+    server.sendall(FrameWriter().headers(1, _header_block(HPackEncoder(), [(':status', '200')])).getvalue())
+    server.close()
+    responses = conn.collect_responses([1, 3], timeout=5.0)
+    assert responses[1].status == 200
+    assert [responses[sid].close_reason for sid in (1, 3)] == [CloseReason.CONNECTION_LOST] * 2
+    assert conn.is_closed
+
+
+def _window_updates(server) -> T.List[T.Tuple[int, int]]:
+    frames = H2FrameDecoder().feed_views(recv_all(server))
+    return [(f.stream_id, f.win_size_incr) for f in frames if f.type == h2.H2WindowUpdateFrame.type_id]
+
+
+def _feed(conn, server, writer: FrameWriter):
+    server.sendall(writer.getvalue())
+    received = 0
+    while received < writer.num_frames:
+        received += len(conn.recv_frames())
+
+
+def test_window_updates_are_batched(conn_pair):
+    conn, server = conn_pair
+    conn.window_update_threshold = 100
+
+    _feed(conn, server, FrameWriter().data(1, b'x' * 60).data(3, b'x' * 30))
+    assert _window_updates(server) == []
+    # Stream 1 and the connection cross the threshold, stream 3 doesn't
+    _feed(conn, server, FrameWriter().data(1, b'x' * 40))
+    assert _window_updates(server) == [(1, 100), (0, 130)]
+    assert conn.unacked_stream_bytes == {1: 0, 3: 30}
+
+    # Ended streams get no update, their DATA still counts for the connection
+    _feed(conn, server, FrameWriter().data(3, b'x' * 80, end_stream=True).data(5, b'x' * 150, end_stream=True))
+    assert _window_updates(server) == [(0, 230)]
+    assert conn.unacked_stream_bytes == {1: 0}
+    assert conn.unacked_conn_bytes == 0
@@ -0,0 +1,51 @@
+import json
+import os
+
+import pytest
+
+from h2tinker.corpus import CompiledCorpus
+from h2tinker.decoder import H2FrameDecoder
+
+RECORDS = [
+    {'method': 'POST', 'path': '/race', 'authority': 'example.com', 'body': 'amount=10'},
+    {'method': 'GET', 'path': '/balance', 'authority': 'example.com', 'headers': [['x-example', 'value']]},
+]
+
+
+@pytest.fixture
+def corpus_file(tmp_path):
+    path = tmp_path / 'corpus.jsonl'
+    path.write_text(''.join(json.dumps(r) + '\n' for r in RECORDS))
+    return str(path)
+
+
+def _load_build_close(corpus_file: str, cache_dir: str):
+    corpus = CompiledCorpus.load(corpus_file, cache_dir)
+    assert len(corpus) == len(RECORDS)
+    prefix = corpus.requests[0].prefix
+    built = corpus.build([1, 3])
+    corpus.close()
+    # Views of the mapping held by the caller are released together with it
+    with pytest.raises(ValueError):
+        bytes(prefix)
+    assert corpus.requests == []
+    return built
+
+
+def test_load_build_close(corpus_file, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    compiled = _load_build_close(corpus_file, cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    # The second load maps the cache file written by the first one
+    assert _load_build_close(corpus_file, cache_dir) == compiled
+
+    prefixes, finals = compiled
+    final_frames = H2FrameDecoder().feed_views(finals)
+    assert [(f.stream_id, f.data, 'ES' in f.flags) for f in final_frames] == [(1, b'0', True), (3, b'', True)]
+    assert {f.stream_id for f in H2FrameDecoder().feed_views(prefixes)} == {1, 3}
+
+
+def test_close_twice(corpus_file, tmp_path):
+    corpus = CompiledCorpus.load(corpus_file, str(tmp_path / 'cache'))
+    corpus.close()
+    corpus.close()
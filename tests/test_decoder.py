@@ -0,0 +1,62 @@
+import pytest
+import scapy.contrib.http2 as h2
+
+from h2tinker.decoder import H2FrameDecoder
+
+FRAMES = b''.join(bytes(f) for f in [
+    h2.H2Frame() / h2.H2SettingsFrame(settings=[h2.H2Setting(id=h2.H2Setting.SETTINGS_MAX_CONCURRENT_STREAMS,
+                                                             value=100)]),
+    h2.H2Frame() / h2.H2PingFrame(b'12345678'),
+    h2.H2Frame(stream_id=1, flags={'ES'}) / h2.H2DataFrame(data=b'x' * 1000),
+    h2.H2Frame() / h2.H2WindowUpdateFrame(win_size_incr=1 << 20),
+])
+FRAME_LENGTHS = [15, 17, 1009, 13]
+
+
+def _split(frames: bytes):
+    # The frames one by one, cut at the lengths of the test frames
+    pos = 0
+    for length in FRAME_LENGTHS:
+        yield frames[pos:pos + length]
+        pos += length
+
+
+def test_whole_chunk():
+    frames = H2FrameDecoder().feed_raw(FRAMES)
+    assert [bytes(buf) for buf in frames] == list(_split(FRAMES))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 9, 10, 100])
+def test_frames_split_across_chunks(chunk_size):
+    decoder = H2FrameDecoder()
+    frames = []
+    for pos in range(0, len(FRAMES), chunk_size):
+        frames.extend(decoder.feed_raw(FRAMES[pos:pos + chunk_size]))
+    assert [bytes(buf) for buf in frames] == list(_split(FRAMES))
+    assert not decoder.has_pending_data()
+
+
+def test_partial_frame_is_pending():
+    decoder = H2FrameDecoder()
+    assert decoder.feed_raw(FRAMES[:20]) == [FRAMES[:15]]
+    assert decoder.has_pending_data()
+
+
+def test_scapy_frames():
+    frames = H2FrameDecoder().feed(FRAMES)
+    assert [f.stream_id for f in frames] == [0, 0, 1, 0]
+    assert isinstance(frames[2].payload, h2.H2DataFrame)
+    assert frames[2].payload.data == b'x' * 1000
+
+
+def test_frame_views():
+    views = H2FrameDecoder().feed_views(FRAMES)
+    assert [(f.type, f.stream_id, f.flags, len(f)) for f in views] == [
+        (h2.H2SettingsFrame.type_id, 0, frozenset(), 15), (h2.H2PingFrame.type_id, 0, frozenset(), 17),
+        (h2.H2DataFrame.type_id, 1, frozenset({'ES'}), 1009), (h2.H2WindowUpdateFrame.type_id, 0, frozenset(), 13)]
+    assert [bytes(f) for f in views] == list(_split(FRAMES))
+
+
+def test_oversized_frame_is_rejected():
+    with pytest.raises(AssertionError, match='exceeding maximum frame size'):
+        H2FrameDecoder(max_frame_size=100).feed_raw(FRAMES)
@@ -0,0 +1,66 @@
+import pytest
+import scapy.contrib.http2 as h2
+
+from h2tinker.dependency import DependencyPlan, DependencyResult, DependencyTree
+from h2tinker.request import H2Request
+from h2tinker.response import CloseReason, ResponseSet
+from h2tinker.serializer import FrameWriter
+
+
+def _request(path: str) -> H2Request:
+    return H2Request('GET', path, 0)
+
+
+def test_diamond(conn_pair):
+    conn, _ = conn_pair
+    tree = DependencyTree()
+    tree.add('d', _request('/d'), depends_on=['b', 'c'])
+    tree.add('c', _request('/c'), depends_on=['a'], weight=32)
+    tree.add('b', _request('/b'), depends_on=['a'])
+    tree.add_group('a')
+    order, parents = tree._resolve()
+    assert order == ['a', 'c', 'b', 'd']
+    # b and c are equally deep, the last listed dependency becomes the parent
+    assert parents == {'a': None, 'b': 'a', 'c': 'a', 'd': 'c'}
+
+    plan = tree.build(conn)
+    assert plan.stream_ids == {'a': 1, 'c': 3, 'b': 5, 'd': 7}
+    group = plan.frames[0]
+    assert isinstance(group.payload, h2.H2PriorityFrame)
+    assert (group.stream_id, group.stream_dependency) == (1, 0)
+    deps = {seq.frames[0].stream_id: (seq.frames[0].stream_dependency, seq.frames[0].weight)
+            for seq in plan.frames[1:]}
+    assert deps == {3: (1, 31), 5: (1, 15), 7: (3, 15)}
+
+
+def test_cycle_is_rejected():
+    tree = DependencyTree()
+    tree.add('root', _request('/'))
+    tree.add('a', _request('/a'), depends_on=['root', 'c'])
+    tree.add('b', _request('/b'), depends_on=['a'])
+    tree.add('c', _request('/c'), depends_on=['b'])
+    with pytest.raises(AssertionError, match=r"Dependency cycle between nodes \['a', 'b', 'c'\]"):
+        tree._resolve()
+
+
+def test_unknown_dependency_is_rejected():
+    tree = DependencyTree().add('a', _request('/a'), depends_on=['missing'])
+    with pytest.raises(AssertionError, match='depends on unknown node missing'):
+        tree._resolve()
+
+
+def test_order_violations():
+    # a <- b <- c, b completes before a and c never completes
+    plan = DependencyPlan({'a': 1, 'b': 3, 'c': 5, 'd': 7}, {'a': None, 'b': 'a', 'c': 'b', 'd': 'a'}, [],
+                          FrameWriter())
+    responses = ResponseSet([1, 3, 5, 7], 0)
+    responses[1].close(CloseReason.ENDED, 300)
+    responses[3].close(CloseReason.ENDED, 200)
+    responses[7].close(CloseReason.ENDED, 400)
+    result = DependencyResult(plan, responses)
+    assert result.completion_order() == ['b', 'a', 'd']
+    assert result.order_violations() == [('a', 'b')]
+
+    # Completing before both of its ancestors breaks the order with each of them
+    responses[5].close(CloseReason.ENDED, 100)
+    assert result.order_violations() == [('a', 'b'), ('b', 'c'), ('a', 'c')]
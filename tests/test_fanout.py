@@ -0,0 +1,27 @@
+import logging
+import types
+
+import pytest
+
+from h2tinker.fanout import FanoutRace
+from h2tinker.settings import PeerSettings
+
+
+def _race(*limits):
+    conns = [types.SimpleNamespace(peer_settings=PeerSettings(max_concurrent_streams=limit)) for limit in limits]
+    return FanoutRace(logging.getLogger('h2tinker.tests'), conns)
+
+
+def test_groups_are_even_without_limits():
+    assert _race(None, None, None)._group_sizes(10) == [4, 3, 3]
+    assert _race(None, None, None)._group_sizes(2) == [1, 1, 0]
+
+
+def test_groups_respect_concurrent_stream_limits():
+    assert _race(2, None, 100)._group_sizes(10) == [2, 4, 4]
+    assert _race(4, 4, 4)._group_sizes(12) == [4, 4, 4]
+
+
+def test_too_many_requests_for_the_limits():
+    with pytest.raises(AssertionError, match='allow 8 concurrent streams'):
+        _race(4, 4)._group_sizes(9)
@@ -0,0 +1,80 @@
+import scapy.contrib.http2 as h2
+from scapy.compat import raw
+
+from h2tinker.hpack import HPackDecoder, HPackEncoder
+
+HEADERS = [(':method', 'GET'), (':path', '/'), ('user-agent', 'h2tinker'), ('x-example', 'x' * 100)]
+
+
+def _transfer(hpack_hdrs):
+    # Serialize header representations and dissect them again, as the peer would
+    frame = h2.H2Frame(flags={'EH'}, stream_id=1) / h2.H2HeadersFrame(hdrs=hpack_hdrs)
+    return h2.H2Frame(raw(frame)).hdrs
+
+
+def _peer_decode(table: h2.HPackHdrTable, hpack_hdrs):
+    # scapy's own HPACK table stands in for the peer's decoder, pseudo-headers are printed without a colon
+    lines = table.gen_txt_repr(_transfer(hpack_hdrs)).split('\n')
+    return [tuple(line.split(' ', 1)) if line.startswith(':') else tuple(line.split(': ', 1)) for line in lines]
+
+
+def test_round_trip_with_shared_context():
+    encoder = HPackEncoder()
+    peer = h2.HPackHdrTable()
+    first = encoder.encode_headers(HEADERS)
+    second = encoder.encode_headers(HEADERS)
+    assert _peer_decode(peer, first) == HEADERS
+    assert _peer_decode(peer, second) == HEADERS
+    # Repeated headers become references to the dynamic table
+    assert all(isinstance(hdr, h2.HPackIndexedHdr) for hdr in second)
+    assert len(b''.join(raw(hdr) for hdr in second)) == len(HEADERS)
+    assert len(b''.join(raw(hdr) for hdr in first)) > len(HEADERS)
+
+
+def test_never_indexed_headers_are_not_added_to_the_table():
+    encoder = HPackEncoder(never_index={'cookie'})
+    peer = h2.HPackHdrTable()
+    headers = [('cookie', 'secret'), ('x-example', 'value')]
+    assert _peer_decode(peer, encoder.encode_headers(headers)) == headers
+    hpack_hdrs = encoder.encode_headers(headers)
+    assert isinstance(hpack_hdrs[0], h2.HPackLitHdrFldWithoutIndexing)
+    assert isinstance(hpack_hdrs[1], h2.HPackIndexedHdr)
+    assert _peer_decode(peer, hpack_hdrs) == headers
+
+
+def test_encode_request_splits_header_block():
+    encoder = HPackEncoder()
+    peer = h2.HPackHdrTable()
+    headers = [('x-header-{}'.format(i), 'v' * 50) for i in range(10)]
+    seq = encoder.encode_request('POST', '/path', 'example.com', 3, headers, body=b'body', max_frame_size=200)
+    types = [type(f.payload) for f in seq.frames]
+    assert types[0] is h2.H2HeadersFrame and types[-1] is h2.H2DataFrame
+    assert h2.H2ContinuationFrame in types
+    assert 'EH' in seq.frames[-2].flags and 'ES' in seq.frames[-1].flags
+    decoded = []
+    for f in h2.H2Seq(raw(seq)).frames[:-1]:
+        decoded.extend(_peer_decode(peer, f.hdrs))
+    assert decoded == [(':method', 'POST'), (':path', '/path'), (':scheme', 'http'),
+                       (':authority', 'example.com')] + headers
+
+
+def test_resize_is_signalled_in_next_header_block():
+    encoder = HPackEncoder()
+    decoder = HPackDecoder()
+    assert decoder.decode_headers(_transfer(encoder.encode_headers(HEADERS))) == HEADERS
+
+    encoder.resize(0)
+    encoder.resize(64)
+    hpack_hdrs = encoder.encode_headers(HEADERS)
+    assert [hdr.max_size for hdr in hpack_hdrs[:2]] == [0, 64]
+    assert not isinstance(hpack_hdrs[2], h2.HPackDynamicSizeUpdate)
+    assert decoder.decode_headers(_transfer(hpack_hdrs)) == HEADERS
+    assert decoder.table._dynamic_table_max_size == 64
+    # Only the first block after the change carries the update
+    assert not any(isinstance(hdr, h2.HPackDynamicSizeUpdate) for hdr in encoder.encode_headers(HEADERS))
+
+
+def test_resize_to_same_size_is_not_signalled():
+    encoder = HPackEncoder()
+    encoder.resize(4096)
+    assert not any(isinstance(hdr, h2.HPackDynamicSizeUpdate) for hdr in encoder.encode_headers(HEADERS))
@@ -0,0 +1,54 @@
+import errno
+import socket
+import time
+
+import pytest
+
+from h2tinker.resolver import happy_eyeballs_connect, interleave_families
+
+
+def _info(family: int, address: str, port: int = 443):
+    sockaddr = (address, port) if family == socket.AF_INET else (address, port, 0, 0)
+    return family, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', sockaddr
+
+
+def test_interleave_families_alternates():
+    v6 = [_info(socket.AF_INET6, '2001:db8::{}'.format(i)) for i in range(1, 4)]
+    v4 = [_info(socket.AF_INET, '192.0.2.{}'.format(i)) for i in range(1, 3)]
+    assert interleave_families(v6 + v4) == [v6[0], v4[0], v6[1], v4[1], v6[2]]
+    # The family of the first address goes first, the order within a family is kept
+    assert interleave_families([v4[0], v6[0], v6[1], v4[1]]) == [v4[0], v6[0], v4[1], v6[1]]
+    assert interleave_families(v4) == v4
+    assert interleave_families([]) == []
+
+
+def _refused_info():
+    # A loopback port nobody listens on
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return _info(socket.AF_INET, '127.0.0.1', port)
+
+
+def test_happy_eyeballs_moves_on_after_refused_address():
+    with socket.create_server(('127.0.0.1', 0)) as listener:
+        listening = _info(socket.AF_INET, '127.0.0.1', listener.getsockname()[1])
+        configured = []
+        start = time.monotonic()
+        # The refused attempt starts the next one right away instead of after the attempt delay
+        sock, info = happy_eyeballs_connect([_refused_info(), listening], timeout=5.0, attempt_delay=5.0,
+                                            configure=configured.append)
+        with sock:
+            assert time.monotonic() - start < 1.0
+            assert info == listening
+            assert sock.getpeername() == listening[4]
+            assert sock.gettimeout() == 5.0
+            assert len(configured) == 2 and configured[-1] is sock
+            server_sock, _ = listener.accept()
+            server_sock.close()
+
+
+def test_happy_eyeballs_all_refused():
+    with pytest.raises(OSError) as exc_info:
+        happy_eyeballs_connect([_refused_info(), _refused_info()], timeout=5.0)
+    assert exc_info.value.errno == errno.ECONNREFUSED
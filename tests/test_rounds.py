@@ -0,0 +1,42 @@
+import logging
+import types
+
+from h2tinker.rounds import MultiRoundRace
+from h2tinker.stream_ids import StreamIdAllocator
+
+
+class _Pool:
+    # Records what a multi-round race does with its connections
+    def __init__(self):
+        self.released = []
+        self.replaced = []
+        self.created = 0
+
+    def connect(self):
+        self.created += 1
+        return types.SimpleNamespace(is_reusable=True, stream_ids=StreamIdAllocator(), next_stream_id=1,
+                                     index=self.created)
+
+    def replace(self, conn):
+        self.replaced.append(conn)
+        return self.connect()
+
+
+def test_rotation_retires_the_connection_instead_of_releasing_it():
+    pool = _Pool()
+    race = MultiRoundRace(logging.getLogger('h2tinker.tests'), pool.connect, pool.released.append, pool.replace)
+    first = race._connection_for(10)
+    assert race._connection_for(10) is first
+
+    first.is_reusable = False
+    second = race._connection_for(10)
+    assert second is not first
+    assert pool.replaced == [first]
+    assert pool.released == []
+    assert race.connection_index == 1
+
+    # WaveRace replaces the connection through the same path
+    third = race._replace(second)
+    assert pool.replaced == [first, second]
+    race.close()
+    assert pool.released == [third]
@@ -0,0 +1,41 @@
+from h2tinker.rtt import RttEstimator
+
+
+def test_first_sample():
+    rtt = RttEstimator()
+    assert rtt.rto_ns is None
+    rtt.add_sample(1000)
+    assert rtt.srtt_ns == 1000
+    assert rtt.rttvar_ns == 500
+    assert rtt.rto_ns == 3000
+
+
+def test_smoothing():
+    rtt = RttEstimator()
+    rtt.add_sample(1000)
+    rtt.add_sample(2000)
+    assert rtt.rttvar_ns == 0.75 * 500 + 0.25 * 1000
+    assert rtt.srtt_ns == 0.875 * 1000 + 0.125 * 2000
+    assert rtt.min_rtt_ns == 1000
+    assert rtt.latest_rtt_ns == 2000
+    assert rtt.num_samples == 2
+
+
+def test_acks_of_own_pings_only():
+    rtt = RttEstimator()
+    payload = rtt.new_ping()
+    assert rtt.is_pending(payload)
+    assert rtt.on_ack(bytes(8), 0) is None
+    sent_ns = int.from_bytes(payload, 'big')
+    assert rtt.on_ack(payload, sent_ns + 5000) == 5000
+    assert not rtt.is_pending(payload)
+    # Duplicate ACK
+    assert rtt.on_ack(payload, sent_ns + 6000) is None
+    assert rtt.num_samples == 1
+
+
+def test_payloads_are_unique_and_bounded():
+    rtt = RttEstimator(max_outstanding=4)
+    payloads = [rtt.new_ping() for _ in range(10)]
+    assert len(set(payloads)) == 10
+    assert [rtt.is_pending(p) for p in payloads] == [False] * 6 + [True] * 4
@@ -0,0 +1,46 @@
+import pytest
+import scapy.contrib.http2 as h2
+
+from h2tinker import frames
+from h2tinker.serializer import FLAG_END_STREAM, FrameWriter, iter_frame_headers, pack_frame_header
+
+
+@pytest.mark.parametrize('written, expected', [
+    (lambda w: w.ping(b'abcdefgh'), lambda: frames.create_ping_frame(b'abcdefgh')),
+    (lambda w: w.ping(b'abcdefgh', is_ack=True), lambda: frames.create_ping_frame(b'abcdefgh', is_ack=True)),
+    (lambda w: w.priority(3, 1, 15, True), lambda: frames.create_priority_frame(3, 1, 15, True)),
+    (lambda w: w.settings(is_ack=True), lambda: frames.create_settings_frame(is_ack=True)),
+    (lambda w: w.settings([(h2.H2Setting.SETTINGS_ENABLE_PUSH, 0)]),
+     lambda: frames.create_settings_frame([h2.H2Setting(id=h2.H2Setting.SETTINGS_ENABLE_PUSH, value=0)])),
+    (lambda w: w.rst_stream(5, h2.H2ErrorCodes.CANCEL),
+     lambda: frames.create_rst_stream_frame(5, h2.H2ErrorCodes.CANCEL)),
+    (lambda w: w.goaway(h2.H2ErrorCodes.PROTOCOL_ERROR, 7, b'debug'),
+     lambda: frames.create_goaway_frame(h2.H2ErrorCodes.PROTOCOL_ERROR, 7, 'debug')),
+    (lambda w: w.window_update(0, 1 << 20), lambda: frames.create_window_update_frame(0, 1 << 20)),
+    (lambda w: w.data(1, b'body', end_stream=True),
+     lambda: h2.H2Frame(stream_id=1, flags={'ES'}) / h2.H2DataFrame(data=b'body')),
+])
+def test_identical_to_scapy(written, expected):
+    writer = written(FrameWriter())
+    assert writer.getvalue() == bytes(expected())
+    assert writer.num_frames == 1
+
+
+def test_chained_frames_grow_the_buffer():
+    writer = FrameWriter(capacity=16).data(1, b'x' * 100).data(3, b'y' * 100, end_stream=True).ping()
+    assert writer.num_frames == 3
+    assert [f.stream_id for f in writer.to_scapy()] == [1, 3, 0]
+    assert bytes(writer.view()) == writer.getvalue()
+    writer.clear()
+    assert writer.getvalue() == b'' and writer.num_frames == 0
+
+
+def test_frame_headers():
+    data = pack_frame_header(4, h2.H2DataFrame.type_id, FLAG_END_STREAM, 3) + b'body' + FrameWriter().ping().getvalue()
+    assert list(iter_frame_headers(data)) == [(4, h2.H2DataFrame.type_id, FLAG_END_STREAM, 3),
+                                              (8, h2.H2PingFrame.type_id, 0, 0)]
+
+
+def test_ping_data_must_be_8_bytes():
+    with pytest.raises(AssertionError):
+        FrameWriter().ping(b'short')
@@ -0,0 +1,37 @@
+import scapy.contrib.http2 as h2
+
+from h2tinker.serializer import FRAME_HEADER_LEN, FrameWriter
+from h2tinker.settings import PeerSettings, parse_settings
+
+
+def test_parse_settings():
+    settings = [(h2.H2Setting.SETTINGS_MAX_CONCURRENT_STREAMS, 100), (h2.H2Setting.SETTINGS_MAX_FRAME_SIZE, 1 << 20)]
+    payload = FrameWriter().settings(settings).getvalue()[FRAME_HEADER_LEN:]
+    assert parse_settings(payload) == settings
+    # A truncated trailing setting is ignored
+    assert parse_settings(payload[:-1]) == settings[:1]
+
+
+def test_defaults():
+    settings = PeerSettings()
+    assert settings.initial_window_size == 65_535
+    assert settings.max_frame_size == 16_384
+    assert settings.max_concurrent_streams is None
+
+
+def test_updated_applies_settings_in_order():
+    settings = PeerSettings().updated([
+        (h2.H2Setting.SETTINGS_INITIAL_WINDOW_SIZE, 1000),
+        (h2.H2Setting.SETTINGS_ENABLE_PUSH, 0),
+        (h2.H2Setting.SETTINGS_INITIAL_WINDOW_SIZE, 2000),
+        (0xff, 1),
+    ])
+    assert settings.initial_window_size == 2000
+    assert settings.enable_push is False
+    assert settings._replace(initial_window_size=65_535, enable_push=True) == PeerSettings()
+
+
+def test_updated_without_changes_keeps_settings():
+    settings = PeerSettings()
+    assert settings.updated([]) is settings
+    assert settings.updated([(0xff, 1)]) is settings
@@ -0,0 +1,77 @@
+import logging
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+
+import pytest
+
+from h2tinker.h2_plain_connection import H2PlainConnection
+from h2tinker.h2_tls_connection import H2TLSConnection
+from h2tinker.tls import TLSSessionCache
+
+
+def _serve_once(listener: socket.socket, handle):
+    # Accept one connection in the background and hand it to handle
+    def accept():
+        sock, _ = listener.accept()
+        sock.settimeout(5.0)
+        try:
+            handle(sock)
+        except (OSError, ssl.SSLError):
+            pass
+        finally:
+            sock.close()
+    thread = threading.Thread(target=accept, daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def listener():
+    sock = socket.create_server(('127.0.0.1', 0))
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def cert(tmp_path):
+    if shutil.which('openssl') is None:
+        pytest.skip('openssl is not available')
+    cert_file, key_file = str(tmp_path / 'cert.pem'), str(tmp_path / 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                    '-addext', 'subjectAltName=IP:127.0.0.1', '-keyout', key_file, '-out', cert_file],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert_file, key_file
+
+
+def test_plain_setup_failure_closes_socket(listener):
+    # The server hangs up instead of sending its settings
+    thread = _serve_once(listener, lambda sock: None)
+    conn = H2PlainConnection(logging.getLogger('h2tinker.tests'), connect_timeout=5.0)
+    with pytest.raises(Exception):
+        conn.setup('127.0.0.1', listener.getsockname()[1])
+    thread.join()
+    assert conn.is_closed
+    assert conn.sock.fileno() == -1
+
+
+def test_tls_alpn_failure_closes_socket(listener, cert):
+    server_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_ctx.load_cert_chain(*cert)
+    server_ctx.set_alpn_protocols(['http/1.1'])
+
+    def handshake(sock):
+        with server_ctx.wrap_socket(sock, server_side=True) as tls_sock:
+            tls_sock.recv(1)
+
+    thread = _serve_once(listener, handshake)
+    conn = H2TLSConnection(logging.getLogger('h2tinker.tests'), connect_timeout=5.0,
+                           ssl_context=TLSSessionCache().get_context(cafile=cert[0]))
+    with pytest.raises(AssertionError, match='ALPN'):
+        conn.setup('127.0.0.1', listener.getsockname()[1])
+    thread.join()
+    assert conn.is_closed
+    assert conn.sock.fileno() == -1
@@ -0,0 +1,33 @@
+import pytest
+
+from h2tinker.stream_ids import MAX_STREAM_ID, StreamIdAllocator
+
+
+def test_allocates_increasing_odd_ids():
+    ids = StreamIdAllocator()
+    assert ids.allocate(3) == [1, 3, 5]
+    assert ids.reserve_block(2) == range(7, 11, 2)
+    assert ids.next_id == 11
+
+
+def test_exhaustion():
+    ids = StreamIdAllocator(first_id=MAX_STREAM_ID - 4)
+    assert ids.remaining == 3
+    assert ids.has_room(3) and not ids.has_room(4)
+    with pytest.raises(AssertionError, match='exhausted'):
+        ids.allocate(4)
+    assert ids.allocate(3) == [MAX_STREAM_ID - 4, MAX_STREAM_ID - 2, MAX_STREAM_ID]
+    assert ids.remaining == 0
+
+
+def test_skip_to():
+    ids = StreamIdAllocator()
+    ids.skip_to(4)
+    assert ids.allocate(1) == [5]
+    ids.skip_to(3)
+    assert ids.allocate(1) == [7]
+
+
+def test_first_id_must_be_odd():
+    with pytest.raises(AssertionError):
+        StreamIdAllocator(first_id=2)
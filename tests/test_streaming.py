@@ -0,0 +1,41 @@
+import scapy.contrib.http2 as h2
+
+from h2tinker.request import H2Request
+from h2tinker.serializer import FLAG_END_HEADERS, FLAG_END_STREAM, iter_frame_headers
+
+from conftest import recv_all
+
+
+def _frames(data: bytes):
+    # (type, flags, stream ID, payload length) of every frame
+    return [(frame_type, flags, stream_id, length) for length, frame_type, flags, stream_id in iter_frame_headers(data)]
+
+
+def test_streaming_request_without_withholding_ends_stream(conn_pair):
+    conn, server = conn_pair
+    finals = conn.send_streaming_requests([H2Request('GET', '/', 1), H2Request('POST', '/', 3, body=b'abc')])
+    assert finals.num_frames == 0
+    assert [frame[:3] for frame in _frames(recv_all(server))] == [
+        (h2.H2HeadersFrame.type_id, FLAG_END_HEADERS | FLAG_END_STREAM, 1),
+        (h2.H2HeadersFrame.type_id, FLAG_END_HEADERS, 3),
+        (h2.H2DataFrame.type_id, FLAG_END_STREAM, 3),
+    ]
+
+
+def test_withheld_streaming_request_ends_stream_in_final_frame(conn_pair):
+    conn, server = conn_pair
+    finals = conn.send_streaming_requests([H2Request('GET', '/', 1), H2Request('POST', '/', 3, body=b'abc')],
+                                          withhold_last_byte=True)
+    sent = _frames(recv_all(server))
+    assert [frame[:3] for frame in sent] == [
+        (h2.H2HeadersFrame.type_id, FLAG_END_HEADERS, 1),
+        (h2.H2HeadersFrame.type_id, FLAG_END_HEADERS, 3),
+        (h2.H2DataFrame.type_id, 0, 3),
+    ]
+    assert sent[2][3] == 2
+    # An empty body gets an empty final frame, a non-empty one its last byte
+    assert _frames(finals.getvalue()) == [
+        (h2.H2DataFrame.type_id, FLAG_END_STREAM, 1, 0),
+        (h2.H2DataFrame.type_id, FLAG_END_STREAM, 3, 1),
+    ]
+    assert finals.getvalue().endswith(b'c')
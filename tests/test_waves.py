@@ -0,0 +1,82 @@
+import logging
+import socket
+import threading
+import typing as T
+
+import scapy.contrib.http2 as h2
+from scapy.compat import raw
+
+from conftest import make_conn_pair
+from h2tinker.decoder import H2FrameDecoder
+from h2tinker.h2_connection import H2Connection
+from h2tinker.hpack import HPackEncoder
+from h2tinker.request import H2Request
+from h2tinker.response import CloseReason
+from h2tinker.serializer import FrameWriter
+from h2tinker.waves import WaveRace
+
+
+def _serve(server: socket.socket, num_streams: int, respond: T.Callable[[T.List[int]], FrameWriter]):
+    # Read until the client has ended num_streams streams, then answer with the frames respond writes for them
+    decoder = H2FrameDecoder()
+    ended = []
+    while len(ended) < num_streams:
+        ended.extend(f.stream_id for f in decoder.feed_views(server.recv(1 << 16)) if 'ES' in f.flags)
+    server.sendall(respond(ended).getvalue())
+
+
+def _ok(encoder: HPackEncoder, writer: FrameWriter, stream_id: int) -> FrameWriter:
+    return writer.headers(stream_id, b''.join(raw(h) for h in encoder.encode_headers([(':status', '200')])),
+                          end_stream=True)
+
+
+def test_requeues_streams_above_goaway_cutoff_on_new_connection():
+    conn, server = make_conn_pair()
+    new_conn, new_server = make_conn_pair()
+
+    def cut_off(stream_ids):
+        # Answer the first stream, reset the second and process none above it
+        writer = _ok(HPackEncoder(), FrameWriter(), stream_ids[0]).rst_stream(stream_ids[1], h2.H2ErrorCodes.CANCEL)
+        return writer.goaway(last_stream_id=stream_ids[1])
+
+    def answer_all(stream_ids):
+        encoder = HPackEncoder()
+        writer = FrameWriter()
+        for sid in stream_ids:
+            _ok(encoder, writer, sid)
+        return writer
+
+    replaced = []
+
+    def reconnect(old: H2Connection) -> H2Connection:
+        replaced.append(old)
+        old.close()
+        return new_conn
+
+    servers = [threading.Thread(target=_serve, args=(server, 4, cut_off)),
+               threading.Thread(target=_serve, args=(new_server, 2, answer_all))]
+    for t in servers:
+        t.start()
+    try:
+        race = WaveRace(logging.getLogger('h2tinker.tests'), conn, reconnect)
+        requests = [H2Request('GET', '/{}'.format(i), 0) for i in range(4)]
+        result = race.run(requests, settle_time=0, read_timeout=5.0, max_requeues=1)
+    finally:
+        for t in servers:
+            t.join(5)
+        new_conn.close()
+        server.close()
+        new_server.close()
+
+    assert replaced == [conn]
+    assert race.conn is new_conn
+    first, requeue = result.waves
+    assert (first.request_indices, first.stream_ids, first.connection_index) == ([0, 1, 2, 3], [1, 3, 5, 7], 0)
+    # Only the requests above the cutoff are raced again, the reset one was processed
+    assert (requeue.request_indices, requeue.stream_ids, requeue.attempt, requeue.connection_index) == \
+        ([2, 3], [1, 3], 1, 1)
+    assert [result.responses[i].close_reason for i in range(4)] == [CloseReason.ENDED, CloseReason.RESET,
+                                                                     CloseReason.ENDED, CloseReason.ENDED]
+    assert [result.responses[i].status for i in (0, 2, 3)] == [200, 200, 200]
+    assert result.unprocessed_requests() == []
+    assert result.unsent == []